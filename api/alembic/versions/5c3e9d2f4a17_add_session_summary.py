@@ -0,0 +1,34 @@
+"""add rolling summary to training session
+
+Revision ID: 5c3e9d2f4a17
+Revises: 1a71410604aa
+Create Date: 2026-10-18 09:12:40.218413
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c3e9d2f4a17"
+down_revision: Union[str, None] = "1a71410604aa"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("training_session", sa.Column("summary", sa.String(), nullable=True))
+    op.add_column(
+        "training_session",
+        sa.Column("summary_message_id", sa.Integer(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("training_session", "summary_message_id")
+    op.drop_column("training_session", "summary")
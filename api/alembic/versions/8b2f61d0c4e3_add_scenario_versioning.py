@@ -0,0 +1,68 @@
+"""add scenario version and chapter content hash
+
+Revision ID: 8b2f61d0c4e3
+Revises: 5c3e9d2f4a17
+Create Date: 2026-10-18 14:03:27.512904
+
+"""
+
+import hashlib
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8b2f61d0c4e3"
+down_revision: Union[str, None] = "5c3e9d2f4a17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def content_hash(title: str, content: str, meta) -> str:
+    # Frozen copy of brobot.models.chapter_content_hash
+    if isinstance(meta, str):
+        meta = json.loads(meta)
+    digest = hashlib.sha256()
+    for part in (title, content, json.dumps(meta or {}, sort_keys=True)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "scenario",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+    )
+    op.add_column(
+        "scenario_chapter", sa.Column("content_hash", sa.String(64), nullable=True)
+    )
+
+    chapter = sa.table(
+        "scenario_chapter",
+        sa.column("id", sa.Integer),
+        sa.column("title", sa.String),
+        sa.column("content", sa.String),
+        sa.column("meta", sa.JSON),
+        sa.column("content_hash", sa.String),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(chapter.c.id, chapter.c.title, chapter.c.content, chapter.c.meta)
+    ).all()
+    for id_, title, content, meta in rows:
+        connection.execute(
+            chapter.update()
+            .where(chapter.c.id == id_)
+            .values(content_hash=content_hash(title, content, meta))
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("scenario_chapter", "content_hash")
+    op.drop_column("scenario", "version")
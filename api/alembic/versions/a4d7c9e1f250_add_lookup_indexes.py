@@ -0,0 +1,49 @@
+"""add composite indexes for the hot lookups
+
+Revision ID: a4d7c9e1f250
+Revises: 8b2f61d0c4e3
+Create Date: 2026-10-18 16:41:09.873215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4d7c9e1f250"
+down_revision: Union[str, None] = "8b2f61d0c4e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_session_message_session_id_id",
+        "session_message",
+        ["session_id", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_scenario_chapter_scenario_id_order",
+        "scenario_chapter",
+        ["scenario_id", "order"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_training_session_user_id_id",
+        "training_session",
+        ["user_id", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_training_session_user_id_id", table_name="training_session")
+    op.drop_index(
+        "ix_scenario_chapter_scenario_id_order", table_name="scenario_chapter"
+    )
+    op.drop_index("ix_session_message_session_id_id", table_name="session_message")
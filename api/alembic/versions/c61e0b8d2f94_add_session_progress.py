@@ -0,0 +1,60 @@
+"""add progress pointer to training session
+
+Revision ID: c61e0b8d2f94
+Revises: a4d7c9e1f250
+Create Date: 2026-10-18 17:25:51.204377
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c61e0b8d2f94"
+down_revision: Union[str, None] = "a4d7c9e1f250"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "training_session",
+        sa.Column("current_chapter_id", sa.Integer(), nullable=True),
+    )
+    op.add_column(
+        "training_session",
+        sa.Column(
+            "completed_chapters", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.create_foreign_key(
+        "training_session_current_chapter_id_fkey",
+        "training_session",
+        "scenario_chapter",
+        ["current_chapter_id"],
+        ["id"],
+    )
+    # The current chapter is resolved on the next turn of each session
+    op.execute(
+        """
+        UPDATE training_session SET completed_chapters = (
+            SELECT count(*) FROM chapter_completion
+            WHERE chapter_completion.session_id = training_session.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(
+        "training_session_current_chapter_id_fkey",
+        "training_session",
+        type_="foreignkey",
+    )
+    op.drop_column("training_session", "completed_chapters")
+    op.drop_column("training_session", "current_chapter_id")
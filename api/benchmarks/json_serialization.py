@@ -0,0 +1,126 @@
+"""
+Compare the JSON paths of a training session with many messages: building the
+DTOs from rows, rendering them as a response, and sending websocket frames.
+
+    uv run python -m benchmarks.json_serialization
+"""
+
+import datetime
+import timeit
+from types import SimpleNamespace
+
+from brobot.dto import SessionMessageDTO, TrainingSessionDTO
+from brobot.dto.scenario_chapter import ScenarioChapterWithoutContentDTO
+from brobot.dto.scenario_with_chapter import ScenarioWithChapterDTO
+from brobot.serialization import OrjsonSerializer, StdlibSerializer
+
+MESSAGES = 1000
+REPEAT = 5
+
+
+def sample_rows(messages: int) -> SimpleNamespace:
+    created_at = datetime.datetime(2025, 1, 1)
+    return SimpleNamespace(
+        id=1,
+        created_at=created_at,
+        scenario=SimpleNamespace(
+            id=1,
+            title="Introduction to SQL",
+            description="Learn the basics of SQL",
+            created_at=created_at,
+            version=1,
+            chapters=[
+                SimpleNamespace(id=i, title=f"Chapter {i}", order=i) for i in range(10)
+            ],
+        ),
+        messages=[
+            SimpleNamespace(
+                id=i,
+                created_at=created_at,
+                content=f"Message {i}: SELECT name FROM students WHERE note > {i % 20};",
+                role="user" if i % 2 else "assistant",
+            )
+            for i in range(messages)
+        ],
+    )
+
+
+def build(
+    rows: SimpleNamespace, construct: bool
+) -> tuple[TrainingSessionDTO, list[SessionMessageDTO]]:
+    def make(cls, **fields):
+        return cls.model_construct(**fields) if construct else cls(**fields)
+
+    session = make(
+        TrainingSessionDTO,
+        id=rows.id,
+        created_at=rows.created_at,
+        message_count=len(rows.messages),
+        scenario=make(
+            ScenarioWithChapterDTO,
+            id=rows.scenario.id,
+            title=rows.scenario.title,
+            description=rows.scenario.description,
+            created_at=rows.scenario.created_at,
+            version=rows.scenario.version,
+            chapters=[
+                make(
+                    ScenarioChapterWithoutContentDTO,
+                    id=c.id,
+                    title=c.title,
+                    order=c.order,
+                )
+                for c in rows.scenario.chapters
+            ],
+        ),
+    )
+    messages = [
+        make(
+            SessionMessageDTO,
+            id=m.id,
+            created_at=m.created_at,
+            content=m.content,
+            role=m.role,
+        )
+        for m in rows.messages
+    ]
+    return session, messages
+
+
+def best(function) -> float:
+    return min(timeit.repeat(function, number=1, repeat=REPEAT))
+
+
+def main():
+    rows = sample_rows(MESSAGES)
+    session, messages = build(rows, construct=False)
+    # What FastAPI hands to the response classes after applying the response models
+    content = [session.model_dump(mode="json")] + [
+        message.model_dump(mode="json") for message in messages
+    ]
+    deltas = [{"type": "delta", "content": f"token {i} "} for i in range(MESSAGES)]
+
+    cases = {
+        "dto validated": lambda: build(rows, construct=False),
+        "dto construct": lambda: build(rows, construct=True),
+        "model_dump_json": lambda: [
+            dto.model_dump_json() for dto in [session, *messages]
+        ],
+    }
+    for json_serializer in (StdlibSerializer(), OrjsonSerializer()):
+        cases[f"response {json_serializer.name}"] = lambda s=json_serializer: s.dumpb(
+            content
+        )
+    for json_serializer in (StdlibSerializer(), OrjsonSerializer()):
+        cases[f"frames {json_serializer.name}"] = lambda s=json_serializer: [
+            s.dumps(delta) for delta in deltas
+        ]
+
+    print(f"Training session with {MESSAGES} messages, best of {REPEAT} runs")
+    print(f"{'path':<18} {'time (ms)':>10}")
+    for name, function in cases.items():
+        print(f"{name:<18} {best(function) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compare the renderings of evaluate_query results, in time and in prompt tokens.
+
+    uv run python -m benchmarks.result_format
+"""
+
+import timeit
+
+from brobot.bot.formatting import FORMATTERS, format_result
+from brobot.bot.memory import estimate_tokens
+from brobot.bot.sandbox import QueryResult
+
+ROWS = 1000
+REPEAT = 5
+
+
+def sample_result(rows: int) -> QueryResult:
+    return QueryResult(
+        columns=["id", "name", "email", "note", "event_date"],
+        rows=[
+            (
+                i,
+                f"Student {i}",
+                f"student.{i}@example.com",
+                i % 20,
+                f"2025-01-{i % 28 + 1:02d}",
+            )
+            for i in range(rows)
+        ],
+    )
+
+
+def main():
+    result = sample_result(ROWS)
+    print(f"{ROWS} rows, best of {REPEAT} runs")
+    print(f"{'format':<10} {'time (ms)':>10} {'chars':>8} {'tokens':>8}")
+    for name in FORMATTERS:
+        text = format_result(result, name)
+        seconds = min(
+            timeit.repeat(lambda: format_result(result, name), number=1, repeat=REPEAT)
+        )
+        print(
+            f"{name:<10} {seconds * 1000:>10.1f} {len(text):>8} {estimate_tokens(text):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
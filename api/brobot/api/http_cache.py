@@ -0,0 +1,84 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+from brobot.config import settings
+from brobot.services.content_cache import content_cache
+
+
+@dataclass
+class Representation:
+    """
+    A response body serialized once, with its strong ETag.
+    """
+
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, body: bytes, headers: Optional[Dict[str, str]] = None):
+        # Strong: two bodies with the same tag are byte for byte the same
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        return cls(body, etag, headers or {})
+
+
+def cache_control() -> str:
+    max_age = settings.SCENARIOS_HTTP_MAX_AGE
+    # no-cache: stored, but revalidated on every use, which costs a 304
+    return f"public, max-age={max_age}" if max_age > 0 else "public, no-cache"
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """
+    Whether the If-None-Match header of a request matches the given ETag, with
+    the weak comparison required for If-None-Match.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def cached_representation(
+    key: Hashable,
+    scenario_id: Optional[int],
+    build: Callable[[], Awaitable[Optional[Representation]]],
+) -> Optional[Representation]:
+    """
+    Get a representation from the content cache, built on a miss.
+
+    Args:
+        key (Hashable): The cache key of the representation.
+        scenario_id (int | None): The scenario it is built from, None when it
+            depends on the whole catalog.
+        build (Callable): Builds the representation, or returns None when there
+            is nothing to represent (not cached).
+    Returns:
+        Representation | None: The representation.
+    """
+    if (representation := content_cache.get(key)) is not None:
+        return representation
+    representation = await build()
+    if representation is not None:
+        content_cache.put(key, representation, scenario_id, len(representation.body))
+    return representation
+
+
+def conditional_response(request: Request, representation: Representation) -> Response:
+    """
+    Answer with the representation, or with a 304 when the client already has it.
+    """
+    headers = {
+        **representation.headers,
+        "ETag": representation.etag,
+        "Cache-Control": cache_control(),
+    }
+    if not_modified(request, representation.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=representation.body, media_type="application/json", headers=headers
+    )
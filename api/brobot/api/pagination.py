@@ -0,0 +1,27 @@
+from typing import Dict, Optional, Sequence
+
+from fastapi import Query, Response
+
+# Header holding the cursor of the next page, exposed to browsers by the CORS setup
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+PageLimit = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+PageAfter = Query(None, description="Id of the last item of the previous page.")
+
+
+def next_cursor_headers(items: Sequence, limit: int) -> Dict[str, str]:
+    """
+    Give the cursor of the next page, unless the page is the last one.
+
+    Listings are ordered by id, so the cursor is the id of the last item: the
+    next page is a keyset query (id > cursor) costing the same whatever its
+    position.
+    """
+    cursor: Optional[int] = items[-1].id if len(items) == limit else None
+    return {NEXT_CURSOR_HEADER: str(cursor)} if cursor is not None else {}
+
+
+def set_next_cursor(response: Response, items: Sequence, limit: int) -> None:
+    response.headers.update(next_cursor_headers(items, limit))
@@ -1,58 +1,116 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import TypeAdapter
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from brobot.services.scenarios import ScenarioService
 from brobot.database import get_session
+from brobot.api.http_cache import (
+    Representation,
+    cached_representation,
+    conditional_response,
+)
+from brobot.api.pagination import PageAfter, PageLimit, next_cursor_headers
 
-from brobot.dto import ScenarioWithChapterDTO, ImportRequestDTO
+from brobot.dto import (
+    BulkImportReportDTO,
+    CreateScenarioDTO,
+    ScenarioWithChapterDTO,
+    ImportRequestDTO,
+)
 
 router = APIRouter()
 
+ScenarioList = TypeAdapter(List[ScenarioWithChapterDTO])
+
 
 @router.get("/{scenario_id}", response_model=ScenarioWithChapterDTO)
-async def read_scenario(scenario_id: int, session: Session = Depends(get_session)):
-    service = ScenarioService(session)
-    scenario_db = service.get(scenario_id)
-    if not scenario_db:
+async def read_scenario(
+    scenario_id: int, request: Request, session: AsyncSession = Depends(get_session)
+):
+    """
+    Retrieve a scenario, served from its cached serialization with an ETag.
+    """
+
+    async def build() -> Optional[Representation]:
+        scenario = await ScenarioService(session).get(scenario_id)
+        return (
+            Representation.of(scenario.model_dump_json().encode()) if scenario else None
+        )
+
+    representation = await cached_representation(
+        ("scenario_json", scenario_id), scenario_id, build
+    )
+    if representation is None:
         raise HTTPException(status_code=404, detail="Unable to find scenario")
-    return scenario_db
+    return conditional_response(request, representation)
 
 
 @router.get("/", response_model=List[ScenarioWithChapterDTO])
-async def read_all_scenarios(session: Session = Depends(get_session)):
+async def read_all_scenarios(
+    request: Request,
+    limit: int = PageLimit,
+    after: Optional[int] = PageAfter,
+    session: AsyncSession = Depends(get_session),
+):
     """
-    Retrieve all scenarios from the database.
+    Retrieve a page of scenarios, the next one is given by the X-Next-Cursor header.
+    Pages are served from their cached serialization with an ETag.
     """
-    service = ScenarioService(session)
-    scenarios = service.get_all()
-    return scenarios
+
+    async def build() -> Representation:
+        scenarios = await ScenarioService(session).get_all(limit, after)
+        return Representation.of(
+            ScenarioList.dump_json(scenarios), next_cursor_headers(scenarios, limit)
+        )
+
+    representation = await cached_representation(
+        ("scenarios_json", limit, after), None, build
+    )
+    return conditional_response(request, representation)
 
 
 @router.delete("/{scenario_id}", status_code=204)
 async def delete_scenario_route(
-    scenario_id: int, session: Session = Depends(get_session)
+    scenario_id: int, session: AsyncSession = Depends(get_session)
 ):
     """
     Delete a scenario by its ID.
     """
     service = ScenarioService(session)
-    success = service.delete(scenario_id, session)
+    success = await service.delete(scenario_id)
     if not success:
         raise HTTPException(status_code=404, detail="Scenario not found")
 
 
 @router.post("/import/github", status_code=201)
 async def import_scenario_from_github(
-    import_request: ImportRequestDTO, session: Session = Depends(get_session)
+    import_request: ImportRequestDTO, session: AsyncSession = Depends(get_session)
 ):
     """
     Import a scenario from a GitHub repository.
     """
     service = ScenarioService(session)
-    scenario = service.import_github(import_request.url, import_request.slug)
+    try:
+        scenario = await service.import_github(import_request.url, import_request.slug)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not scenario:
         raise HTTPException(status_code=400, detail="Failed to import scenario")
 
     return scenario
+
+
+@router.post("/bulk", response_model=BulkImportReportDTO)
+async def bulk_import_scenarios(
+    scenarios: List[CreateScenarioDTO], session: AsyncSession = Depends(get_session)
+):
+    """
+    Create or update a batch of scenarios by slug, all or nothing.
+    """
+    service = ScenarioService(session)
+    try:
+        return await service.bulk_upsert(scenarios)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
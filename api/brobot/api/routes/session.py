@@ -1,23 +1,25 @@
 import json
-import asyncio
 import logging
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, status, WebSocket
-from sqlmodel import Session
+from fastapi import APIRouter, HTTPException, Depends, Response, status, WebSocket
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from brobot.database import get_session
-from brobot.dto import TrainingSessionDTO
+from brobot.api.pagination import PageAfter, PageLimit, set_next_cursor
+from brobot.database import get_session, async_session_factory
+from brobot.dto import SessionMessageDTO, TrainingSessionDTO
 from brobot.services.session import SessionService
 from brobot.ws.manager import ConnectionManager
+from brobot.ws.pubsub import pubsub_from_settings
 from brobot.ws.ws_bot_adapter import BotAdapter
+from brobot.ws.turns import turn_coordinator
 
 
 router = APIRouter()
 
 
 # Global instance of ConnectionManager to handle sessions
-connection_manager = ConnectionManager()
+connection_manager = ConnectionManager(pubsub_from_settings())
 
 
 logger = logging.getLogger("uvicorn.error")
@@ -27,10 +29,22 @@ router = APIRouter()
 USER_ID = 1  # Placeholder for user ID, should be replaced with actual user ID from authentication
 
 
+@router.get("/ws/stats")
+async def api_websocket_stats():
+    """
+    Metrics of the websocket writers of this worker: queue high-water mark,
+    frames dropped or coalesced, clients disconnected for being too slow, and
+    the frames currently queued per session.
+    """
+    return connection_manager.writer_stats()
+
+
 @router.get("/{session_id}", response_model=TrainingSessionDTO)
-async def api_get_training_session(session_id: int, db: Session = Depends(get_session)):
+async def api_get_training_session(
+    session_id: int, db: AsyncSession = Depends(get_session)
+):
     """
-    Retrieve a training session and all its associated messages.
+    Retrieve a training session, its messages are paged by the messages endpoint.
     """
     sevice = SessionService(db)
     session = await sevice.get(session_id)
@@ -40,20 +54,44 @@ async def api_get_training_session(session_id: int, db: Session = Depends(get_se
     return session
 
 
-@router.get("/", response_model=List[TrainingSessionDTO])
-async def api_my_training_sessions(db: Session = Depends(get_session)):
+@router.get("/{session_id}/messages", response_model=List[SessionMessageDTO])
+async def api_get_session_messages(
+    session_id: int,
+    response: Response,
+    limit: int = PageLimit,
+    after: Optional[int] = PageAfter,
+    db: AsyncSession = Depends(get_session),
+):
     """
-    Retrieve all training sessions from the database.
+    Retrieve a page of the messages of a training session, oldest first.
+    The next page is given by the X-Next-Cursor header.
     """
     service = SessionService(db)
-    sessions = await service.users_sessions(USER_ID)
+    messages = await service.messages_after(session_id, after, limit)
+    set_next_cursor(response, messages, limit)
+    return messages
 
+
+@router.get("/", response_model=List[TrainingSessionDTO])
+async def api_my_training_sessions(
+    response: Response,
+    limit: int = PageLimit,
+    after: Optional[int] = PageAfter,
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Retrieve a page of the training sessions of the user.
+    The next page is given by the X-Next-Cursor header.
+    """
+    service = SessionService(db)
+    sessions = await service.users_sessions(USER_ID, limit, after)
+    set_next_cursor(response, sessions, limit)
     return sessions
 
 
 @router.post("/{scenario_id}", status_code=status.HTTP_201_CREATED)
 async def api_create_training_session(
-    scenario_id: int, db: Session = Depends(get_session)
+    scenario_id: int, db: AsyncSession = Depends(get_session)
 ):
     """
     Create a new training session for a given scenario.
@@ -65,7 +103,7 @@ async def api_create_training_session(
 
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def api_delete_training_session(
-    session_id: int, db: Session = Depends(get_session)
+    session_id: int, db: AsyncSession = Depends(get_session)
 ):
     """
     Delete a training session by its ID.
@@ -78,17 +116,32 @@ async def api_delete_training_session(
 
 @router.websocket("/ws/{session_id}")
 async def session_ws(
-    websocket: WebSocket, session_id: int, db: Session = Depends(get_session)
+    websocket: WebSocket,
+    session_id: int,
+    resume_from: Optional[int] = None,
+    last_message_id: Optional[int] = None,
 ):
-    await connection_manager.connect(session_id, websocket)
+    """
+    Chat websocket of a training session.
 
-    service = SessionService(db)
+    The client loads the history from the messages endpoint once the socket is
+    open. A reconnecting client passes the sequence number of the last frame it
+    received as resume_from, and the id of the last message it knows as
+    last_message_id. Missed frames are replayed when still buffered, otherwise
+    the messages following last_message_id are sent from the database.
+
+    Each read or write uses its own short-lived database session, so an idle
+    socket does not hold a pooled connection.
+    """
+    resumed = await connection_manager.connect(session_id, websocket, resume_from)
 
     async def send_history(cm: ConnectionManager, sid: int, ws: WebSocket):
-        session = await service.get(sid)
+        if resumed or last_message_id is None:
+            return
+        async with async_session_factory() as db:
+            messages = await SessionService(db).messages_after(sid, last_message_id)
         logger.info("Sending history to client", extra={"session_id": sid})
-        for msg in session.messages:
-            await cm.send_text(sid, msg.model_dump_json())
+        await cm.send_history(sid, (msg.model_dump_json() for msg in messages))
 
     async def handle_incoming(cm: ConnectionManager, sid: int, raw: str):
         if not raw:
@@ -103,20 +156,29 @@ async def session_ws(
 
         await cm.send_json(sid, {"type": "typing", "status": "start"})
 
-        user_message = await service.add_message(
-            sid,
-            data.get("content"),
-            data.get("role"),
-        )
+        async with async_session_factory() as db:
+            user_message = await SessionService(db).add_message(
+                sid,
+                data.get("content"),
+                data.get("role"),
+            )
 
         await cm.send_text(sid, user_message.model_dump_json())
 
-        adapter = BotAdapter(
-            session_id=sid,
-            session_service=service,
-            connection_manager=cm,
-        )
-        asyncio.create_task(adapter.answer_user_message())
+        # At most one generation per session, messages sent meanwhile are
+        # answered together by the next turn.
+        turn_coordinator.request_turn(sid, lambda: answer_user_message(cm, sid))
+
+    async def answer_user_message(cm: ConnectionManager, sid: int):
+        # The generation runs concurrently with the receive loop, so it gets
+        # its own database session instead of sharing the websocket one.
+        async with async_session_factory() as bot_db:
+            adapter = BotAdapter(
+                session_id=sid,
+                session_service=SessionService(bot_db),
+                connection_manager=cm,
+            )
+            await adapter.answer_user_message()
 
     await connection_manager.handle_session(
         session_id,
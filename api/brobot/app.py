@@ -1,12 +1,57 @@
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+
 from fastapi import FastAPI
+from brobot.api.pagination import NEXT_CURSOR_HEADER
 from brobot.api.routes import scenario, session
+from brobot.bot.sandbox import sandbox_pool
 from brobot.config import settings
+from brobot.database import async_session_factory, engine
+from brobot.serialization import FastJSONResponse
+from brobot.services.github import github_fetcher
+from brobot.services.importer import import_scenarios
 from fastapi.middleware.cors import CORSMiddleware
 
+
+logger = logging.getLogger("uvicorn.error")
+
+
+async def import_bundled_scenarios(path: Path) -> None:
+    try:
+        async with async_session_factory() as db_session:
+            report = await import_scenarios(
+                db_session, path, settings.SCENARIOS_IMPORT_WORKERS
+            )
+    except Exception as e:
+        # Another worker may be importing the same bundle
+        logger.error(f"Scenario import from {path} failed: {e}")
+        return
+    logger.info(
+        f"Scenarios imported from {path}: {len(report.created)} created, "
+        f"{len(report.updated)} updated, {len(report.skipped)} unchanged, "
+        f"{len(report.invalid)} invalid"
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.SCENARIOS_IMPORT_PATH:
+        await import_bundled_scenarios(Path(settings.SCENARIOS_IMPORT_PATH))
+    yield
+    await session.connection_manager.close()
+    sandbox_pool.close()
+    await github_fetcher.close()
+    # Close pooled asyncio connections before the event loop goes away
+    await engine.dispose()
+
+
 app = FastAPI(
     title=settings.APP_TITLE,
     version=settings.APP_VERSION,
     description="API for managing learning scenarios, chapters, and real-time conversations with the learning bot.",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -15,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(scenario.router, prefix="/scenarios", tags=["Scenarios"])
@@ -1,33 +1,34 @@
 import os
+import hashlib
+from collections import OrderedDict
 from textwrap import dedent
+from typing import Hashable
 
 from agents import (
     Agent,
     ModelSettings,
 )
 
+from brobot.config import settings
 from brobot.models import Scenario, ScenarioChapter
 from brobot.bot.context import ScenarioContext
+from brobot.bot.tools.evaluate_query import evaluate_query
 from brobot.bot.tools.record_part_completion import record_part_completion
 
 
 MODEL = os.getenv("MODEL_NAME", "gpt-4.1-mini")
+MAX_ANSWER_TOKENS = 500
 
-PROMPT = dedent(
+# Static part of the instructions, identical for every scenario and chapter.
+# It must stay first and byte-stable so providers can reuse their prompt cache.
+PROMPT_PREFIX = dedent(
     """
     <role>
         You are an online tutor whose mission is to foster critical thinking and learner autonomy.
-        Your goal is to help the student master <{CURRENT_CHAPTER_TITLE}> of <{SCENARIO_TITLE}>.
+        Your goal is to help the student master the focus chapter of the course described in <context>.
         You never reveal complete solutions; instead you guide, question, and scaffold.
     </role>
 
-    <context>
-        <course_material>
-            {SCENARIO_CONTENT}
-        </course_material>
-        <focus_chapter>{CURRENT_CHAPTER}</focus_chapter>
-    </context>
-
     <definitions>
         • A **Course** contains one or more **Chapters**.  
         • Each **Chapter** is broken into sequential **Parts** (micro-lessons).  
@@ -65,6 +66,8 @@ PROMPT = dedent(
 
     <tools>
         - `record_part_completion() -> str` – Logs that the learner has finished the current Part. 
+        - `evaluate_query(query: str) -> str` – Runs a SQL query of the learner against the tables of the current <data>, and returns the result table or the error. 
+        - A `<grader>` message, when present, already compared the query of the learner with the expected result: rely on its verdict instead of checking the query again. 
     </tools>
 
     <tone>
@@ -76,30 +79,154 @@ PROMPT = dedent(
     """
 )
 
+# Scenario and chapter specific part, appended after the static prefix.
+PROMPT_CONTEXT = dedent(
+    """
+    <context>
+        <course_title>{SCENARIO_TITLE}</course_title>
+        <course_material>
+            {SCENARIO_CONTENT}
+        </course_material>
+        <focus_chapter_title>{CURRENT_CHAPTER_TITLE}</focus_chapter_title>
+        <focus_chapter>{CURRENT_CHAPTER}</focus_chapter>
+    </context>
+    """
+)
+
+
+def content_hash(scenario: Scenario, chapter: ScenarioChapter) -> str:
+    """
+    Hash of the scenario and chapter content used to build the instructions.
+    The stored hash of the chapter is reused when it has one, so the chapter
+    content is not hashed again on every turn.
+    """
+    digest = hashlib.sha256()
+    chapter_part = chapter.content_hash or chapter.title + "\0" + chapter.content
+    for part in (scenario.title, scenario.description, chapter_part):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AgentCache:
+    """
+    LRU cache of prepared agents, keyed by (scenario_id, chapter_id, content hash, model).
+    Agents hold no run state, so a single instance is shared by every session.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._agents: OrderedDict[Hashable, Agent] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Agent | None:
+        agent = self._agents.get(key)
+        if agent is None:
+            self.misses += 1
+            return None
+        self._agents.move_to_end(key)
+        self.hits += 1
+        return agent
+
+    def put(self, key: Hashable, agent: Agent) -> None:
+        self._agents[key] = agent
+        self._agents.move_to_end(key)
+        while len(self._agents) > self.maxsize:
+            self._agents.popitem(last=False)
+
+    def invalidate_scenario(self, scenario_id: int) -> None:
+        """
+        Drop every agent prepared for the given scenario.
+        """
+        for key in [key for key in self._agents if key[0] == scenario_id]:
+            del self._agents[key]
+
+    def clear(self) -> None:
+        self._agents.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._agents)}
+
+
+agent_cache = AgentCache(maxsize=settings.AGENT_CACHE_SIZE)
+
+
+def build_instructions(scenario: Scenario, chapter: ScenarioChapter) -> str:
+    """
+    Build the agent instructions: the static prefix followed by the chapter context.
+    """
+    return PROMPT_PREFIX + PROMPT_CONTEXT.format(
+        CURRENT_CHAPTER_TITLE=chapter.title,
+        SCENARIO_TITLE=scenario.title,
+        SCENARIO_CONTENT=scenario.description,
+        CURRENT_CHAPTER=chapter.content,
+    )
+
 
 def prepared_agent(
     scenario: Scenario, chapter: ScenarioChapter
 ) -> Agent[ScenarioContext]:
     """
-    Prepares an agent with the given instructions.
+    Prepares an agent for the given scenario chapter, reusing the cached one
+    when the content did not change.
 
     Args:
-        instructions (str): Instructions to be used for the agent.
+        scenario (Scenario): The scenario being followed.
+        chapter (ScenarioChapter): The chapter in progress.
 
     Returns:
         Agent[ScenarioContext]: The prepared agent.
     """
-    return Agent[ScenarioContext](
+    key = (scenario.id, chapter.id, content_hash(scenario, chapter), MODEL)
+    if agent := agent_cache.get(key):
+        return agent
+
+    agent = Agent[ScenarioContext](
         name="trainer",
         model=MODEL,
-        instructions=PROMPT.format(
-            CURRENT_CHAPTER_TITLE=chapter.title,
-            SCENARIO_TITLE=scenario.title,
-            SCENARIO_CONTENT=scenario.description,
-            CURRENT_CHAPTER=chapter.content,
-        ),
+        instructions=build_instructions(scenario, chapter),
         model_settings=ModelSettings(
-            temperature=0.2, max_tokens=500, tool_choice="auto"
+            temperature=0.2, max_tokens=MAX_ANSWER_TOKENS, tool_choice="auto"
         ),
-        tools=[record_part_completion],
+        tools=[record_part_completion, evaluate_query],
+    )
+    agent_cache.put(key, agent)
+    return agent
+
+
+SUMMARY_PROMPT = dedent(
+    """
+    <role>
+        You maintain the memory of a tutoring conversation between a learner and a tutor.
+    </role>
+
+    <instruction>
+        - Merge the previous summary with the new messages into a single updated summary.
+        - Keep what the learner understood, struggled with, answered and still has to do.
+        - Keep facts the tutor relies on to stay consistent (examples, names, exercises given).
+        - Drop greetings, repetitions and anything not useful to continue the lesson.
+        - Write concise bullet points in the learner's language.
+    </instruction>
+    """
+)
+
+
+def summary_agent(max_tokens: int) -> Agent:
+    """
+    Prepares the agent folding old messages into the conversation summary.
+
+    Args:
+        max_tokens (int): Token budget of the produced summary.
+
+    Returns:
+        Agent: The summary agent.
+    """
+    return Agent(
+        name="summarizer",
+        model=MODEL,
+        instructions=SUMMARY_PROMPT,
+        model_settings=ModelSettings(temperature=0.0, max_tokens=max_tokens),
     )
@@ -1,13 +1,18 @@
+from typing import Awaitable, Callable
+
 from agents import (
     trace,
     Runner,
 )
 from agents.items import ResponseInputItemParam
+from openai.types.responses import ResponseTextDeltaEvent
 
 from brobot.bot.context import ScenarioContext
-from brobot.bot.agents import prepared_agent
+from brobot.bot.agents import prepared_agent, summary_agent
 from brobot.models import Scenario, ScenarioChapter
 
+OnDeltaCallback = Callable[[str], Awaitable[None]]
+
 
 async def generate_answer(
     scenario: Scenario,
@@ -28,3 +33,69 @@ async def generate_answer(
     with trace("training"):
         result = await Runner.run(starting_agent=agent, input=messages, context=context)
         return result.final_output
+
+
+async def stream_answer(
+    scenario: Scenario,
+    current_chapter: ScenarioChapter,
+    messages: list[ResponseInputItemParam],
+    context: ScenarioContext,
+    on_delta: OnDeltaCallback,
+) -> str:
+    """
+    Same as generate_answer, but forward each text delta produced by the model
+    to on_delta as soon as it is received. Tool calls are still executed by the
+    runner, so the context is updated the same way.
+
+    Returns:
+        str: the complete answer once the run is over
+    """
+
+    agent = prepared_agent(
+        scenario=scenario,
+        chapter=current_chapter,
+    )
+
+    with trace("training"):
+        result = Runner.run_streamed(
+            starting_agent=agent, input=messages, context=context
+        )
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(
+                event.data, ResponseTextDeltaEvent
+            ):
+                await on_delta(event.data.delta)
+        return result.final_output
+
+
+async def summarize_messages(
+    summary: str | None,
+    messages: list[ResponseInputItemParam],
+    max_tokens: int,
+) -> str:
+    """
+    Fold messages leaving the conversation window into the rolling summary.
+
+    Args:
+        summary (str | None): The current summary, if any.
+        messages (list): The messages to add to the summary, oldest first.
+        max_tokens (int): Token budget of the produced summary.
+
+    Returns:
+        str: the updated summary
+    """
+    transcript = "\n".join(
+        f"<{message['role']}>{message['content']}</{message['role']}>"
+        for message in messages
+    )
+    prompt = (
+        f"<previous_summary>{summary or ''}</previous_summary>\n"
+        f"<new_messages>\n{transcript}\n</new_messages>"
+    )
+
+    with trace("summary"):
+        result = await Runner.run(
+            starting_agent=summary_agent(max_tokens),
+            input=[{"role": "user", "content": prompt}],
+        )
+        return result.final_output
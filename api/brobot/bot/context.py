@@ -1,6 +1,17 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from brobot.bot.grader import Grading
+from brobot.bot.sandbox import Fixture
 
 
 @dataclass
 class ScenarioContext:
     part_completed: bool
+    # Session owning the query sandbox, and the tables of the current chapter
+    session_id: Optional[int] = None
+    fixtures: List[Fixture] = field(default_factory=list)
+    # How evaluate_query renders results, see brobot.bot.formatting
+    result_format: str = "markdown"
+    # Reference query of the chapter exercise, when it declares one
+    grading: Optional[Grading] = None
@@ -0,0 +1,103 @@
+from io import StringIO
+from typing import Any, Callable, Dict
+
+from rich.console import Console
+from rich.table import Table
+
+from brobot.bot.sandbox import QueryResult
+
+# Longer cells are cut, the model rarely needs more to assess a result
+MAX_CELL_WIDTH = 40
+
+Formatter = Callable[[QueryResult, int], str]
+
+
+def format_cell(value: Any, max_width: int = MAX_CELL_WIDTH) -> str:
+    """
+    Render a value on a single line, cut to max_width characters.
+    """
+    text = "NULL" if value is None else str(value)
+    text = text.replace("\r", " ").replace("\n", " ").replace("\t", " ")
+    if len(text) > max_width:
+        text = text[: max_width - 1] + "…"
+    return text
+
+
+def format_markdown(result: QueryResult, max_width: int = MAX_CELL_WIDTH) -> str:
+    """
+    Render a result as a markdown table, without padding.
+    """
+
+    def line(cells) -> str:
+        return "| " + " | ".join(cells) + " |"
+
+    lines = [
+        line(format_cell(column, max_width) for column in result.columns),
+        line("---" for _ in result.columns),
+    ]
+    for row in result.rows:
+        lines.append(
+            line(format_cell(value, max_width).replace("|", "\\|") for value in row)
+        )
+    return "\n".join(lines)
+
+
+def format_tsv(result: QueryResult, max_width: int = MAX_CELL_WIDTH) -> str:
+    """
+    Render a result as tab separated values, with a header line.
+    """
+    lines = ["\t".join(format_cell(column, max_width) for column in result.columns)]
+    for row in result.rows:
+        lines.append("\t".join(format_cell(value, max_width) for value in row))
+    return "\n".join(lines)
+
+
+def format_rich(result: QueryResult, max_width: int = MAX_CELL_WIDTH) -> str:
+    """
+    Render a result as a rich table, as evaluate_query used to.
+    Much slower, and the box drawing and ANSI codes cost many tokens.
+    """
+    buffer = StringIO()
+    buffered_console = Console(file=buffer, force_terminal=True)
+
+    table = Table(title="Result table")
+
+    for col in result.columns:
+        table.add_column(col)
+
+    for row in result.rows:
+        table.add_row(*[str(item) for item in row])
+
+    buffered_console.print(table, highlight=False)
+    return buffer.getvalue()
+
+
+FORMATTERS: Dict[str, Formatter] = {
+    "markdown": format_markdown,
+    "tsv": format_tsv,
+    "rich": format_rich,
+}
+
+
+def format_result(
+    result: QueryResult, format: str = "markdown", max_width: int = MAX_CELL_WIDTH
+) -> str:
+    """
+    Render the result of a query for the model.
+
+    Args:
+        result (QueryResult): The result to render.
+        format (str): One of FORMATTERS, unknown formats fall back to markdown.
+        max_width (int): Maximum number of characters of a cell.
+    Returns:
+        str: The rendered result.
+    """
+    if not result.columns:
+        return "Query executed, no result set."
+    formatter = FORMATTERS.get(format, format_markdown)
+    text = formatter(result, max_width)
+    if not result.rows:
+        text += "\n(no rows)"
+    if result.truncated:
+        text += f"\n(truncated to the first {len(result.rows)} rows)"
+    return text
@@ -0,0 +1,154 @@
+import decimal
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+import duckdb
+
+from brobot.bot.sandbox import (
+    CODE_BLOCK,
+    Fixture,
+    QueryRejected,
+    QueryResult,
+    SandboxPool,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+# Digits kept when comparing floating point values
+FLOAT_PRECISION = 6
+
+
+@dataclass
+class Grading:
+    """
+    How the exercise of a chapter is graded, declared in its meta:
+
+        {"reference_query": "SELECT ...", "ordered": false}
+    """
+
+    reference_query: str
+    # Whether the rows must come in the same order as the reference ones
+    ordered: bool = False
+
+    @classmethod
+    def from_meta(cls, meta: Optional[dict]) -> Optional["Grading"]:
+        if not meta or not meta.get("reference_query"):
+            return None
+        return cls(meta["reference_query"], bool(meta.get("ordered", False)))
+
+
+@dataclass
+class Verdict:
+    correct: bool
+    reason: str
+
+    def __str__(self) -> str:
+        return f"{'correct' if self.correct else 'incorrect'}: {self.reason}"
+
+
+def is_read_only(query: str) -> bool:
+    """
+    Whether a query only made of SELECT statements, so it can be graded
+    without changing the tables.
+    """
+    try:
+        statements = duckdb.extract_statements(query)
+    except duckdb.Error:
+        return False
+    return bool(statements) and all(
+        statement.type == duckdb.StatementType.SELECT for statement in statements
+    )
+
+
+def extract_query(message: str) -> Optional[str]:
+    """
+    Find the query submitted in a learner message: the last fenced code block,
+    or the whole message when it is a query by itself.
+
+    Returns:
+        str | None: The read-only query, or None when there is none to grade.
+    """
+    blocks = CODE_BLOCK.findall(message)
+    query = blocks[-1].strip() if blocks else message.strip()
+    return query if is_read_only(query) else None
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        value = float(value)
+    if isinstance(value, float):
+        return round(value, FLOAT_PRECISION)
+    return value
+
+
+def _rows(result: QueryResult) -> List[tuple]:
+    return [tuple(_normalize(value) for value in row) for row in result.rows]
+
+
+def compare(expected: QueryResult, actual: QueryResult, ordered: bool) -> Verdict:
+    """
+    Compare the result of a learner query with the reference one. Column names
+    are not compared, only the number of columns and the values.
+    """
+    if len(actual.columns) != len(expected.columns):
+        return Verdict(
+            False,
+            f"expected {len(expected.columns)} column(s), got {len(actual.columns)}",
+        )
+    if actual.truncated != expected.truncated:
+        return Verdict(False, "the number of rows differs from the expected one")
+
+    expected_rows, actual_rows = _rows(expected), _rows(actual)
+    if len(actual_rows) != len(expected_rows):
+        return Verdict(
+            False, f"expected {len(expected_rows)} row(s), got {len(actual_rows)}"
+        )
+    if Counter(actual_rows) != Counter(expected_rows):
+        return Verdict(False, "the rows differ from the expected ones")
+    if ordered and actual_rows != expected_rows:
+        return Verdict(False, "the rows are right but not in the expected order")
+    return Verdict(True, "the result matches the expected one")
+
+
+async def grade(
+    pool: SandboxPool,
+    session_id: int,
+    fixtures: Sequence[Fixture],
+    grading: Grading,
+    query: str,
+) -> Optional[Verdict]:
+    """
+    Run a learner query and the reference one on the fixtures, and compare them.
+
+    Both run in a grading sandbox of the session, apart from the one the learner
+    plays with, so the tables are the fixtures untouched. The reference result
+    is shared across sessions by the result cache.
+
+    Args:
+        pool (SandboxPool): The pool running the queries.
+        session_id (int): The session of the learner.
+        fixtures (Sequence[Fixture]): The tables of the chapter.
+        grading (Grading): The grading of the chapter.
+        query (str): The learner query.
+    Returns:
+        Verdict | None: The verdict, or None when the query cannot be graded.
+    """
+    if not is_read_only(query):
+        return None
+
+    key = ("grader", session_id)
+    try:
+        expected = await pool.execute(key, list(fixtures), grading.reference_query)
+    except (QueryRejected, duckdb.Error) as e:
+        logger.error(f"[{session_id}] reference query failed: {e}")
+        return None
+
+    try:
+        actual = await pool.execute(key, list(fixtures), query)
+    except QueryRejected as e:
+        return Verdict(False, str(e))
+    except duckdb.Error as e:
+        return Verdict(False, f"Query error: {e}")
+    return compare(expected, actual, grading.ordered)
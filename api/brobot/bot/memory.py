@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Sequence
+
+from agents.items import ResponseInputItemParam
+
+from brobot.config import settings
+from brobot.bot.complete import summarize_messages
+from brobot.models import SessionMessage
+
+# Rough estimate, good enough to budget prompts without a tokenizer
+CHARS_PER_TOKEN = 4
+
+Summarizer = Callable[
+    [Optional[str], list[ResponseInputItemParam], int], Awaitable[str]
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def to_input_item(message: SessionMessage) -> ResponseInputItemParam:
+    """
+    Convert a persisted message to a model input item.
+    """
+    return {"role": message.role, "content": message.content}
+
+
+@dataclass
+class ConversationWindow:
+    """
+    Messages to send to the model, and the summary state to persist.
+    """
+
+    messages: list[ResponseInputItemParam]
+    summary: Optional[str]
+    summary_message_id: Optional[int]
+    summary_updated: bool = False
+
+
+class ConversationMemory:
+    """
+    Sliding window over the conversation, plus a rolling summary of older messages.
+
+    The last turns are sent verbatim within a token budget. Messages leaving the
+    window are kept verbatim until enough of them accumulate (or the budget is
+    exceeded), then they are folded into the summary in a single call.
+    """
+
+    def __init__(
+        self,
+        window_turns: int,
+        max_tokens: int,
+        summary_batch: int,
+        summary_max_tokens: int,
+        summarizer: Summarizer = summarize_messages,
+    ):
+        self.window_turns = window_turns
+        self.max_tokens = max_tokens
+        self.summary_batch = summary_batch
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+
+    @classmethod
+    def from_settings(
+        cls, summarizer: Summarizer = summarize_messages
+    ) -> "ConversationMemory":
+        """
+        Create a conversation memory configured from the application settings.
+        """
+        return cls(
+            window_turns=settings.MEMORY_WINDOW_TURNS,
+            max_tokens=settings.MEMORY_MAX_TOKENS,
+            summary_batch=settings.MEMORY_SUMMARY_BATCH,
+            summary_max_tokens=settings.MEMORY_SUMMARY_MAX_TOKENS,
+            summarizer=summarizer,
+        )
+
+    def _window(self, messages: list[SessionMessage]) -> list[SessionMessage]:
+        """
+        Select the most recent messages fitting in the window and the token budget.
+        The last message is always kept.
+        """
+        # A turn is a learner message and the answer of the tutor
+        max_messages = max(self.window_turns * 2, 1)
+        window: list[SessionMessage] = []
+        tokens = 0
+        for message in reversed(messages):
+            cost = estimate_tokens(message.content)
+            if window and (
+                len(window) >= max_messages or tokens + cost > self.max_tokens
+            ):
+                break
+            window.append(message)
+            tokens += cost
+        window.reverse()
+        return window
+
+    async def build(
+        self,
+        messages: Sequence[SessionMessage],
+        summary: Optional[str] = None,
+        summary_message_id: Optional[int] = None,
+        summarizer: Optional[Summarizer] = None,
+    ) -> ConversationWindow:
+        """
+        Build the messages to send to the model.
+
+        Args:
+            messages (Sequence[SessionMessage]): Every message of the session.
+            summary (str, optional): The persisted summary.
+            summary_message_id (int, optional): Last message folded into the summary.
+            summarizer (Summarizer, optional): Replaces the summarizer of the
+                memory for this call, e.g. to schedule it.
+        Returns:
+            ConversationWindow: The prompt messages and the summary state.
+        """
+        pending = sorted(
+            (
+                message
+                for message in messages
+                if summary_message_id is None or message.id > summary_message_id
+            ),
+            key=lambda message: message.id,
+        )
+        window = self._window(pending)
+        evicted = pending[: len(pending) - len(window)]
+
+        summary_updated = False
+        pending_tokens = sum(estimate_tokens(message.content) for message in pending)
+        if evicted and (
+            len(evicted) >= self.summary_batch or pending_tokens > self.max_tokens
+        ):
+            summary = await (summarizer or self.summarizer)(
+                summary,
+                [to_input_item(message) for message in evicted],
+                self.summary_max_tokens,
+            )
+            summary_message_id = evicted[-1].id
+            summary_updated = True
+        else:
+            window = pending
+
+        prompt = [to_input_item(message) for message in window]
+        if summary:
+            prompt.insert(
+                0,
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation:\n{summary}",
+                },
+            )
+
+        return ConversationWindow(
+            messages=prompt,
+            summary=summary,
+            summary_message_id=summary_message_id,
+            summary_updated=summary_updated,
+        )
@@ -0,0 +1,122 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import duckdb
+
+# Results of these functions change between runs
+VOLATILE_FUNCTIONS = {
+    "random",
+    "uuid",
+    "gen_random_uuid",
+    "setseed",
+    "now",
+    "current_date",
+    "current_time",
+    "current_timestamp",
+    "get_current_time",
+    "get_current_timestamp",
+    "today",
+    "nextval",
+    "currval",
+}
+
+# Only used to parse queries, from the event loop thread
+_parser = duckdb.connect(database=":memory:")
+
+
+def _normalize(node: Any) -> Any:
+    """
+    Drop the positions from a serialized syntax tree, they depend on whitespace.
+    """
+    if isinstance(node, dict):
+        return {
+            key: _normalize(value)
+            for key, value in node.items()
+            if key != "query_location"
+        }
+    if isinstance(node, list):
+        return [_normalize(value) for value in node]
+    return node
+
+
+def _calls_volatile_function(node: Any) -> bool:
+    if isinstance(node, dict):
+        if node.get("class") == "FUNCTION":
+            name = node.get("function_name", "")
+        elif node.get("class") == "COLUMN_REF" and len(node["column_names"]) == 1:
+            # current_date and the like are parsed as columns without parentheses
+            name = node["column_names"][0]
+        else:
+            name = ""
+        if name.lower() in VOLATILE_FUNCTIONS:
+            return True
+        return any(_calls_volatile_function(value) for value in node.values())
+    if isinstance(node, list):
+        return any(_calls_volatile_function(value) for value in node)
+    return False
+
+
+def query_fingerprint(query: str) -> Optional[str]:
+    """
+    Fingerprint of a query, insensitive to whitespace, keyword case and comments.
+
+    Only read-only queries made of SELECT statements calling no volatile
+    function can be cached.
+
+    Returns:
+        str | None: The fingerprint, or None when the query cannot be cached.
+    """
+    try:
+        serialized = _parser.execute(
+            "SELECT json_serialize_sql(?)", [query]
+        ).fetchone()[0]
+    except duckdb.Error:
+        return None
+    tree = json.loads(serialized)
+    if tree.get("error") or _calls_volatile_function(tree):
+        return None
+    normalized = json.dumps(_normalize(tree["statements"]), sort_keys=True)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache of query results, shared by every session.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._results: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: Hashable, result: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._results),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,461 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import math
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Hashable, List, Optional, Tuple
+
+import duckdb
+
+from brobot.bot.result_cache import ResultCache, query_fingerprint
+from brobot.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+DATA_BLOCK = re.compile(r"<data(?:\s+name=\"(\w+)\")?\s*>(.*?)</data>", re.S)
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)", re.I)
+CODE_BLOCK = re.compile(r"```(?:sql)?(.*?)```", re.S | re.I)
+DEFAULT_TABLE = "data"
+
+
+class QueryRejected(Exception):
+    """
+    The query was stopped or refused by the sandbox limits.
+    """
+
+
+@dataclass
+class QueryLimits:
+    """
+    Bounds of the execution of a learner query.
+    """
+
+    timeout: float = 5.0
+    max_rows: int = 100
+    memory_mb: int = 128
+    threads: int = 1
+    # Queries whose plan estimates more rows on any operator are refused
+    max_plan_rows: int = 10_000_000
+
+    @classmethod
+    def from_settings(cls) -> "QueryLimits":
+        return cls(
+            timeout=settings.SANDBOX_QUERY_TIMEOUT_SECONDS,
+            max_rows=settings.SANDBOX_QUERY_MAX_ROWS,
+            memory_mb=settings.SANDBOX_QUERY_MEMORY_MB,
+            threads=settings.SANDBOX_QUERY_THREADS,
+            max_plan_rows=settings.SANDBOX_MAX_PLAN_ROWS,
+        )
+
+
+@dataclass
+class QueryResult:
+    columns: List[str]
+    rows: List[Tuple[Any, ...]]
+    # More rows than max_rows were produced, only the first ones are kept
+    truncated: bool = False
+
+
+@dataclass
+class Fixture:
+    """
+    Table of an exercise, as described by a <data> block of the chapter.
+    """
+
+    table: str
+    columns: List[str]
+    types: List[str]
+    rows: List[List[Any]] = field(default_factory=list)
+
+
+PARSERS = {
+    "BIGINT": int,
+    "DOUBLE": float,
+    "DATE": datetime.date.fromisoformat,
+    "VARCHAR": str,
+}
+
+
+def _column_type(values: List[str]) -> str:
+    def all_match(parse) -> bool:
+        try:
+            for value in values:
+                parse(value)
+        except ValueError:
+            return False
+        return True
+
+    if not values:
+        return "VARCHAR"
+    for type_ in ("BIGINT", "DOUBLE", "DATE"):
+        if all_match(PARSERS[type_]):
+            return type_
+    return "VARCHAR"
+
+
+def parse_table(text: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Parse a pipe separated table, the separator line under the header is skipped.
+    """
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    if not lines:
+        return [], []
+    columns = [cell.strip() for cell in lines[0].split("|")]
+    rows = [
+        [cell.strip() for cell in line.split("|")]
+        for line in lines[1:]
+        if not set(line) <= set("-+| ")
+    ]
+    return columns, [row for row in rows if len(row) == len(columns)]
+
+
+def parse_fixtures(content: str) -> List[Fixture]:
+    """
+    Extract the exercise tables from the content of a chapter.
+
+    A <data> block may name its table with a name attribute, otherwise the
+    tables queried in the SQL examples of the chapter (FROM or JOIN clauses)
+    are used in order.
+
+    Args:
+        content (str): The content of the chapter.
+    Returns:
+        List[Fixture]: The tables to create in the sandbox.
+    """
+    code = "\n".join(CODE_BLOCK.findall(content))
+    referenced = list(dict.fromkeys(TABLE_REFERENCE.findall(code)))
+    fixtures = []
+    for index, (name, block) in enumerate(DATA_BLOCK.findall(content)):
+        columns, rows = parse_table(block)
+        if not columns:
+            continue
+        if not name:
+            name = referenced[index] if index < len(referenced) else DEFAULT_TABLE
+        types = [
+            _column_type([row[i] for row in rows if row[i] != ""])
+            for i in range(len(columns))
+        ]
+        fixtures.append(
+            Fixture(
+                table=name,
+                columns=columns,
+                types=types,
+                rows=[
+                    [
+                        PARSERS[type_](value) if value != "" else None
+                        for type_, value in zip(types, row)
+                    ]
+                    for row in rows
+                ],
+            )
+        )
+    return fixtures
+
+
+def fixtures_key(fixtures: List[Fixture]) -> str:
+    payload = json.dumps(
+        [[f.table, f.columns, f.types, f.rows] for f in fixtures], default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _estimated_rows(node: dict) -> Tuple[int, int]:
+    """
+    Estimate the rows produced by a plan node, and the largest estimate of its
+    subtree. Cross products have no estimate, their size is the product of
+    their inputs.
+    """
+    children = [_estimated_rows(child) for child in node.get("children", [])]
+    largest = max((child[1] for child in children), default=0)
+    cardinality = node.get("extra_info", {}).get("Estimated Cardinality")
+    if cardinality is not None:
+        rows = int(cardinality)
+    elif node["name"].strip() == "CROSS_PRODUCT":
+        rows = math.prod(child[0] for child in children)
+    else:
+        rows = max((child[0] for child in children), default=0)
+    return rows, max(rows, largest)
+
+
+class Sandbox:
+    """
+    In-memory DuckDB database seeded with the fixtures of a chapter.
+
+    Memory and threads are capped, without any temporary directory to spill
+    to. Once seeded, external access (files, network) is disabled and the
+    configuration locked, so a query cannot lift the limits.
+    """
+
+    def __init__(self, fixtures: List[Fixture], limits: Optional[QueryLimits] = None):
+        self.key = fixtures_key(fixtures)
+        self.limits = limits or QueryLimits()
+        self.memory = 0
+        # Set once a statement may have changed the fixtures
+        self.dirty = False
+        self.lock = asyncio.Lock()
+        self._cursor: Optional[duckdb.DuckDBPyConnection] = None
+        self.connection = duckdb.connect(
+            database=":memory:",
+            config={
+                "threads": self.limits.threads,
+                "memory_limit": f"{self.limits.memory_mb}MB",
+                "temp_directory": "",
+            },
+        )
+        for fixture in fixtures:
+            columns = ", ".join(
+                f'"{column}" {type_}'
+                for column, type_ in zip(fixture.columns, fixture.types)
+            )
+            self.connection.execute(f'CREATE TABLE "{fixture.table}" ({columns})')
+            if fixture.rows:
+                placeholders = ", ".join("?" for _ in fixture.columns)
+                self.connection.executemany(
+                    f'INSERT INTO "{fixture.table}" VALUES ({placeholders})',
+                    fixture.rows,
+                )
+        self.connection.execute("SET enable_external_access = false")
+        self.connection.execute("SET lock_configuration = true")
+
+    def _check_plan(self, cursor: duckdb.DuckDBPyConnection, statement: str) -> None:
+        try:
+            [(_, plan)] = cursor.execute(
+                f"EXPLAIN (FORMAT json) {statement}"
+            ).fetchall()
+        except duckdb.Error:
+            # Not explainable (e.g. PRAGMA), errors are reported by the execution
+            return
+        estimate = max(
+            (_estimated_rows(node)[1] for node in json.loads(plan)), default=0
+        )
+        if estimate > self.limits.max_plan_rows:
+            raise QueryRejected(
+                f"Query refused: the plan estimates {estimate} rows, "
+                f"over the limit of {self.limits.max_plan_rows}"
+            )
+
+    def execute(self, query: str) -> QueryResult:
+        """
+        Run a query on its own cursor. Blocking, meant to run in a worker thread.
+
+        Each statement is checked against its plan right before running, so it
+        sees the tables created by the previous ones. Rows of the last statement
+        are fetched up to max_rows.
+        """
+        cursor = self._cursor = self.connection.cursor()
+        try:
+            result = None
+            for statement in cursor.extract_statements(query):
+                if statement.type != duckdb.StatementType.SELECT:
+                    self.dirty = True
+                self._check_plan(cursor, statement.query)
+                result = cursor.execute(statement.query)
+
+            columns, rows = [], []
+            if result is not None and result.description:
+                columns = [col[0] for col in result.description]
+                rows = result.fetchmany(self.limits.max_rows + 1)
+            truncated = len(rows) > self.limits.max_rows
+
+            self.memory = cursor.execute(
+                "SELECT sum(memory_usage_bytes) FROM duckdb_memory()"
+            ).fetchone()[0]
+            return QueryResult(columns, rows[: self.limits.max_rows], truncated)
+        finally:
+            self._cursor = None
+            cursor.close()
+
+    def interrupt(self) -> None:
+        """
+        Stop the running query, from any thread.
+        """
+        if cursor := self._cursor:
+            cursor.interrupt()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SandboxPool:
+    """
+    One sandbox per session, so a learner dropping a table or running a long
+    query never affects the others.
+
+    Queries run in a thread pool to keep the event loop free, one at a time per
+    sandbox. Sandboxes are reseeded when the fixtures change (new chapter), and
+    the least recently used ones are closed when there are too many of them or
+    when their memory use goes over the cap.
+    """
+
+    def __init__(
+        self,
+        max_sandboxes: int,
+        max_memory: int,
+        threads: int,
+        limits: Optional[QueryLimits] = None,
+        cache_size: int = 0,
+    ):
+        self.max_sandboxes = max_sandboxes
+        self.max_memory = max_memory
+        self.limits = limits or QueryLimits()
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="sandbox"
+        )
+        self._sandboxes: OrderedDict[Hashable, Sandbox] = OrderedDict()
+        self._seeding = asyncio.Lock()
+        self.evictions = 0
+        self.cache = ResultCache(cache_size)
+
+    @classmethod
+    def from_settings(cls) -> "SandboxPool":
+        """
+        Create a sandbox pool configured from the application settings.
+        """
+        return cls(
+            max_sandboxes=settings.SANDBOX_MAX_SESSIONS,
+            max_memory=settings.SANDBOX_MAX_MEMORY_MB * 1024 * 1024,
+            threads=settings.SANDBOX_THREADS,
+            limits=QueryLimits.from_settings(),
+            cache_size=settings.SANDBOX_RESULT_CACHE_SIZE,
+        )
+
+    @property
+    def memory(self) -> int:
+        return sum(sandbox.memory for sandbox in self._sandboxes.values())
+
+    def __len__(self) -> int:
+        return len(self._sandboxes)
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args
+        )
+
+    @asynccontextmanager
+    async def lease(
+        self, key: Hashable, fixtures: List[Fixture]
+    ) -> AsyncIterator[Sandbox]:
+        """
+        Get the sandbox of a session, seeded with the given fixtures.
+
+        Args:
+            key (Hashable): The owner of the sandbox, usually the session id.
+            fixtures (List[Fixture]): The tables the sandbox must start with.
+        Yields:
+            Sandbox: The sandbox, locked for the duration of the lease.
+        """
+        while True:
+            outdated = None
+            async with self._seeding:
+                sandbox = self._sandboxes.get(key)
+                if sandbox is None or sandbox.key != fixtures_key(fixtures):
+                    outdated = sandbox
+                    sandbox = await self._run(Sandbox, fixtures, self.limits)
+                    self._sandboxes[key] = sandbox
+                self._sandboxes.move_to_end(key)
+
+            if outdated is not None:
+                # Replaced already, closed once the query running on it is done
+                async with outdated.lock:
+                    outdated.close()
+
+            async with sandbox.lock:
+                # Otherwise replaced or evicted, and closed, while waiting
+                if self._sandboxes.get(key) is sandbox:
+                    yield sandbox
+                    break
+        self._evict(keep=key)
+
+    async def execute(
+        self, key: Hashable, fixtures: List[Fixture], query: str
+    ) -> QueryResult:
+        """
+        Run a query in the sandbox of a session, from a worker thread.
+        The query is interrupted when it runs longer than the timeout.
+
+        Results of read-only queries are cached by query fingerprint and
+        fixtures, as long as the sandbox still holds the fixtures untouched.
+
+        Raises:
+            QueryRejected: The query timed out or its plan is too large.
+            duckdb.Error: The query failed.
+        """
+        cache_key = None
+        if self.cache.maxsize > 0 and self._pristine(key, fixtures):
+            fingerprint = query_fingerprint(query)
+            if fingerprint is not None:
+                cache_key = (fingerprint, fixtures_key(fixtures), self.limits.max_rows)
+                if (cached := self.cache.get(cache_key)) is not None:
+                    return cached
+
+        async with self.lease(key, fixtures) as sandbox:
+            if sandbox.dirty:
+                # Changed by a query running meanwhile
+                cache_key = None
+            execution = asyncio.ensure_future(self._run(sandbox.execute, query))
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.shield(execution), self.limits.timeout
+                )
+            except TimeoutError:
+                sandbox.interrupt()
+                # Keep the sandbox leased until the thread is done with it
+                try:
+                    await execution
+                except duckdb.Error:
+                    pass
+                raise QueryRejected(
+                    f"Query interrupted after {self.limits.timeout:g} seconds"
+                )
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
+
+    def _pristine(self, key: Hashable, fixtures: List[Fixture]) -> bool:
+        # A missing or outdated sandbox is seeded again before running
+        sandbox = self._sandboxes.get(key)
+        return (
+            sandbox is None
+            or sandbox.key != fixtures_key(fixtures)
+            or not sandbox.dirty
+        )
+
+    def _close(self, key: Hashable) -> None:
+        sandbox = self._sandboxes.pop(key)
+        sandbox.close()
+
+    def _evict(self, keep: Hashable) -> None:
+        for key in list(self._sandboxes):
+            if (
+                len(self._sandboxes) <= self.max_sandboxes
+                and self.memory <= self.max_memory
+            ):
+                return
+            sandbox = self._sandboxes[key]
+            if key == keep or sandbox.lock.locked():
+                continue
+            logger.info(f"[{key}] sandbox evicted")
+            self._close(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "sandboxes": len(self._sandboxes),
+            "memory": self.memory,
+            "evictions": self.evictions,
+            "cache": self.cache.stats(),
+        }
+
+    def close(self) -> None:
+        for key in list(self._sandboxes):
+            self._close(key)
+        self.executor.shutdown(wait=False)
+
+
+sandbox_pool = SandboxPool.from_settings()
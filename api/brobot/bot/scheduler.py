@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Hashable, Optional, TypeVar
+
+from openai import RateLimitError
+
+from brobot.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+T = TypeVar("T")
+
+OnQueuedCallback = Callable[[int], Awaitable[None]]
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a per minute rate.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: int, clock: Callable[[], float] = time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.clock = clock
+        self.tokens = float(per_minute)
+        self.updated_at = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self, amount: int = 1) -> None:
+        """
+        Wait until the bucket holds enough tokens, then consume them.
+        Requests larger than the bucket only wait for a full bucket.
+        """
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)
+        # Waiters are served in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class CompletionScheduler:
+    """
+    Bound the number of completions in flight across every session.
+
+    Requests beyond the limit wait in one queue per session, and free slots are
+    handed to the sessions in round robin so a busy session cannot starve the
+    others. Each request is also throttled by requests and tokens per minute,
+    and rate limit errors are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_retries: int = 5,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        self.in_flight = 0
+        self._waiters: OrderedDict[Hashable, Deque[asyncio.Future]] = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "CompletionScheduler":
+        """
+        Create a scheduler configured from the application settings.
+        """
+        return cls(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            max_retries=settings.LLM_MAX_RETRIES,
+            retry_base_delay=settings.LLM_RETRY_BASE_DELAY,
+            retry_max_delay=settings.LLM_RETRY_MAX_DELAY,
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def _acquire_slot(
+        self, key: Hashable, on_queued: Optional[OnQueuedCallback]
+    ) -> None:
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(waiter)
+        try:
+            # Inside the try: a failing callback must not leave the waiter queued
+            if on_queued:
+                await on_queued(self.queue_depth)
+            await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over right before the failure
+                self._release_slot()
+            else:
+                waiter.cancel()
+                self._remove_waiter(key, waiter)
+            raise
+
+    def _remove_waiter(self, key: Hashable, waiter: asyncio.Future) -> None:
+        waiters = self._waiters.get(key)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[key]
+
+    def _release_slot(self) -> None:
+        # Hand the slot over to the next session in round robin order
+        while self._waiters:
+            key, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: random delay up to the exponential cap
+        cap = min(self.retry_max_delay, self.retry_base_delay * 2**attempt)
+        return random.uniform(0, cap)
+
+    async def run(
+        self,
+        key: Hashable,
+        completion: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        on_queued: Optional[OnQueuedCallback] = None,
+        retryable: Optional[Callable[[], bool]] = None,
+    ) -> T:
+        """
+        Run a completion once a slot is available and the rate limits allow it.
+
+        Args:
+            key (Hashable): Fairness key, usually the session id.
+            completion (Callable): Coroutine function performing the completion.
+            estimated_tokens (int): Tokens the completion is expected to use.
+            on_queued (Callable, optional): Called with the queue depth when the
+                request has to wait for a slot.
+            retryable (Callable, optional): Whether a rate limited completion may
+                be retried, e.g. not once part of it was streamed to the client.
+        Returns:
+            The result of the completion.
+        """
+        await self._acquire_slot(key, on_queued)
+        try:
+            attempt = 0
+            while True:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(estimated_tokens)
+                try:
+                    return await completion()
+                except RateLimitError:
+                    if attempt >= self.max_retries or (retryable and not retryable()):
+                        raise
+                    delay = self._backoff(attempt)
+                    attempt += 1
+                    logger.warning(
+                        f"[{key}] rate limited, retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+        finally:
+            self._release_slot()
+
+
+completion_scheduler = CompletionScheduler.from_settings()
@@ -1,64 +1,40 @@
-from io import StringIO
-from textwrap import dedent
-
-from rich.console import Console
-from rich.table import Table
-
 import duckdb
-from agents import function_tool
-
-connection = duckdb.connect(database=":memory:")
+from agents import RunContextWrapper, function_tool
 
-connection.execute(
-    dedent(
-        """
-            CREATE TABLE students (
-                id INTEGER,
-                name VARCHAR,
-                note INTEGER
-            );
-        """
-    )
-)
-
-connection.execute(
-    dedent(
-        """            
-            INSERT INTO students VALUES 
-                (1, 'Alice', 7),
-                (2, 'John', 6),
-                (3, 'Charlie', 8);
-        """
-    )
-)
+from brobot.bot.context import ScenarioContext
+from brobot.bot.formatting import format_result
+from brobot.bot.grader import grade
+from brobot.bot.sandbox import QueryRejected, sandbox_pool
 
 
 @function_tool(name_override="evaluate_query")
-async def evaluate_query(query: str) -> str:
+async def evaluate_query(
+    wrapper: RunContextWrapper[ScenarioContext], query: str
+) -> str:
     """
     Execute the query against the duckdb engine that expose the table of the exercise.
+    Each session has its own database, so the learner may modify it freely.
 
     Args:
         query (str): SQL query of the user
 
     Returns:
-        str: the table representation of the result
+        str: the table representation of the result, in the format of the chapter,
+        followed by the verdict when the chapter declares a reference query
     """
-    result = connection.execute(query)
-    columns = [col[0] for col in result.description]
-    rows = result.fetchall()
-
-    buffer = StringIO()
-    buffered_console = Console(file=buffer, force_terminal=True)
-
-    table = Table(title="Result table")
-
-    for col in columns:
-        table.add_column(col)
-
-    for row in rows:
-        table.add_row(*[str(item) for item in row])
-
-    buffered_console.print(table, highlight=False)
-
-    return buffer.getvalue()
+    context = wrapper.context
+    try:
+        result = await sandbox_pool.execute(context.session_id, context.fixtures, query)
+    except QueryRejected as e:
+        return str(e)
+    except duckdb.Error as e:
+        return f"Query error: {e}"
+
+    output = format_result(result, context.result_format)
+    if context.grading:
+        verdict = await grade(
+            sandbox_pool, context.session_id, context.fixtures, context.grading, query
+        )
+        if verdict:
+            output += f"\n\nCompared to the expected result: {verdict}"
+    return output
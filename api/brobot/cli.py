@@ -0,0 +1,50 @@
+"""
+Command line tools of the API.
+
+    python -m brobot.cli import-scenarios ../data/scenarios
+"""
+
+import asyncio
+from pathlib import Path
+
+import typer
+
+from brobot.database import async_session_factory, engine
+from brobot.services.importer import import_scenarios
+
+app = typer.Typer(help="Brobot administration commands.")
+
+
+@app.callback()
+def main():
+    pass
+
+
+@app.command("import-scenarios")
+def import_scenarios_command(
+    path: Path = typer.Argument(
+        ..., exists=True, help="Directory or tarball of JSON scenarios."
+    ),
+    workers: int = typer.Option(4, help="Processes parsing the files."),
+):
+    """
+    Create or update the scenarios of a directory or tarball, by slug.
+    """
+
+    async def run():
+        try:
+            async with async_session_factory() as session:
+                return await import_scenarios(session, path, workers)
+        finally:
+            await engine.dispose()
+
+    report = asyncio.run(run())
+    for outcome in ("created", "updated", "skipped", "invalid"):
+        slugs = getattr(report, outcome)
+        typer.echo(f"{outcome}: {len(slugs)} {' '.join(slugs)}".rstrip())
+    if report.invalid:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -7,6 +9,77 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     MODEL_NAME: str
 
+    # Conversation memory sent to the model on every turn
+    MEMORY_WINDOW_TURNS: int = 6
+    MEMORY_MAX_TOKENS: int = 3000
+    MEMORY_SUMMARY_BATCH: int = 6
+    MEMORY_SUMMARY_MAX_TOKENS: int = 400
+
+    # Number of prepared agents (one per scenario chapter) kept in memory
+    AGENT_CACHE_SIZE: int = 256
+
+    # Completions scheduling across every session (0 disables a rate limit)
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 200000
+    LLM_MAX_RETRIES: int = 5
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 30.0
+
+    # Delay before answering, so messages sent in a burst get a single answer
+    TURN_DEBOUNCE_SECONDS: float = 0.3
+
+    # "memory" for a single worker, "postgres" to share websockets across workers
+    WS_PUBSUB_BACKEND: str = "memory"
+    # Defaults to DATABASE_URL
+    WS_PUBSUB_URL: Optional[str] = None
+    # Frames kept per session to resume a websocket, and number of sessions
+    WS_REPLAY_BUFFER_SIZE: int = 1000
+    WS_REPLAY_SESSIONS: int = 1000
+    # Frames waiting for a slow client, and what to do once the queue is full:
+    # "drop_deltas" or "disconnect"
+    WS_WRITER_QUEUE_SIZE: int = 256
+    WS_WRITER_OVERFLOW: str = "drop_deltas"
+
+    # DuckDB sandboxes running the queries of the learners, one per session
+    SANDBOX_MAX_SESSIONS: int = 64
+    SANDBOX_MAX_MEMORY_MB: int = 512
+    SANDBOX_THREADS: int = 4
+    # Limits of a single learner query
+    SANDBOX_QUERY_TIMEOUT_SECONDS: float = 5.0
+    SANDBOX_QUERY_MAX_ROWS: int = 100
+    SANDBOX_QUERY_MEMORY_MB: int = 128
+    SANDBOX_QUERY_THREADS: int = 1
+    SANDBOX_MAX_PLAN_ROWS: int = 10000000
+    # Default rendering of query results: "markdown", "tsv" or "rich", chapters
+    # may override it with a "result_format" meta
+    SANDBOX_RESULT_FORMAT: str = "markdown"
+    # Results of read-only queries shared across sessions with the same fixtures
+    SANDBOX_RESULT_CACHE_SIZE: int = 1024
+
+    # Scenario imports from GitHub, the base URL may point to a local stand-in
+    GITHUB_RAW_BASE_URL: str = "https://raw.githubusercontent.com"
+    GITHUB_TIMEOUT_SECONDS: float = 10.0
+    # Raw files kept with their ETag / Last-Modified for conditional requests
+    GITHUB_CACHE_SIZE: int = 128
+
+    # Encoding of the websocket frames and of the responses: "orjson" or "json"
+    JSON_SERIALIZER: str = "orjson"
+
+    # Scenarios and chapters kept in memory, they only change on import. The TTL
+    # bounds how long a worker serves a scenario changed by another one.
+    CONTENT_CACHE_SIZE: int = 4096
+    CONTENT_CACHE_MAX_MB: int = 64
+    CONTENT_CACHE_TTL_SECONDS: float = 300.0
+
+    # Browser caching of the scenario endpoints, 0 revalidates on every use
+    # against the ETag
+    SCENARIOS_HTTP_MAX_AGE: int = 0
+
+    # Directory or tarball of scenarios imported at startup, unchanged ones are skipped
+    SCENARIOS_IMPORT_PATH: Optional[str] = None
+    SCENARIOS_IMPORT_WORKERS: int = 4
+
     class Config:
         case_sensitive = True
 
@@ -1,22 +1,55 @@
-from sqlmodel import create_engine, Session, SQLModel
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
 from brobot.config import settings
 
-engine = create_engine(settings.DATABASE_URL, echo=False)
+# Map synchronous driver names (as used by alembic) to their asyncio counterparts
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(database_url: str) -> str:
+    """
+    Convert a database URL to its asyncio driver equivalent.
+    URLs already using an async driver are returned unchanged.
+
+    Args:
+        database_url (str): The configured database URL.
+    Returns:
+        str: The database URL using an asyncio compatible driver.
+    """
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+engine = create_async_engine(async_database_url(settings.DATABASE_URL), echo=False)
+
+async_session_factory = async_sessionmaker(
+    engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
-def get_session():
+async def get_session():
     """
-    Dependency that provides a SQLModel session.
+    Dependency that provides an asynchronous SQLModel session.
     Yields a new session for each request and ensures it is closed after use.
     """
-    with Session(engine) as session:
+    async with async_session_factory() as session:
         yield session
 
 
-def init_db():
+async def init_db():
     """
     Initialize the database by importing all models and creating the tables.
     This function should be called at application startup.
     """
 
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
@@ -1,3 +1,4 @@
+from brobot.dto.bulk_import import BulkImportReportDTO
 from brobot.dto.create.create_scenario import (
     CreateScenarioDTO,
     CreateScenarioChapterDTO,
@@ -15,6 +16,7 @@ from brobot.dto.session_with_scenarios import (
 )
 
 __all__ = [
+    "BulkImportReportDTO",
     "ImportRequestDTO",
     "ScenarioChapterDTO",
     "CreateScenarioChapterDTO",
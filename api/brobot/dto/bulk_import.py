@@ -0,0 +1,15 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class BulkImportReportDTO(BaseModel):
+    """
+    DTO reporting the slugs of a bulk import, by outcome, and the files that
+    could not be imported when importing from a directory.
+    """
+
+    created: List[str] = []
+    updated: List[str] = []
+    skipped: List[str] = []
+    invalid: List[str] = []
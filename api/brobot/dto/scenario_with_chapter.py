@@ -16,4 +16,5 @@ class ScenarioWithChapterDTO(BaseModel):
     title: str
     description: str
     created_at: datetime.datetime
+    version: int
     chapters: list[ScenarioChapterWithoutContentDTO] = []
@@ -1,4 +1,5 @@
 import datetime
+from typing import Optional
 
 
 from pydantic import BaseModel
@@ -6,7 +7,6 @@ from pydantic import BaseModel
 from brobot.dto.scenario_with_chapter import (
     ScenarioWithChapterDTO,
 )
-from brobot.dto.session_messages import SessionMessageDTO
 
 
 class CompletedChapterDTO(BaseModel):
@@ -23,10 +23,14 @@ class TrainingSessionDTO(BaseModel):
     """
     Class to represent a training session with its associated scenario.
     This is used for serialization purposes.
+
+    Messages are not included, they are paged by the messages endpoint.
     """
 
     id: int
     created_at: datetime.datetime
     scenario: ScenarioWithChapterDTO
-    messages: list[SessionMessageDTO] = []
+    message_count: int = 0
     completions: list[CompletedChapterDTO] = []
+    current_chapter_id: Optional[int] = None
+    completed_chapters: int = 0
@@ -1,14 +1,35 @@
 import datetime
+import hashlib
+import json
 from typing import Optional, List, Dict
 from sqlmodel import Field, SQLModel, Relationship, JSON
 
-from sqlalchemy import UniqueConstraint, Column, Integer, String, DateTime, Boolean
+from sqlalchemy import (
+    UniqueConstraint,
+    Index,
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Boolean,
+)
 
 
 def now_utc() -> datetime.datetime:
     return datetime.datetime.now(datetime.timezone.utc)
 
 
+def chapter_content_hash(title: str, content: str, meta: Optional[Dict]) -> str:
+    """
+    Hash of what a chapter teaches, its order excluded so a moved chapter keeps it.
+    """
+    digest = hashlib.sha256()
+    for part in (title, content, json.dumps(meta or {}, sort_keys=True)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
 class User(SQLModel, table=True):
     __tablename__ = "user"
 
@@ -41,6 +62,8 @@ class TrainingSession(SQLModel, table=True):
     __tablename__ = "training_session"
     __table_args__ = (
         UniqueConstraint("user_id", "scenario_id", name="unique_user_scenario"),
+        # Sessions of a user, paged by id
+        Index("ix_training_session_user_id_id", "user_id", "id"),
     )
 
     id: int = Field(sa_column=Column(Integer, primary_key=True, autoincrement=True))
@@ -51,9 +74,26 @@ class TrainingSession(SQLModel, table=True):
         default_factory=now_utc,
     )
 
+    # Rolling summary of the messages that left the conversation window,
+    # up to and including summary_message_id
+    summary: Optional[str] = Field(default=None, sa_column=Column(String))
+    summary_message_id: Optional[int] = Field(default=None, sa_column=Column(Integer))
+
+    # Progress, updated along with the completions. The current chapter is
+    # resolved again when unset: new session, or chapters changed by an import.
+    current_chapter_id: Optional[int] = Field(
+        default=None, foreign_key="scenario_chapter.id"
+    )
+    completed_chapters: int = Field(
+        default=0, sa_column=Column(Integer, nullable=False, server_default="0")
+    )
+
     user: "User" = Relationship(back_populates="sessions")
     scenario: "Scenario" = Relationship(back_populates="sessions")
-    messages: List["SessionMessage"] = Relationship(back_populates="session")
+    messages: List["SessionMessage"] = Relationship(
+        back_populates="session",
+        sa_relationship_kwargs={"order_by": "SessionMessage.id"},
+    )
     completions: List["ChapterCompletion"] = Relationship(back_populates="session")
 
 
@@ -63,6 +103,10 @@ class SessionMessage(SQLModel, table=True):
     """
 
     __tablename__ = "session_message"
+    __table_args__ = (
+        # Messages of a session in order, read on every turn and reconnection
+        Index("ix_session_message_session_id_id", "session_id", "id"),
+    )
 
     id: int = Field(sa_column=Column(Integer, primary_key=True, autoincrement=True))
     session_id: int = Field(foreign_key="training_session.id")
@@ -82,6 +126,10 @@ class ScenarioChapter(SQLModel, table=True):
     """
 
     __tablename__ = "scenario_chapter"
+    __table_args__ = (
+        # Chapters of a scenario in order, to find the current one
+        Index("ix_scenario_chapter_scenario_id_order", "scenario_id", "order"),
+    )
 
     id: int = Field(sa_column=Column(Integer, primary_key=True, autoincrement=True))
     scenario_id: int = Field(foreign_key="scenario.id", nullable=False)
@@ -90,6 +138,8 @@ class ScenarioChapter(SQLModel, table=True):
     order: int = Field(sa_column=Column(Integer, nullable=False))
 
     meta: Optional[Dict] = Field(default_factory=dict, sa_column=Column(JSON))
+    # See chapter_content_hash, set by the scenario imports
+    content_hash: Optional[str] = Field(default=None, sa_column=Column(String(64)))
 
     scenario: Optional["Scenario"] = Relationship(back_populates="chapters")
     completions: List["ChapterCompletion"] = Relationship(back_populates="chapter")
@@ -111,8 +161,15 @@ class Scenario(SQLModel, table=True):
         sa_column=Column(DateTime, nullable=False),
         default_factory=now_utc,
     )
+    # Incremented by every import changing the scenario or its chapters
+    version: int = Field(
+        default=1, sa_column=Column(Integer, nullable=False, server_default="1")
+    )
 
-    chapters: List["ScenarioChapter"] = Relationship(back_populates="scenario")
+    chapters: List["ScenarioChapter"] = Relationship(
+        back_populates="scenario",
+        sa_relationship_kwargs={"order_by": "ScenarioChapter.order"},
+    )
     sessions: List["TrainingSession"] = Relationship(back_populates="scenario")
 
 
@@ -0,0 +1,75 @@
+import json
+import logging
+from typing import Any, Protocol
+
+from fastapi.responses import JSONResponse
+
+from brobot.config import settings
+
+try:
+    import orjson
+except ImportError:  # Installed along with fastapi[all]
+    orjson = None
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class Serializer(Protocol):
+    """
+    Encode JSON-compatible values: websocket frames as text, response bodies
+    as bytes.
+    """
+
+    name: str
+
+    def dumps(self, value: Any) -> str: ...
+
+    def dumpb(self, value: Any) -> bytes: ...
+
+
+class StdlibSerializer:
+    name = "json"
+
+    def dumps(self, value: Any) -> str:
+        return json.dumps(value)
+
+    def dumpb(self, value: Any) -> bytes:
+        # Same output as the default FastAPI response
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class OrjsonSerializer:
+    name = "orjson"
+
+    def dumps(self, value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    def dumpb(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+
+def serializer_from_settings() -> Serializer:
+    """
+    Create the serializer selected by the JSON_SERIALIZER setting.
+    """
+    if settings.JSON_SERIALIZER == "orjson":
+        if orjson is not None:
+            return OrjsonSerializer()
+        logger.warning("orjson is not installed, falling back to json")
+        return StdlibSerializer()
+    if settings.JSON_SERIALIZER == "json":
+        return StdlibSerializer()
+    raise ValueError(f"Unknown JSON serializer: {settings.JSON_SERIALIZER}")
+
+
+serializer = serializer_from_settings()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class of the application, rendering with the configured
+    serializer the content FastAPI already converted from the response model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return serializer.dumpb(content)
@@ -0,0 +1,182 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from brobot.config import settings
+from brobot.models import Scenario, ScenarioChapter
+
+
+@dataclass
+class CachedContent:
+    value: Any
+    # Scenario the value belongs to, everything of a scenario is dropped at once.
+    # None for the values built from the whole catalog, such as listings.
+    scenario_id: Optional[int]
+    size: int
+    expires_at: float
+
+
+def _detached(model: Scenario | ScenarioChapter) -> Scenario | ScenarioChapter:
+    # A copy out of any session, so it can be shared by every request. Its
+    # relationships are not loaded.
+    return type(model)(**model.model_dump())
+
+
+def _size(model: Scenario | ScenarioChapter) -> int:
+    return len(model.model_dump_json())
+
+
+class ContentCache:
+    """
+    Read-through cache of scenarios and chapters, and of the DTOs built from them.
+
+    They only change through ScenarioService, which invalidates the scenario
+    in the same process. The TTL bounds how long another worker may serve a
+    scenario changed elsewhere. The cache is capped both in entries and in
+    bytes of content, the least recently used entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        max_bytes: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, CachedContent] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls) -> "ContentCache":
+        """
+        Create a content cache configured from the application settings.
+        """
+        return cls(
+            maxsize=settings.CONTENT_CACHE_SIZE,
+            max_bytes=settings.CONTENT_CACHE_MAX_MB * 1024 * 1024,
+            ttl=settings.CONTENT_CACHE_TTL_SECONDS,
+        )
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= self._clock():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def put(
+        self, key: Hashable, value: Any, scenario_id: Optional[int], size: int
+    ) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = CachedContent(
+            value, scenario_id, size, self._clock() + self.ttl
+        )
+        self._bytes += size
+        while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    async def scenario(
+        self, session: AsyncSession, scenario_id: int
+    ) -> Optional[Scenario]:
+        """
+        Get a scenario, loaded with the given session on a miss.
+
+        Args:
+            session (AsyncSession): The session used on a miss.
+            scenario_id (int): The ID of the scenario.
+        Returns:
+            Scenario | None: A detached scenario, without its chapters loaded.
+        """
+        key = ("scenario", scenario_id)
+        if (scenario := self.get(key)) is not None:
+            return scenario
+        scenario = await session.get(Scenario, scenario_id)
+        if scenario is None:
+            return None
+        scenario = _detached(scenario)
+        self.put(key, scenario, scenario_id, _size(scenario))
+        return scenario
+
+    async def chapter(
+        self, session: AsyncSession, chapter_id: int
+    ) -> Optional[ScenarioChapter]:
+        """
+        Get a chapter, loaded with the given session on a miss.
+
+        Args:
+            session (AsyncSession): The session used on a miss.
+            chapter_id (int): The ID of the chapter.
+        Returns:
+            ScenarioChapter | None: A detached chapter.
+        """
+        key = ("chapter", chapter_id)
+        if (chapter := self.get(key)) is not None:
+            return chapter
+        chapter = await session.get(ScenarioChapter, chapter_id)
+        if chapter is None:
+            return None
+        return self.add_chapter(chapter)
+
+    def add_chapter(self, chapter: ScenarioChapter) -> ScenarioChapter:
+        """
+        Cache a chapter loaded by another query.
+
+        Returns:
+            ScenarioChapter: The detached chapter, as cached.
+        """
+        chapter = _detached(chapter)
+        self.put(("chapter", chapter.id), chapter, chapter.scenario_id, _size(chapter))
+        return chapter
+
+    def invalidate_scenario(self, scenario_id: int) -> None:
+        """
+        Drop the scenario, its chapters and its DTOs, along with the catalog.
+        """
+        self._invalidate(lambda entry: entry.scenario_id in (scenario_id, None))
+
+    def invalidate_catalog(self) -> None:
+        """
+        Drop the values built from the whole catalog, when a scenario is added.
+        """
+        self._invalidate(lambda entry: entry.scenario_id is None)
+
+    def _invalidate(self, predicate: Callable[[CachedContent], bool]) -> None:
+        for key in [key for key, entry in self._entries.items() if predicate(entry)]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+
+content_cache = ContentCache.from_settings()
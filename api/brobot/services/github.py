@@ -0,0 +1,142 @@
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+from pydantic import HttpUrl
+
+from brobot.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@dataclass
+class CachedFile:
+    content: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class GitHubFetcher:
+    """
+    Fetch raw files from GitHub without blocking the event loop.
+
+    A single client pools the connections. Files are cached by raw URL along
+    with their ETag and Last-Modified headers, and fetched again with a
+    conditional request: an unchanged file costs a 304 without body.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float,
+        cache_size: int,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._files: OrderedDict[str, CachedFile] = OrderedDict()
+        self.fetched = 0
+        self.revalidated = 0
+
+    @classmethod
+    def from_settings(cls) -> "GitHubFetcher":
+        """
+        Create a fetcher configured from the application settings.
+        """
+        return cls(
+            base_url=settings.GITHUB_RAW_BASE_URL,
+            timeout=settings.GITHUB_TIMEOUT_SECONDS,
+            cache_size=settings.GITHUB_CACHE_SIZE,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, from the event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout, transport=self._transport
+            )
+        return self._client
+
+    def raw_url(self, url: HttpUrl) -> str:
+        """
+        Raw content URL of a file browsed on github.com.
+
+        Example: /amrltqt/brobot/blob/master/data/scenarios/introduction-sql.json
+        is served at <base_url>/amrltqt/brobot/master/data/scenarios/introduction-sql.json
+        """
+        return self.base_url + url.path.replace("blob/", "").replace("refs/heads/", "")
+
+    async def fetch(self, raw_url: str) -> bytes:
+        """
+        Fetch a raw file, revalidating the cached copy if any.
+
+        Raises:
+            ValueError: The file could not be fetched.
+        """
+        cached = self._files.get(raw_url)
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        try:
+            response = await self.client.get(raw_url, headers=headers)
+        except httpx.HTTPError as e:
+            raise ValueError(f"Failed to fetch the file from GitHub: {e}") from e
+
+        if response.status_code == 304 and cached:
+            self.revalidated += 1
+            self._files.move_to_end(raw_url)
+            return cached.content
+        if response.status_code != 200:
+            raise ValueError(
+                f"Failed to fetch the file from GitHub ({response.status_code})"
+            )
+
+        self.fetched += 1
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if self.cache_size > 0 and (etag or last_modified):
+            self._files[raw_url] = CachedFile(response.content, etag, last_modified)
+            self._files.move_to_end(raw_url)
+            while len(self._files) > self.cache_size:
+                self._files.popitem(last=False)
+        return response.content
+
+    async def fetch_json(self, url: HttpUrl) -> Any:
+        """
+        Fetch and decode a JSON file browsed on github.com.
+
+        Raises:
+            ValueError: The file could not be fetched or is not valid JSON.
+        """
+        raw_url = self.raw_url(url)
+        logger.info(f"Fetching {raw_url}")
+        content = await self.fetch(raw_url)
+        try:
+            return json.loads(content)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON file: {e}") from e
+
+    def stats(self) -> dict:
+        return {
+            "fetched": self.fetched,
+            "revalidated": self.revalidated,
+            "size": len(self._files),
+        }
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+github_fetcher = GitHubFetcher.from_settings()
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, List, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from brobot.dto import BulkImportReportDTO, CreateScenarioDTO
+from brobot.services.scenarios import ScenarioService
+
+logger = logging.getLogger("uvicorn.error")
+
+TARBALL_SUFFIXES = (".tar", ".tar.gz", ".tgz")
+# Starting worker processes only pays off for bundles larger than this
+PARALLEL_MIN_BYTES = 1024 * 1024
+
+# A scenario file: its name and raw content
+ScenarioFile = Tuple[str, bytes]
+
+
+def read_bundle(path: Path) -> List[ScenarioFile]:
+    """
+    Read the scenario files of a directory, searched recursively, or of a tarball.
+
+    Args:
+        path (Path): The directory or tarball.
+    Returns:
+        List[ScenarioFile]: The JSON files, sorted by name.
+    """
+    if path.is_dir():
+        return [
+            (str(file.relative_to(path)), file.read_bytes())
+            for file in sorted(path.rglob("*.json"))
+        ]
+    if path.name.endswith(TARBALL_SUFFIXES):
+        with tarfile.open(path) as tar:
+            return [
+                (member.name, tar.extractfile(member).read())
+                for member in sorted(tar.getmembers(), key=lambda m: m.name)
+                if member.isfile() and member.name.endswith(".json")
+            ]
+    raise ValueError(f"Not a directory nor a tarball: {path}")
+
+
+def validate_scenario(name: str, content: Any) -> CreateScenarioDTO:
+    """
+    Validate a parsed scenario file. The slug defaults to the file name.
+
+    Raises:
+        ValueError: The content is not a valid scenario.
+    """
+    if not isinstance(content, dict):
+        raise ValueError("A scenario file must hold a JSON object")
+    content.setdefault("slug", Path(name).name.removesuffix(".json"))
+    return CreateScenarioDTO.model_validate(content)
+
+
+def _loads(raw: bytes) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        return e
+
+
+async def parse_files(files: List[ScenarioFile], workers: int) -> List[Any]:
+    """
+    Decode JSON files, in a pool of processes when the bundle is large enough
+    for it to pay off.
+
+    Returns:
+        List[Any]: The content of each file, or the decoding error.
+    """
+    size = sum(len(raw) for _, raw in files)
+    if workers <= 1 or len(files) < 2 or size < PARALLEL_MIN_BYTES:
+        return [_loads(raw) for _, raw in files]
+
+    loop = asyncio.get_running_loop()
+    # Spawned, forking a process running an event loop and threads is unsafe.
+    # Workers run json.loads itself, so they do not import the application.
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(files)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        return await asyncio.gather(
+            *(loop.run_in_executor(pool, json.loads, raw) for _, raw in files),
+            return_exceptions=True,
+        )
+
+
+async def import_scenarios(
+    session: AsyncSession, path: Path, workers: int = 1
+) -> BulkImportReportDTO:
+    """
+    Import every scenario of a directory or tarball in a single bulk upsert.
+
+    Files failing validation are reported as invalid and left out. Scenarios
+    whose content hashes did not change are skipped, so importing the same
+    bundle again is a no-op.
+
+    Args:
+        session (AsyncSession): The database session.
+        path (Path): The directory or tarball holding the JSON files.
+        workers (int): Number of processes parsing the files.
+    Returns:
+        BulkImportReportDTO: The slugs created, updated and skipped, and the
+        invalid files.
+    """
+    files = await asyncio.to_thread(read_bundle, path)
+    scenarios, invalid = [], []
+    for (name, _), content in zip(files, await parse_files(files, workers)):
+        try:
+            if isinstance(content, Exception):
+                raise content
+            scenarios.append(validate_scenario(name, content))
+        except ValueError as e:
+            logger.warning(f"Invalid scenario file {name}: {e}")
+            invalid.append(name)
+
+    report = await ScenarioService(session).bulk_upsert(scenarios)
+    report.invalid = invalid
+    return report
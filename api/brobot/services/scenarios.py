@@ -1,25 +1,102 @@
+from collections import Counter
 from typing import Optional, List
 
-import requests
-
 from pydantic import HttpUrl
-from sqlmodel import Session, select
-from brobot.models import Scenario, ScenarioChapter
-
-from brobot.dto import CreateScenarioDTO
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from brobot.models import (
+    ChapterCompletion,
+    Scenario,
+    ScenarioChapter,
+    TrainingSession,
+    chapter_content_hash,
+    now_utc,
+)
+from brobot.bot.agents import agent_cache
+from brobot.services.content_cache import content_cache
+from brobot.services.github import github_fetcher
+
+from brobot.dto import BulkImportReportDTO, CreateScenarioChapterDTO, CreateScenarioDTO
 from brobot.dto.scenario_chapter import ScenarioChapterWithoutContentDTO
 from brobot.dto.scenario_with_chapter import ScenarioWithChapterDTO
 
 
+def _hash(chapter: ScenarioChapter | CreateScenarioChapterDTO) -> str:
+    stored = getattr(chapter, "content_hash", None)
+    return stored or chapter_content_hash(chapter.title, chapter.content, chapter.meta)
+
+
+def _chapter_row(scenario_id: int, chapter: CreateScenarioChapterDTO) -> dict:
+    return {
+        "scenario_id": scenario_id,
+        "title": chapter.title,
+        "content": chapter.content,
+        "order": chapter.order,
+        "meta": chapter.meta,
+        "content_hash": _hash(chapter),
+    }
+
+
+def _same_content(scenario: Scenario, dto: CreateScenarioDTO) -> bool:
+    def chapters(items) -> list:
+        return sorted((chapter.order, _hash(chapter)) for chapter in items)
+
+    return (
+        scenario.title == dto.title
+        and scenario.description == dto.description
+        and chapters(scenario.chapters) == chapters(dto.chapters)
+    )
+
+
+def _diff_chapters(
+    chapters: List[ScenarioChapter], dtos: List[CreateScenarioChapterDTO]
+) -> tuple[List[CreateScenarioChapterDTO], List[ScenarioChapter]]:
+    """
+    Apply the chapters of an import to the stored ones.
+
+    Chapters are matched by content hash first, an unchanged chapter keeps its
+    row and only gets its new order. The changed ones are then matched by order
+    and updated in place.
+
+    Returns:
+        tuple: The chapters to insert, and the stored chapters to remove.
+    """
+    by_hash: dict[str, List[ScenarioChapter]] = {}
+    for chapter in sorted(chapters, key=lambda chapter: chapter.order):
+        by_hash.setdefault(_hash(chapter), []).append(chapter)
+
+    changed = []
+    for dto in dtos:
+        if same := by_hash.get(_hash(dto)):
+            same.pop(0).order = dto.order
+        else:
+            changed.append(dto)
+
+    by_order = {chapter.order: chapter for rest in by_hash.values() for chapter in rest}
+    inserted = []
+    for dto in changed:
+        chapter = by_order.pop(dto.order, None)
+        if chapter is None:
+            inserted.append(dto)
+            continue
+        chapter.title = dto.title
+        chapter.content = dto.content
+        chapter.meta = dto.meta
+        chapter.content_hash = _hash(dto)
+    return inserted, list(by_order.values())
+
+
 class ScenarioService:
     """
     Service class for managing scenarios regarding their creation, retrieval, and deletion.
     """
 
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession):
         self.session = session
 
-    def get(self, scenario_id: int) -> Optional[ScenarioWithChapterDTO]:
+    async def get(self, scenario_id: int) -> Optional[ScenarioWithChapterDTO]:
         """
         Retrieve a scenario by its ID.
         Args:
@@ -27,18 +104,27 @@ class ScenarioService:
         Returns:
             Optional[ScenarioWithChapterDTO]: The scenario with its chapters, or None if not found.
         """
-        scenario = self.session.exec(
-            select(Scenario).where(Scenario.id == scenario_id)
+        key = ("scenario_dto", scenario_id)
+        if (dto := content_cache.get(key)) is not None:
+            return dto
+
+        scenario = (
+            await self.session.exec(
+                select(Scenario)
+                .where(Scenario.id == scenario_id)
+                .options(selectinload(Scenario.chapters))
+            )
         ).first()
 
         if not scenario:
             return None
 
-        return ScenarioWithChapterDTO(
+        dto = ScenarioWithChapterDTO(
             id=scenario.id,
             title=scenario.title,
             description=scenario.description,
             created_at=scenario.created_at,
+            version=scenario.version,
             chapters=[
                 ScenarioChapterWithoutContentDTO(
                     id=chapter.id,
@@ -48,22 +134,34 @@ class ScenarioService:
                 for chapter in scenario.chapters
             ],
         )
+        content_cache.put(key, dto, scenario_id, len(dto.model_dump_json()))
+        return dto
 
-    def get_all(self) -> List[ScenarioWithChapterDTO]:
+    async def get_all(
+        self, limit: Optional[int] = None, after: Optional[int] = None
+    ) -> List[ScenarioWithChapterDTO]:
         """
-        Retrieve all scenarios with their chapters.
+        Retrieve the scenarios with their chapters, ordered by id.
 
+        Args:
+            limit (int, optional): Maximum number of scenarios returned.
+            after (int, optional): Only return the scenarios following this id.
         Returns:
             List[ScenarioWithChapterDTO]: A list of scenarios with their chapters.
         """
-
-        scenarios = self.session.exec(select(Scenario)).all()
+        statement = select(Scenario).options(selectinload(Scenario.chapters))
+        if after is not None:
+            statement = statement.where(Scenario.id > after)
+        scenarios = (
+            await self.session.exec(statement.order_by(Scenario.id).limit(limit))
+        ).all()
         return [
             ScenarioWithChapterDTO(
                 id=s.id,
                 title=s.title,
                 description=s.description,
                 created_at=s.created_at,
+                version=s.version,
                 chapters=[
                     ScenarioChapterWithoutContentDTO(
                         id=c.id,
@@ -76,7 +174,7 @@ class ScenarioService:
             for s in scenarios
         ]
 
-    def delete(self, scenario_id: int) -> bool:
+    async def delete(self, scenario_id: int) -> bool:
         """
         Delete a scenario and its chapters.
 
@@ -86,21 +184,27 @@ class ScenarioService:
         Returns:
             bool: True if the scenario was deleted, False otherwise.
         """
-        scenario = self.session.get(Scenario, scenario_id)
+        scenario = await self.session.get(Scenario, scenario_id)
         if not scenario:
             return False
 
-        chapters = self.session.exec(
-            select(ScenarioChapter).where(ScenarioChapter.scenario_id == scenario_id)
+        chapters = (
+            await self.session.exec(
+                select(ScenarioChapter).where(
+                    ScenarioChapter.scenario_id == scenario_id
+                )
+            )
         ).all()
         for chapter in chapters:
-            self.session.delete(chapter)
+            await self.session.delete(chapter)
 
-        self.session.delete(scenario)
-        self.session.commit()
+        await self.session.delete(scenario)
+        await self.session.commit()
+        agent_cache.invalidate_scenario(scenario_id)
+        content_cache.invalidate_scenario(scenario_id)
         return True
 
-    def create(self, scenario: CreateScenarioDTO) -> Scenario:
+    async def create(self, scenario: CreateScenarioDTO) -> Scenario:
         """
         Create a new scenario with its chapters.
 
@@ -115,93 +219,188 @@ class ScenarioService:
             description=scenario.description,
         )
         self.session.add(scenario_model)
-        self.session.commit()
-        self.session.refresh(scenario_model)
+        await self.session.commit()
+        await self.session.refresh(scenario_model)
 
         for chapter in scenario.chapters:
             chapter_model = ScenarioChapter(
                 title=chapter.title,
                 order=chapter.order,
                 content=chapter.content,
+                meta=chapter.meta,
+                content_hash=_hash(chapter),
                 scenario_id=scenario_model.id,
             )
             self.session.add(chapter_model)
 
-        self.session.commit()
+        await self.session.commit()
+        await self.session.refresh(scenario_model, ["chapters"])
+        agent_cache.invalidate_scenario(scenario_model.id)
+        content_cache.invalidate_scenario(scenario_model.id)
         return scenario_model
 
-    def import_github(
+    async def bulk_upsert(
+        self, scenarios: List[CreateScenarioDTO]
+    ) -> BulkImportReportDTO:
+        """
+        Create or update a batch of scenarios, matched by slug, in one transaction.
+
+        New scenarios are inserted in a single statement returning their ids, and
+        every new chapter in a single executemany. Existing scenarios are left
+        untouched when their content did not change; otherwise their version is
+        incremented and only the chapters whose content hash changed are touched,
+        so the ids and completions of the others stay (see _diff_chapters).
+
+        Args:
+            scenarios (List[CreateScenarioDTO]): The scenarios to import.
+        Returns:
+            BulkImportReportDTO: The slugs created, updated and skipped.
+        Raises:
+            ValueError: A slug appears several times in the batch.
+        """
+        duplicates = sorted(
+            slug
+            for slug, count in Counter(dto.slug for dto in scenarios).items()
+            if count > 1
+        )
+        if duplicates:
+            raise ValueError(f"Duplicate slugs in the batch: {', '.join(duplicates)}")
+
+        report = BulkImportReportDTO()
+        updated_ids = []
+        try:
+            existing = {
+                scenario.slug: scenario
+                for scenario in (
+                    await self.session.exec(
+                        select(Scenario)
+                        .where(Scenario.slug.in_([dto.slug for dto in scenarios]))
+                        .options(selectinload(Scenario.chapters))
+                    )
+                ).all()
+            }
+
+            chapter_rows = []
+            created = [dto for dto in scenarios if dto.slug not in existing]
+            if created:
+                created_at = now_utc()
+                ids = dict(
+                    (
+                        await self.session.exec(
+                            insert(Scenario).returning(Scenario.slug, Scenario.id),
+                            params=[
+                                {
+                                    "slug": dto.slug,
+                                    "title": dto.title,
+                                    "description": dto.description,
+                                    "created_at": created_at,
+                                }
+                                for dto in created
+                            ],
+                        )
+                    ).all()
+                )
+                for dto in created:
+                    chapter_rows += [
+                        _chapter_row(ids[dto.slug], chapter) for chapter in dto.chapters
+                    ]
+                    report.created.append(dto.slug)
+
+            removed_ids = []
+            for dto in scenarios:
+                scenario = existing.get(dto.slug)
+                if scenario is None:
+                    continue
+                if _same_content(scenario, dto):
+                    report.skipped.append(dto.slug)
+                    continue
+
+                scenario.title = dto.title
+                scenario.description = dto.description
+                scenario.version += 1
+                inserted, removed = _diff_chapters(scenario.chapters, dto.chapters)
+                chapter_rows += [_chapter_row(scenario.id, c) for c in inserted]
+                removed_ids += [chapter.id for chapter in removed]
+                report.updated.append(dto.slug)
+                updated_ids.append(scenario.id)
+
+            if updated_ids:
+                # The sessions resolve their current chapter again on their next turn
+                completed = (
+                    select(func.count(ChapterCompletion.id))
+                    .where(
+                        ChapterCompletion.session_id == TrainingSession.id,
+                        ChapterCompletion.chapter_id.not_in(removed_ids),
+                    )
+                    .scalar_subquery()
+                )
+                await self.session.exec(
+                    update(TrainingSession)
+                    .where(TrainingSession.scenario_id.in_(updated_ids))
+                    .values(current_chapter_id=None, completed_chapters=completed)
+                )
+            if removed_ids:
+                await self.session.exec(
+                    delete(ChapterCompletion).where(
+                        ChapterCompletion.chapter_id.in_(removed_ids)
+                    )
+                )
+                await self.session.exec(
+                    delete(ScenarioChapter).where(ScenarioChapter.id.in_(removed_ids))
+                )
+            if chapter_rows:
+                await self.session.exec(insert(ScenarioChapter), params=chapter_rows)
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
+
+        for scenario_id in updated_ids:
+            agent_cache.invalidate_scenario(scenario_id)
+            content_cache.invalidate_scenario(scenario_id)
+        if report.created:
+            content_cache.invalidate_catalog()
+        return report
+
+    async def import_github(
         self, url: HttpUrl, slug: str
     ) -> Optional[ScenarioWithChapterDTO]:
         """
         Import a scenario from a GitHub URL.
 
         Args:
-            url (str): The GitHub URL to import the scenario from.
+            url (str): The GitHub URL to import the scenario from, e.g.
+                https://github.com/amrltqt/brobot/blob/master/data/scenarios/introduction-sql.json
+            slug (str): The slug of the created scenario.
 
         Returns:
             Optional[ScenarioWithChapterDTO]: The imported scenario with its chapters, or None if not found.
+            An existing scenario with the same slug is updated.
+        Raises:
+            ValueError: The URL is not a JSON file on GitHub, or it could not be fetched.
         """
-
-        # Check if the URL is valid
-        # https://github.com/amrltqt/brobot/blob/master/data/scenarios/introduction-sql.json
-
-        # Extract the file path from the URL to get the raw content
-        # https://raw.githubusercontent.com/amrltqt/brobot/master/data/scenarios/introduction-sql.json
-
         if not url.host == "github.com":
             raise ValueError("Invalid GitHub URL")
 
         if not url.path.endswith(".json"):
             raise ValueError("Invalid file type. Only .json files are supported.")
 
-        # Extract the file path from the URL
-        # https://github.com/amrltqt/brobot/blob/master/data/scenarios/introduction-sql.json
-        # Example: https://raw.githubusercontent.com/amrltqt/brobot/refs/heads/master/data/scenarios/introduction-sql.json
-        raw_url = "https://raw.githubusercontent.com" + url.path.replace(
-            "blob/", ""
-        ).replace("refs/heads/", "")
-        print(raw_url)
-        # Fetch the content from the raw URL
-
-        response = requests.get(raw_url)
-        if response.status_code != 200:
-            raise ValueError("Failed to fetch the file from GitHub")
-        content = response.json()
+        content = await github_fetcher.fetch_json(url)
         if not content:
             raise ValueError("Empty content")
 
-        # Create the scenario and chapters
-        scenario = Scenario(
-            slug=slug,
-            title=content["title"],
-            description=content["description"],
-        )
-        self.session.add(scenario)
-        self.session.commit()
-        self.session.refresh(scenario)
-
-        for chapter in content["chapters"]:
-            chapter_model = ScenarioChapter(
-                title=chapter["title"],
-                order=chapter["order"],
-                content=chapter["content"],
-                scenario_id=scenario.id,
-            )
-            self.session.add(chapter_model)
-        self.session.commit()
-
-        return ScenarioWithChapterDTO(
-            id=scenario.id,
-            title=scenario.title,
-            description=scenario.description,
-            created_at=scenario.created_at,
-            chapters=[
-                ScenarioChapterWithoutContentDTO(
-                    id=chapter_model.id,
-                    title=chapter_model.title,
-                    order=chapter_model.order,
+        # Upserted, so importing an updated file keeps the unchanged chapters
+        await self.bulk_upsert(
+            [
+                CreateScenarioDTO(
+                    slug=slug,
+                    title=content["title"],
+                    description=content["description"],
+                    chapters=content["chapters"],
                 )
-                for chapter_model in scenario.chapters
-            ],
+            ]
         )
+        scenario_id = (
+            await self.session.exec(select(Scenario.id).where(Scenario.slug == slug))
+        ).one()
+        return await self.get(scenario_id)
@@ -1,13 +1,18 @@
-import asyncio
 import datetime
 import logging
 from textwrap import dedent
-from sqlmodel import Session, select
+from typing import Sequence
+
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql.base import ExecutableOption
+from sqlmodel import func, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from brobot.models import (
     TrainingSession,
     SessionMessage,
     ChapterCompletion,
+    Scenario,
     ScenarioChapter,
 )
 
@@ -19,31 +24,92 @@ from brobot.dto import (
     CompletedChapterDTO,
 )
 
+from brobot.config import settings
 from brobot.bot.context import ScenarioContext
-from brobot.bot.complete import generate_answer
+from brobot.bot.grader import Grading, extract_query, grade
+from brobot.bot.sandbox import parse_fixtures, sandbox_pool
+from brobot.bot.agents import MAX_ANSWER_TOKENS, prepared_agent
+from brobot.bot.memory import ConversationMemory, estimate_tokens
+from brobot.bot.complete import generate_answer, stream_answer, OnDeltaCallback
+from brobot.bot.scheduler import (
+    CompletionScheduler,
+    OnQueuedCallback,
+    completion_scheduler,
+)
+from brobot.services.content_cache import ContentCache, content_cache
 from brobot.ws.manager import ConnectionManager
+from brobot.ws.turns import turn_coordinator
 
 
 logger = logging.getLogger("uvicorn.error")
 
 
+# Loader strategies, chosen per call site depending on the relationships it walks.
+# The scenario is a many-to-one and is joined in the main query, collections are
+# fetched with one SELECT ... IN per relationship, so the number of queries stays
+# the same whatever the number of sessions returned.
+FULL_SESSION_LOADERS: Sequence[ExecutableOption] = (
+    joinedload(TrainingSession.scenario).selectinload(Scenario.chapters),
+    selectinload(TrainingSession.messages),
+    selectinload(TrainingSession.completions),
+)
+
+# What a session DTO shows: its scenario and completions, bounded by the number
+# of chapters. Messages are only counted, so the DTO does not grow with the
+# transcript.
+SESSION_DTO_LOADERS: Sequence[ExecutableOption] = (
+    joinedload(TrainingSession.scenario).selectinload(Scenario.chapters),
+    selectinload(TrainingSession.completions),
+)
+
+# What a bot turn reads: the messages for the memory. The scenario and the
+# current chapter come from the content cache.
+TURN_LOADERS: Sequence[ExecutableOption] = (selectinload(TrainingSession.messages),)
+
+SESSION_CHILDREN_LOADERS: Sequence[ExecutableOption] = (
+    selectinload(TrainingSession.messages),
+    selectinload(TrainingSession.completions),
+)
+
+
+def _with_loaders(
+    statement, loaders: Sequence[ExecutableOption] = FULL_SESSION_LOADERS
+):
+    """
+    Apply the loader strategies to a TrainingSession statement.
+    Lazy loading is not available with an AsyncSession, and populate_existing
+    makes sure collections already in the identity map are refreshed.
+    """
+    return statement.options(*loaders).execution_options(populate_existing=True)
+
+
 class SessionService:
     """
     Service class for managing training sessions.
     """
 
-    def __init__(self, session: Session):
+    def __init__(
+        self,
+        session: AsyncSession,
+        memory: ConversationMemory | None = None,
+        scheduler: CompletionScheduler | None = None,
+        content: ContentCache | None = None,
+    ):
         # Could be a bit confusing
         self.session = session
+        self.memory = memory or ConversationMemory.from_settings()
+        self.scheduler = scheduler or completion_scheduler
+        self.content = content or content_cache
 
     @staticmethod
     def __session_to_training_session_dto(
-        session: Session,
+        session: TrainingSession, message_count: int = 0
     ) -> TrainingSessionDTO:
         """
         Convert a session to a TrainingSessionWithScenarioAndMessagesDTO.
         Args:
-            session (Session): The session to convert.
+            session (TrainingSession): The session to convert.
+            message_count (int): The number of messages of the session.
         Returns:
             TrainingSessionWithScenarioAndMessagesDTO: The converted DTO.
         """
@@ -55,6 +121,7 @@ class SessionService:
                 title=session.scenario.title,
                 description=session.scenario.description,
                 created_at=session.scenario.created_at,
+                version=session.scenario.version,
                 chapters=[
                     ScenarioChapterWithoutContentDTO(
                         id=chapter.id,
@@ -64,15 +131,7 @@ class SessionService:
                     for chapter in session.scenario.chapters
                 ],
             ),
-            messages=[
-                SessionMessageDTO(
-                    id=message.id,
-                    created_at=message.created_at,
-                    content=message.content,
-                    role=message.role,
-                )
-                for message in session.messages
-            ],
+            message_count=message_count,
             completions=[
                 CompletedChapterDTO(
                     chapter_id=completion.chapter_id,
@@ -81,18 +140,50 @@ class SessionService:
                 )
                 for completion in session.completions
             ],
+            current_chapter_id=session.current_chapter_id,
+            completed_chapters=session.completed_chapters,
         )
 
-    async def get_complete_session(self, session_id: int) -> TrainingSession:
+    async def _message_counts(self, session_ids: list[int]) -> dict[int, int]:
+        """
+        Count the messages of the given sessions in a single query.
+        """
+        if not session_ids:
+            return {}
+        statement = (
+            select(SessionMessage.session_id, func.count(SessionMessage.id))
+            .where(SessionMessage.session_id.in_(session_ids))
+            .group_by(SessionMessage.session_id)
+        )
+        return dict((await self.session.exec(statement)).all())
+
+    async def _to_dtos(
+        self, sessions: Sequence[TrainingSession]
+    ) -> list[TrainingSessionDTO]:
+        counts = await self._message_counts([session.id for session in sessions])
+        return [
+            self.__session_to_training_session_dto(session, counts.get(session.id, 0))
+            for session in sessions
+        ]
+
+    async def get_complete_session(
+        self,
+        session_id: int,
+        loaders: Sequence[ExecutableOption] = FULL_SESSION_LOADERS,
+    ) -> TrainingSession:
         """
         Retrieve a training session by its ID with complete scenario details.
         Args:
             session_id (int): The ID of the training session to retrieve.
+            loaders (Sequence[ExecutableOption]): Loader strategies for the relationships.
         Returns:
             Optional[TrainingSession]: The training session, or None if not found.
         """
-        statement = select(TrainingSession).where(TrainingSession.id == session_id)
-        return self.session.exec(statement).first()
+        statement = _with_loaders(
+            select(TrainingSession).where(TrainingSession.id == session_id),
+            loaders,
+        )
+        return (await self.session.exec(statement)).first()
 
     async def get(self, session_id: int) -> TrainingSessionDTO:
         """
@@ -102,16 +193,24 @@ class SessionService:
         Returns:
             Optional[TrainingSession]: The training session, or None if not found.
         """
-        statement = select(TrainingSession).where(TrainingSession.id == session_id)
-        session = self.session.exec(statement).first()
+        statement = _with_loaders(
+            select(TrainingSession).where(TrainingSession.id == session_id),
+            SESSION_DTO_LOADERS,
+        )
+        session = (await self.session.exec(statement)).first()
 
         if not session:
             return None
-        return self.__session_to_training_session_dto(session)
+        [dto] = await self._to_dtos([session])
+        return dto
 
     async def _complete_chapter(
         self, session_id: int, chapter_id: int, message_id: int
     ) -> ChapterCompletion:
+        """
+        Record a chapter completion and move the session to the next chapter,
+        in the same transaction.
+        """
         completion = ChapterCompletion(
             session_id=session_id,
             chapter_id=chapter_id,
@@ -119,26 +218,43 @@ class SessionService:
             completed_at=datetime.datetime.now(),
         )
         self.session.add(completion)
-        self.session.commit()
-        self.session.refresh(completion)
+        await self.session.flush()
+
+        session = await self.session.get(TrainingSession, session_id)
+        next_chapter = await self._first_uncompleted_chapter(session)
+        await self.session.exec(
+            update(TrainingSession)
+            .where(TrainingSession.id == session_id)
+            .values(
+                current_chapter_id=next_chapter.id if next_chapter else None,
+                completed_chapters=TrainingSession.completed_chapters + 1,
+            )
+        )
+        await self.session.commit()
+        await self.session.refresh(completion)
         return completion
 
-    async def users_sessions(self, user_id: int) -> list[TrainingSessionDTO]:
+    async def users_sessions(
+        self, user_id: int, limit: int | None = None, after: int | None = None
+    ) -> list[TrainingSessionDTO]:
         """
-        Retrieve a training session for a given user.
+        Retrieve the training sessions of a given user, ordered by id.
 
         Args:
             user_id (int): The ID of the user.
+            limit (int, optional): Maximum number of sessions returned.
+            after (int, optional): Only return the sessions following this id.
         Returns:
-            Optional[TrainingSession]: The training session, or None if not found.
+            list[TrainingSessionDTO]: The training sessions.
         """
         statement = select(TrainingSession).where(TrainingSession.user_id == user_id)
-        sessions = self.session.exec(statement).all()
-
-        if not sessions:
-            return []
-
-        return [self.__session_to_training_session_dto(session) for session in sessions]
+        if after is not None:
+            statement = statement.where(TrainingSession.id > after)
+        statement = _with_loaders(
+            statement.order_by(TrainingSession.id).limit(limit), SESSION_DTO_LOADERS
+        )
+        sessions = (await self.session.exec(statement)).all()
+        return await self._to_dtos(sessions)
 
     async def get_or_create(
         self,
@@ -157,20 +273,23 @@ class SessionService:
             TrainingSessionWithScenarioAndMessagesDTO: The training session.
         """
 
-        statement = select(TrainingSession).where(
-            TrainingSession.user_id == user_id,
-            TrainingSession.scenario_id == scenario_id,
+        statement = _with_loaders(
+            select(TrainingSession).where(
+                TrainingSession.user_id == user_id,
+                TrainingSession.scenario_id == scenario_id,
+            ),
+            SESSION_DTO_LOADERS,
         )
-        existing = self.session.exec(statement).first()
+        existing = (await self.session.exec(statement)).first()
         if existing:
-            return self.__session_to_training_session_dto(existing)
+            [dto] = await self._to_dtos([existing])
+            return dto
 
         new_session = TrainingSession(user_id=user_id, scenario_id=scenario_id)
         self.session.add(new_session)
-        self.session.commit()
-        self.session.refresh(new_session)
+        await self.session.commit()
 
-        dto = self.__session_to_training_session_dto(new_session)
+        dto = await self.get(new_session.id)
 
         if connection_manager:
             await connection_manager.send_json(
@@ -178,10 +297,28 @@ class SessionService:
                 {"type": "typing", "status": "start"},
             )
 
-        asyncio.create_task(self.generate_answer(new_session.id, connection_manager))
+        turn_coordinator.request_turn(
+            new_session.id,
+            lambda: self._generate_answer_in_new_session(
+                new_session.id, connection_manager
+            ),
+        )
 
         return dto
 
+    async def _generate_answer_in_new_session(
+        self, session_id: int, connection_manager: ConnectionManager | None = None
+    ) -> SessionMessageDTO:
+        """
+        Generate an answer with a dedicated database session.
+        Background tasks outlive the request scoped session, and an AsyncSession
+        must not be shared between concurrent tasks.
+        """
+        async with AsyncSession(self.session.bind, expire_on_commit=False) as session:
+            return await SessionService(
+                session, self.memory, self.scheduler
+            ).generate_answer(session_id, connection_manager)
+
     async def add_message(
         self, session_id: int, content: str, role: str = "user"
     ) -> SessionMessageDTO:
@@ -192,16 +329,15 @@ class SessionService:
             session_id (int): The ID of the training session.
             content (str): The content of the message.
         """
-        statement = select(TrainingSession).where(TrainingSession.id == session_id)
-        session = self.session.exec(statement).first()
+        session = await self.session.get(TrainingSession, session_id)
 
         if not session:
             return None
 
-        message = SessionMessage(content=content, role=role)
-        session.messages.append(message)
-        self.session.commit()
-        self.session.refresh(session)
+        message = SessionMessage(session_id=session.id, content=content, role=role)
+        self.session.add(message)
+        await self.session.commit()
+        await self.session.refresh(message)
 
         return SessionMessageDTO(
             id=message.id,
@@ -210,6 +346,37 @@ class SessionService:
             role=message.role,
         )
 
+    async def messages_after(
+        self, session_id: int, after_id: int | None = None, limit: int | None = None
+    ) -> list[SessionMessageDTO]:
+        """
+        Retrieve the messages of a training session, oldest first.
+
+        Args:
+            session_id (int): The ID of the training session.
+            after_id (int, optional): Only return the messages following this one.
+            limit (int, optional): Maximum number of messages returned.
+        Returns:
+            list[SessionMessageDTO]: The messages.
+        """
+        statement = select(SessionMessage).where(
+            SessionMessage.session_id == session_id
+        )
+        if after_id is not None:
+            statement = statement.where(SessionMessage.id > after_id)
+        messages = await self.session.exec(
+            statement.order_by(SessionMessage.id).limit(limit)
+        )
+        return [
+            SessionMessageDTO(
+                id=message.id,
+                created_at=message.created_at,
+                content=message.content,
+                role=message.role,
+            )
+            for message in messages
+        ]
+
     async def delete(self, session_id: int) -> bool:
         """
         Delete a training session by its ID and all related information, ensuring cascade deletion.
@@ -219,60 +386,142 @@ class SessionService:
         Returns:
             bool: True if the session was deleted, False otherwise.
         """
-        statement = select(TrainingSession).where(TrainingSession.id == session_id)
-        session = self.session.exec(statement).first()
+        statement = _with_loaders(
+            select(TrainingSession).where(TrainingSession.id == session_id),
+            SESSION_CHILDREN_LOADERS,
+        )
+        session = (await self.session.exec(statement)).first()
 
         if not session:
             return False
 
         # Ensure cascade deletion of related messages
         for message in session.messages:
-            self.session.delete(message)
+            await self.session.delete(message)
 
         # Ensure completions are deleted
         for completion in session.completions:
-            self.session.delete(completion)
+            await self.session.delete(completion)
 
-        self.session.delete(session)
-        self.session.commit()
+        await self.session.delete(session)
+        await self.session.commit()
         return True
 
-    async def _get_current_chapter(self, session_id: int) -> ScenarioChapter:
+    async def _first_uncompleted_chapter(
+        self, session: TrainingSession
+    ) -> ScenarioChapter | None:
+        completed = select(ChapterCompletion.chapter_id).where(
+            ChapterCompletion.session_id == session.id
+        )
+        statement = (
+            select(ScenarioChapter)
+            .where(
+                ScenarioChapter.scenario_id == session.scenario_id,
+                ScenarioChapter.id.not_in(completed),
+            )
+            .order_by(ScenarioChapter.order)
+            .limit(1)
+        )
+        return (await self.session.exec(statement)).first()
+
+    async def _get_current_chapter(
+        self, session_id: int, session: TrainingSession | None = None
+    ) -> ScenarioChapter:
         """
-        Strategically retrieve the current chapter of a training session.
-        Which is basically the first chapter in order that have not been completed yet.
+        Retrieve the current chapter of a training session, by the id stored on
+        the session. When unset, it is resolved as the first chapter in order
+        that has not been completed yet, and stored.
         Args:
             session_id (int): The ID of the training session.
+            session (TrainingSession, optional): The session if already loaded.
         Returns:
             ScenarioChapter: The current chapter of the training session.
         """
 
-        session = await self.get_complete_session(session_id)
+        if session is None:
+            session = await self.session.get(TrainingSession, session_id)
         if not session:
             raise Exception("Session not found")
 
-        if not len(session.scenario.chapters) > 0:
-            raise Exception("No chapters found in scenario")
-
-        # Get the first chapter that has not been completed
-        completed_ids = [completion.chapter_id for completion in session.completions]
-        for chapter in sorted(session.scenario.chapters, key=lambda x: x.order):
-            if chapter.id not in completed_ids:
+        if session.current_chapter_id is not None:
+            chapter = await self.content.chapter(
+                self.session, session.current_chapter_id
+            )
+            if chapter is not None:
                 return chapter
-        raise Exception("All chapters completed")
+
+        chapter = await self._first_uncompleted_chapter(session)
+        if chapter is None:
+            raise Exception("All chapters completed")
+        # Persisted along with the answer
+        session.current_chapter_id = chapter.id
+        return self.content.add_chapter(chapter)
+
+    async def _with_verdict(
+        self, session: TrainingSession, context: ScenarioContext, messages: list
+    ) -> list:
+        """
+        Grade the query of the last learner message against the reference query
+        of the chapter, so the model gets the verdict without a tool call.
+
+        Returns:
+            list: The messages, followed by the verdict when there is one.
+        """
+        if not context.grading or not session.messages:
+            return messages
+        last = max(session.messages, key=lambda message: message.id)
+        query = extract_query(last.content) if last.role == "user" else None
+        if query is None:
+            return messages
+
+        verdict = await grade(
+            sandbox_pool, session.id, context.fixtures, context.grading, query
+        )
+        if verdict is None:
+            return messages
+        logger.info(f"[{session.id}] graded submission, {verdict}")
+        return [
+            *messages,
+            {
+                "role": "system",
+                "content": f"<grader>The last query of the learner is {verdict}.</grader>",
+            },
+        ]
 
     async def generate_answer(
-        self, session_id: int, connection_manager: ConnectionManager | None = None
+        self,
+        session_id: int,
+        connection_manager: ConnectionManager | None = None,
+        on_delta: OnDeltaCallback | None = None,
+        on_queued: OnQueuedCallback | None = None,
     ) -> SessionMessageDTO:
         """
         Generate an answer to the user's message.
+
+        The answer is streamed when on_delta is given, or when a connection manager
+        is given in which case deltas are forwarded as {"type": "delta"} frames.
+        The completion goes through the shared scheduler; while it waits for a slot
+        on_queued (or a typing frame) reports the queue depth.
+        The complete answer is persisted once the model is done.
         """
 
-        session = await self.get_complete_session(session_id)
-        if not len(session.scenario.chapters) > 0:
-            raise Exception("No chapters found in scenario")
+        if on_delta is None and connection_manager:
 
-        current_chapter = await self._get_current_chapter(session_id)
+            async def on_delta(delta: str):
+                await connection_manager.send_json(
+                    session_id, {"type": "delta", "content": delta}
+                )
+
+        if on_queued is None and connection_manager:
+
+            async def on_queued(depth: int):
+                await connection_manager.send_json(
+                    session_id, {"type": "typing", "status": "start", "queue": depth}
+                )
+
+        session = await self.get_complete_session(session_id, TURN_LOADERS)
+        scenario = await self.content.scenario(self.session, session.scenario_id)
+        current_chapter = await self._get_current_chapter(session_id, session)
 
         if len(session.messages) == 0:
             messages = [
@@ -289,21 +538,78 @@ class SessionService:
                 }
             ]
         else:
-            messages = [
-                {
-                    "role": message.role,
-                    "content": message.content,
-                }
-                for message in session.messages
-            ]
 
-        context = ScenarioContext(part_completed=False)
+            async def summarize(summary, evicted, max_tokens) -> str:
+                # A completion as well, bound by the same limits as the answer
+                return await self.scheduler.run(
+                    session_id,
+                    lambda: self.memory.summarizer(summary, evicted, max_tokens),
+                    estimated_tokens=sum(
+                        estimate_tokens(message["content"]) for message in evicted
+                    )
+                    + max_tokens,
+                    on_queued=on_queued,
+                )
 
-        bot_answer = await generate_answer(
-            scenario=session.scenario,
-            current_chapter=current_chapter,
-            messages=messages,
-            context=context,
+            window = await self.memory.build(
+                session.messages,
+                session.summary,
+                session.summary_message_id,
+                summarizer=summarize,
+            )
+            messages = window.messages
+            if window.summary_updated:
+                # Persisted along with the answer
+                session.summary = window.summary
+                session.summary_message_id = window.summary_message_id
+
+        context = ScenarioContext(
+            part_completed=False,
+            session_id=session_id,
+            fixtures=parse_fixtures(current_chapter.content),
+            result_format=(current_chapter.meta or {}).get(
+                "result_format", settings.SANDBOX_RESULT_FORMAT
+            ),
+            grading=Grading.from_meta(current_chapter.meta),
+        )
+        messages = await self._with_verdict(session, context, messages)
+
+        # A retry would stream the answer again after the deltas already sent
+        streamed = False
+
+        async def forward_delta(delta: str):
+            nonlocal streamed
+            streamed = True
+            await on_delta(delta)
+
+        async def complete() -> str:
+            if on_delta:
+                return await stream_answer(
+                    scenario=scenario,
+                    current_chapter=current_chapter,
+                    messages=messages,
+                    context=context,
+                    on_delta=forward_delta,
+                )
+            return await generate_answer(
+                scenario=scenario,
+                current_chapter=current_chapter,
+                messages=messages,
+                context=context,
+            )
+
+        estimated_tokens = (
+            # The instructions of the cached agent, not formatted again
+            estimate_tokens(prepared_agent(scenario, current_chapter).instructions)
+            + sum(estimate_tokens(message["content"]) for message in messages)
+            + MAX_ANSWER_TOKENS
+        )
+        bot_answer = await self.scheduler.run(
+            session_id,
+            complete,
+            estimated_tokens=estimated_tokens,
+            on_queued=on_queued,
+            retryable=lambda: not streamed,
         )
 
         bot_message = await self.add_message(
@@ -322,10 +628,11 @@ class SessionService:
             )
             if connection_manager:
                 await connection_manager.send_json(
+                    session_id,
                     {
                         "type": "chapter_completed",
                         "completion_id": completion.id,
-                    }
+                    },
                 )
 
         if connection_manager:
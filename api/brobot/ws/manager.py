@@ -1,17 +1,24 @@
 import asyncio
-import json
 import logging
-from collections import deque
 from asyncio import Lock
-from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
 
 from fastapi import WebSocket
 from starlette.websockets import WebSocketDisconnect
 
+from brobot.config import settings
+from brobot.serialization import Serializer, serializer
+from brobot.ws.pubsub import InMemoryPubSub, PubSubBackend
+from brobot.ws.replay import ReplayBuffer
+from brobot.ws.writer import ConnectionWriter, WriterMetrics, frame_kind
+
 SessionID = int
-MAX_QUEUE_SIZE = 100
 logger = logging.getLogger("uvicorn.error")
 
+# Seconds between two empty frames sent to keep an idle socket alive
+HEARTBEAT_SECONDS = 30
+
 # Type aliases for callbacks
 OnConnectCallback = Callable[
     ["ConnectionManager", SessionID, WebSocket], Awaitable[None]
@@ -23,84 +30,228 @@ class ConnectionManager:
     """
     Manage WebSocket connections with:
       - auto-reconnect support via client
-      - message queueing
-      - heartbeat pings
+      - sequence numbers on every frame, and replay of the frames missed by a
+        reconnecting client
+      - a writer task per socket with a bounded queue, so slow clients do not
+        block the producers
+      - heartbeat pings, sent by the writer of each socket
       - hooks for custom logic on connect and on message
+      - delivery through a pub/sub backend, so the socket and the task sending
+        to it may live in different workers
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        backend: Optional[PubSubBackend] = None,
+        replay_size: int = settings.WS_REPLAY_BUFFER_SIZE,
+        replay_sessions: int = settings.WS_REPLAY_SESSIONS,
+        writer_queue_size: int = settings.WS_WRITER_QUEUE_SIZE,
+        writer_overflow: str = settings.WS_WRITER_OVERFLOW,
+        json_serializer: Optional[Serializer] = None,
+        heartbeat: float = HEARTBEAT_SECONDS,
+    ):
         self._lock = Lock()
         self.active_connections: Dict[SessionID, WebSocket] = {}
-        self.message_queues: Dict[SessionID, Deque[str]] = {}
+        self.writers: Dict[SessionID, ConnectionWriter] = {}
+        # Sockets accepted but not registered yet, replaying their missed frames
+        self._connecting: Counter[SessionID] = Counter()
+        self.writer_queue_size = writer_queue_size
+        self.writer_overflow = writer_overflow
+        self.writer_metrics = WriterMetrics()
+        self.heartbeat = heartbeat
+        # Unsubscriptions in progress, awaited on close
+        self._releases: Set[asyncio.Task] = set()
+        self.replay_size = replay_size
+        self.replay_sessions = replay_sessions
+        # Least recently used first, a session losing its buffer falls back to
+        # the history stored in database
+        self.replay_buffers: OrderedDict[SessionID, ReplayBuffer] = OrderedDict()
+        self.backend = backend or InMemoryPubSub()
+        self.serializer = json_serializer or serializer
+        self.backend.bind(self._deliver)
+
+    def _buffer(self, session_id: SessionID) -> ReplayBuffer:
+        buffer = self.replay_buffers.get(session_id)
+        if buffer is None:
+            buffer = self.replay_buffers[session_id] = ReplayBuffer(self.replay_size)
+            if len(self.replay_buffers) > self.replay_sessions:
+                self.replay_buffers.popitem(last=False)
+        else:
+            self.replay_buffers.move_to_end(session_id)
+        return buffer
+
+    def _writer(self, session_id: SessionID, websocket: WebSocket) -> ConnectionWriter:
+        writer = self.writers.get(session_id)
+        if writer is None or writer.websocket is not websocket:
+            if writer is not None:
+                # The client reconnected before the old socket was noticed closed
+                writer.close()
+            writer = self.writers[session_id] = ConnectionWriter(
+                session_id,
+                websocket,
+                max_size=self.writer_queue_size,
+                overflow=self.writer_overflow,
+                metrics=self.writer_metrics,
+                on_close=lambda closed: self.disconnect(session_id, closed.websocket),
+                heartbeat=self.heartbeat,
+            )
+        return writer
+
+    def writer_stats(self) -> dict:
+        """
+        Writer metrics, with the frames currently waiting per session.
+        """
+        return {
+            **self.writer_metrics.stats(),
+            "queued": {sid: len(writer) for sid, writer in self.writers.items()},
+        }
+
+    async def drain(self, session_id: SessionID) -> None:
+        """
+        Wait until the frames queued for a session are written.
+        """
+        writer = self.writers.get(session_id)
+        if writer is not None:
+            await writer.drain()
 
     async def connect(
         self,
         session_id: SessionID,
         websocket: WebSocket,
-    ) -> None:
-        # Accept and register socket
+        resume_from: Optional[int] = None,
+    ) -> bool:
+        """
+        Accept and register a socket, replaying the missed frames if asked to.
+
+        Args:
+            session_id (SessionID): The session of the socket.
+            websocket (WebSocket): The socket to register.
+            resume_from (int, optional): Last sequence number the client received.
+        Returns:
+            bool: True when the missed frames were replayed, False when they are
+            unknown and the caller has to send the history itself.
+        """
         await websocket.accept()
         async with self._lock:
-            self.active_connections[session_id] = websocket
+            await self.backend.subscribe(session_id)
+            # Keeps the subscription while replaying, outside the lock
+            self._connecting[session_id] += 1
+
+        try:
+            # The client reconnected, its previous socket is gone
+            previous = self.active_connections.get(session_id)
+            if previous is not None and previous is not websocket:
+                self.disconnect(session_id, previous)
+            writer = self._writer(session_id, websocket)
+            resumed = False
+            if resume_from is not None:
+                resumed = await self._replay(session_id, writer, resume_from)
+            if not writer.closed:
+                self.active_connections[session_id] = websocket
+        finally:
+            self._connecting[session_id] -= 1
+            if not self._connecting[session_id]:
+                del self._connecting[session_id]
         logger.info(f"[{session_id}] connecté")
+        return resumed
 
-        # Start heartbeat and flush any queued messages
-        asyncio.create_task(self._heartbeat(session_id, websocket))
-        await self._flush_queue(session_id)
+    async def _replay(
+        self, session_id: SessionID, writer: ConnectionWriter, resume_from: int
+    ) -> bool:
+        buffer = self._buffer(session_id)
+        frames = buffer.since(resume_from)
+        if frames is None:
+            logger.info(f"[{session_id}] reprise impossible depuis {resume_from}")
+            return False
 
-    def disconnect(self, session_id: SessionID) -> None:
-        # Remove connection (lock not strictly needed for pop)
+        # Frames delivered meanwhile are only buffered as the socket is not
+        # registered yet, so loop on snapshots until the client is caught up.
+        while frames:
+            for seq, frame in frames:
+                await writer.send(frame)
+                if writer.closed:
+                    return False
+                resume_from = seq
+            frames = buffer.since(resume_from)
+            if frames is None:
+                return False
+        await writer.drain()
+        return not writer.closed
+
+    def disconnect(
+        self, session_id: SessionID, websocket: Optional[WebSocket] = None
+    ) -> None:
+        writer = self.writers.get(session_id)
+        if writer is not None and (websocket is None or writer.websocket is websocket):
+            del self.writers[session_id]
+            writer.close()
+        # Keep the connection if the client already reconnected with another
+        # socket. A socket still replaying is not registered yet.
+        if websocket is not None and self.active_connections.get(session_id) not in (
+            None,
+            websocket,
+        ):
+            return
         self.active_connections.pop(session_id, None)
         logger.info(f"[{session_id}] déconnecté")
+        release = asyncio.create_task(self._release(session_id))
+        self._releases.add(release)
+        release.add_done_callback(self._releases.discard)
 
-    async def send_text(self, session_id: SessionID, message: str) -> None:
-        ws = self.active_connections.get(session_id)
-        if not ws:
-            return self._queue_message(session_id, message)
-        try:
-            await ws.send_text(message)
-        except WebSocketDisconnect:
-            self.disconnect(session_id)
-            self._queue_message(session_id, message)
-        except Exception as e:
-            logger.error(f"[{session_id}] send_text error: {e}")
-            self._queue_message(session_id, message)
+    async def _release(self, session_id: SessionID) -> None:
+        # Under the lock, so a reconnection in between keeps its subscription
+        async with self._lock:
+            if (
+                session_id not in self.active_connections
+                and session_id not in self._connecting
+            ):
+                await self.backend.unsubscribe(session_id)
 
-    async def send_json(self, session_id: SessionID, data: Any) -> None:
-        payload = json.dumps(data)
-        await self.send_text(session_id, payload)
+    async def close(self) -> None:
+        """
+        Close every socket along with its writer, then the pub/sub backend.
+        """
+        writers = list(self.writers.values())
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for writer in writers))
+        await asyncio.gather(*self._releases, return_exceptions=True)
+        await self.backend.close()
 
-    def _queue_message(self, session_id: SessionID, message: str) -> None:
-        # Enqueue with max size to avoid unbounded memory
-        q = self.message_queues.setdefault(session_id, deque(maxlen=MAX_QUEUE_SIZE))
-        q.append(message)
-        logger.warning(f"[{session_id}] message en queue ({len(q)}/{MAX_QUEUE_SIZE})")
+    async def send_text(self, session_id: SessionID, message: str) -> None:
+        await self.backend.publish(session_id, message)
 
-    async def _flush_queue(self, session_id: SessionID) -> None:
+    async def _deliver(self, session_id: SessionID, message: str) -> None:
+        # Buffered even when disconnected, the client asks for it on reconnect
+        frame = self._buffer(session_id).append(message)
         ws = self.active_connections.get(session_id)
         if not ws:
             return
-        q = self.message_queues.get(session_id)
-        if not q:
+        self._writer(session_id, ws).put(frame, frame_kind(message))
+
+    async def send_history(
+        self, session_id: SessionID, messages: Iterable[str]
+    ) -> None:
+        """
+        Send the history read from the database to the socket of a session.
+
+        Written to the local socket only, waiting for a slow client rather than
+        disconnecting it: a history longer than the writer queue would
+        otherwise close the socket before its first frame, on every reconnection.
+        The history is not buffered for replay, a client without sequence
+        number resumes from its last message id.
+        """
+        writer = self.writers.get(session_id)
+        if writer is None:
             return
-        logger.info(f"[{session_id}] flush de {len(q)} message(s)")
-        while q:
-            try:
-                await ws.send_text(q.popleft())
-            except Exception as e:
-                logger.error(f"[{session_id}] erreur flush: {e}")
-                break
+        for message in messages:
+            if writer.closed:
+                return
+            await writer.send(message)
 
-    async def _heartbeat(self, session_id: SessionID, websocket: WebSocket) -> None:
-        try:
-            while True:
-                await asyncio.sleep(30)
-                # ping implicitly by sending empty
-                if websocket.client_state.name == "CONNECTED":
-                    await websocket.send_text("")
-        except Exception:
-            # socket closed or error
-            pass
+    async def send_json(self, session_id: SessionID, data: Any) -> None:
+        payload = self.serializer.dumps(data)
+        await self.send_text(session_id, payload)
 
     async def handle_session(
         self,
@@ -136,7 +287,7 @@ class ConnectionManager:
                 if on_receive:
                     await on_receive(self, session_id, clean)
         except WebSocketDisconnect:
-            self.disconnect(session_id)
+            self.disconnect(session_id, websocket)
         except Exception as e:
             logger.error(f"[{session_id}] receive loop error: {e}")
-            self.disconnect(session_id)
+            self.disconnect(session_id, websocket)
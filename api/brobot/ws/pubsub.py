@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy.engine import make_url
+
+from brobot.config import settings
+
+SessionID = int
+MessageHandler = Callable[[SessionID, str], Awaitable[None]]
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class PubSubBackend(ABC):
+    """
+    Transport of the messages sent to the websocket sessions.
+
+    Messages are published for a session, and delivered to the handler bound by
+    the ConnectionManager of every process subscribed to that session.
+    """
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+
+    def bind(self, handler: MessageHandler) -> None:
+        """
+        Set the coroutine function receiving the messages of subscribed sessions.
+        """
+        self._handler = handler
+
+    async def _dispatch(self, session_id: SessionID, message: str) -> None:
+        if self._handler is None:
+            logger.warning(f"[{session_id}] no handler bound, message dropped")
+            return
+        await self._handler(session_id, message)
+
+    @abstractmethod
+    async def publish(self, session_id: SessionID, message: str) -> None:
+        """
+        Send a message to whichever process holds the session.
+        """
+
+    @abstractmethod
+    async def subscribe(self, session_id: SessionID) -> None:
+        """
+        Start receiving the messages of a session in this process.
+        """
+
+    @abstractmethod
+    async def unsubscribe(self, session_id: SessionID) -> None:
+        """
+        Stop receiving the messages of a session in this process.
+        """
+
+    async def close(self) -> None:
+        """
+        Release the resources held by the backend.
+        """
+
+
+class InMemoryPubSub(PubSubBackend):
+    """
+    Single process backend: messages are handed to the handler right away.
+    """
+
+    async def publish(self, session_id: SessionID, message: str) -> None:
+        await self._dispatch(session_id, message)
+
+    async def subscribe(self, session_id: SessionID) -> None:
+        pass
+
+    async def unsubscribe(self, session_id: SessionID) -> None:
+        pass
+
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_BYTES = 7900
+# A character takes at most 12 bytes once JSON escaped (a surrogate pair)
+NOTIFY_CHUNK_CHARS = 600
+
+
+class PostgresPubSub(PubSubBackend):
+    """
+    Backend relying on Postgres LISTEN/NOTIFY, so several workers can share the
+    websocket sessions. Each session has its own channel, listened to by the
+    worker holding the socket.
+
+    Messages too large for a single notification are split into chunks,
+    reassembled by the listener.
+
+    When the listening connection is lost, it is opened again in the background
+    and listens to the subscribed channels anew. Notifications sent meanwhile
+    are lost.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        channel_prefix: str = "brobot_ws",
+        connect: Optional[Callable[[str], Awaitable[Any]]] = None,
+        reconnect_delay: float = 1.0,
+        reconnect_max_delay: float = 30.0,
+    ):
+        super().__init__()
+        if connect is None:
+            import asyncpg
+
+            connect = asyncpg.connect
+        self.dsn = dsn
+        self.channel_prefix = channel_prefix
+        self._connect = connect
+
+        self._listener = None
+        self._publisher = None
+        self._listener_lock = asyncio.Lock()
+        self._publisher_lock = asyncio.Lock()
+        self._channels: Set[str] = set()
+        self._partials: Dict[str, List[str]] = {}
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._consumer: Optional[asyncio.Task] = None
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self._reconnect: Optional[asyncio.Task] = None
+
+    def channel(self, session_id: SessionID) -> str:
+        return f"{self.channel_prefix}_{session_id}"
+
+    def _session_id(self, channel: str) -> SessionID:
+        return int(channel.rsplit("_", 1)[1])
+
+    @staticmethod
+    def encode(message: str) -> List[str]:
+        """
+        Split a message into notification payloads.
+
+        Args:
+            message (str): The message to send.
+        Returns:
+            List[str]: The payloads, a single one when the message is small enough.
+        """
+        payload = json.dumps({"d": message})
+        if len(payload.encode()) <= NOTIFY_MAX_BYTES:
+            return [payload]
+
+        message_id = uuid.uuid4().hex
+        pieces = [
+            message[i : i + NOTIFY_CHUNK_CHARS]
+            for i in range(0, len(message), NOTIFY_CHUNK_CHARS)
+        ]
+        return [
+            json.dumps({"id": message_id, "i": index, "n": len(pieces), "d": piece})
+            for index, piece in enumerate(pieces)
+        ]
+
+    def decode(self, payload: str) -> Optional[str]:
+        """
+        Rebuild a message from a notification payload.
+
+        Returns:
+            str | None: The message, or None while chunks are still missing.
+        """
+        data = json.loads(payload)
+        if "id" not in data:
+            return data["d"]
+
+        pieces = self._partials.setdefault(data["id"], [])
+        pieces.append(data["d"])
+        if len(pieces) < data["n"]:
+            return None
+        del self._partials[data["id"]]
+        return "".join(pieces)
+
+    async def _listener_connection(self):
+        if self._listener is None:
+            connection = await self._connect(self.dsn)
+            connection.add_termination_listener(self._on_terminate)
+            # Listen again to the channels of a lost connection
+            for channel in self._channels:
+                await connection.add_listener(channel, self._on_notify)
+            self._listener = connection
+            if self._consumer is None:
+                self._consumer = asyncio.create_task(self._consume())
+        return self._listener
+
+    def _on_terminate(self, connection) -> None:
+        # Also called by close(), once the connection is no longer the listener
+        if connection is not self._listener:
+            return
+        logger.warning("connexion LISTEN perdue, reconnexion")
+        self._listener = None
+        self._partials.clear()
+        if self._reconnect is None or self._reconnect.done():
+            self._reconnect = asyncio.create_task(self._reconnect_listener())
+
+    async def _reconnect_listener(self) -> None:
+        delay = self.reconnect_delay
+        while True:
+            try:
+                # The lock is released between attempts, subscribe and
+                # unsubscribe keep working while the database is unreachable
+                async with self._listener_lock:
+                    await self._listener_connection()
+                logger.info("connexion LISTEN rétablie")
+                return
+            except Exception as e:
+                logger.error(f"reconnexion LISTEN impossible: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    async def _publisher_connection(self):
+        if self._publisher is None:
+            self._publisher = await self._connect(self.dsn)
+            self._publisher.add_termination_listener(self._on_publisher_terminate)
+        return self._publisher
+
+    def _on_publisher_terminate(self, connection) -> None:
+        # Opened again by the next publish
+        if connection is self._publisher:
+            self._publisher = None
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        # Called synchronously by the driver, the queue keeps the delivery order
+        self._inbox.put_nowait((channel, payload))
+
+    async def _consume(self) -> None:
+        while True:
+            channel, payload = await self._inbox.get()
+            try:
+                message = self.decode(payload)
+                if message is not None:
+                    await self._dispatch(self._session_id(channel), message)
+            except Exception as e:
+                logger.error(f"[{channel}] notification error: {e}")
+
+    async def publish(self, session_id: SessionID, message: str) -> None:
+        async with self._publisher_lock:
+            connection = await self._publisher_connection()
+            for payload in self.encode(message):
+                await connection.execute(
+                    "SELECT pg_notify($1, $2)", self.channel(session_id), payload
+                )
+
+    async def subscribe(self, session_id: SessionID) -> None:
+        channel = self.channel(session_id)
+        async with self._listener_lock:
+            if channel in self._channels:
+                return
+            connection = await self._listener_connection()
+            await connection.add_listener(channel, self._on_notify)
+            self._channels.add(channel)
+
+    async def unsubscribe(self, session_id: SessionID) -> None:
+        channel = self.channel(session_id)
+        async with self._listener_lock:
+            if channel not in self._channels:
+                return
+            self._channels.discard(channel)
+            if self._listener is not None:
+                await self._listener.remove_listener(channel, self._on_notify)
+
+    async def close(self) -> None:
+        for task in (self._consumer, self._reconnect):
+            if task:
+                task.cancel()
+        self._consumer = None
+        self._reconnect = None
+        connections = (self._listener, self._publisher)
+        self._listener = None
+        self._publisher = None
+        for connection in connections:
+            if connection is not None:
+                await connection.close()
+        self._channels.clear()
+
+
+def pubsub_from_settings() -> PubSubBackend:
+    """
+    Create the backend selected by the WS_PUBSUB_BACKEND setting.
+    """
+    if settings.WS_PUBSUB_BACKEND == "memory":
+        return InMemoryPubSub()
+    if settings.WS_PUBSUB_BACKEND == "postgres":
+        # asyncpg expects a plain postgres DSN, without the SQLAlchemy driver
+        url = make_url(settings.WS_PUBSUB_URL or settings.DATABASE_URL)
+        dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresPubSub(dsn)
+    raise ValueError(f"Unknown pub/sub backend: {settings.WS_PUBSUB_BACKEND}")
@@ -0,0 +1,62 @@
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+Frame = Tuple[int, str]
+
+
+def with_seq(seq: int, message: str) -> str:
+    """
+    Add the sequence number to a JSON object frame, without parsing it again.
+    Other frames are returned unchanged.
+    """
+    if not message.startswith("{"):
+        return message
+    body = message[1:].lstrip()
+    separator = "" if body.startswith("}") else ", "
+    return f'{{"seq": {seq}{separator}{body}'
+
+
+class ReplayBuffer:
+    """
+    Last frames sent to a session, numbered so that a reconnecting client can
+    get the ones it missed.
+
+    Sequence numbers start from the current time in microseconds: a buffer
+    created later, by another worker or after a restart, never reuses the
+    numbers a client may hold from a previous one.
+    """
+
+    def __init__(self, size: int, clock: Callable[[], int] = time.time_ns):
+        self.frames: Deque[Frame] = deque(maxlen=size)
+        self.last_seq = clock() // 1000
+
+    def append(self, message: str) -> str:
+        """
+        Number a frame and keep it for replay.
+
+        Returns:
+            str: The frame including its sequence number.
+        """
+        self.last_seq += 1
+        frame = with_seq(self.last_seq, message)
+        self.frames.append((self.last_seq, frame))
+        return frame
+
+    def since(self, seq: int) -> Optional[List[Frame]]:
+        """
+        Frames following a sequence number.
+
+        Args:
+            seq (int): Last sequence number received by the client.
+        Returns:
+            List[Frame] | None: The missed frames, or None when the buffer cannot
+            tell, either because they were evicted or because the number was
+            not produced by this buffer.
+        """
+        if seq > self.last_seq:
+            return None
+        first = self.frames[0][0] if self.frames else self.last_seq + 1
+        if seq < first - 1:
+            return None
+        return [frame for frame in self.frames if frame[0] > seq]
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Set
+
+from brobot.config import settings
+
+SessionID = int
+TurnCallback = Callable[[], Awaitable[None]]
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class TurnCoordinator:
+    """
+    Make sure each session has at most one bot turn running.
+
+    A turn waits for a short debounce delay before generating, and a request made
+    during that delay replaces it, so messages sent in a burst get one answer.
+    Requests made while a generation is in flight are merged into a single
+    follow-up turn, started once the current one is over.
+    """
+
+    def __init__(self, debounce: float = 0.0):
+        self.debounce = debounce
+        self._tasks: Dict[SessionID, asyncio.Task] = {}
+        self._generating: Set[SessionID] = set()
+        self._follow_ups: Dict[SessionID, TurnCallback] = {}
+
+    def request_turn(self, session_id: SessionID, turn: TurnCallback) -> None:
+        """
+        Ask for the bot to answer the latest messages of a session.
+
+        Args:
+            session_id (SessionID): The session to answer.
+            turn (TurnCallback): Coroutine function generating the answer.
+        """
+        task = self._tasks.get(session_id)
+        if task is None or task.done():
+            self._start(session_id, turn)
+        elif session_id in self._generating:
+            # Answered by a single follow-up turn, whatever the number of requests
+            self._follow_ups[session_id] = turn
+        else:
+            # Nothing was generated yet, the new turn supersedes it
+            task.cancel()
+            self._start(session_id, turn)
+
+    def is_busy(self, session_id: SessionID) -> bool:
+        task = self._tasks.get(session_id)
+        return task is not None and not task.done()
+
+    async def wait(self, session_id: SessionID) -> None:
+        """
+        Wait until the session has no turn running nor pending.
+        """
+        while task := self._tasks.get(session_id):
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+
+    def _start(self, session_id: SessionID, turn: TurnCallback) -> None:
+        self._tasks[session_id] = asyncio.create_task(self._run(session_id, turn))
+
+    async def _run(self, session_id: SessionID, turn: TurnCallback) -> None:
+        try:
+            while turn:
+                if self.debounce:
+                    await asyncio.sleep(self.debounce)
+
+                self._generating.add(session_id)
+                try:
+                    await turn()
+                except Exception as e:
+                    logger.error(f"[{session_id}] bot turn error: {e}")
+                finally:
+                    self._generating.discard(session_id)
+
+                turn = self._follow_ups.pop(session_id, None)
+        finally:
+            if self._tasks.get(session_id) is asyncio.current_task():
+                del self._tasks[session_id]
+
+
+turn_coordinator = TurnCoordinator(debounce=settings.TURN_DEBOUNCE_SECONDS)
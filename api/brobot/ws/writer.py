@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple
+
+from fastapi import WebSocket
+
+logger = logging.getLogger("uvicorn.error")
+
+# Overflow policies
+DROP_DELTAS = "drop_deltas"
+DISCONNECT = "disconnect"
+
+# Only the latest frame of these kinds matters, a queued one is replaced
+COALESCED_KINDS = ("typing", "heartbeat")
+
+
+def frame_kind(message: str) -> str:
+    """
+    Classify an outbound message from its prefix, without parsing it.
+    Frames are serialized from dicts starting with their type, with or without
+    spaces depending on the serializer.
+    """
+    if not message:
+        return "heartbeat"
+    if message.startswith(('{"type": "delta"', '{"type":"delta"')):
+        return "delta"
+    if message.startswith(('{"type": "typing"', '{"type":"typing"')):
+        return "typing"
+    return "message"
+
+
+class WriterMetrics:
+    """
+    Counters shared by the writers of a ConnectionManager.
+    """
+
+    def __init__(self):
+        self.high_water = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+
+    def stats(self) -> dict:
+        return {
+            "high_water": self.high_water,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+
+class ConnectionWriter:
+    """
+    Send the frames of one websocket from a dedicated task, so producers only
+    enqueue and a slow client never blocks the generation.
+
+    The queue is bounded. Typing and heartbeat frames replace the queued frame
+    of the same kind. When the queue is full, the overflow policy either drops
+    the oldest delta (the final message supersedes them), or disconnects the
+    client, which then resumes from the replay buffer. Without any delta to
+    drop, the client is disconnected as well.
+    """
+
+    def __init__(
+        self,
+        session_id: int,
+        websocket: WebSocket,
+        max_size: int,
+        overflow: str = DROP_DELTAS,
+        metrics: Optional[WriterMetrics] = None,
+        on_close: Optional[Callable[["ConnectionWriter"], None]] = None,
+        heartbeat: Optional[float] = None,
+    ):
+        if overflow not in (DROP_DELTAS, DISCONNECT):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.session_id = session_id
+        self.websocket = websocket
+        self.max_size = max_size
+        self.overflow = overflow
+        self.metrics = metrics or WriterMetrics()
+        self.on_close = on_close
+
+        self.high_water = 0
+        self.closed = False
+        self._sending = False
+        self._frames: Deque[Tuple[str, str]] = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._run())
+        # Seconds between two empty frames keeping the socket alive, if any
+        self._heartbeat = (
+            asyncio.create_task(self._beat(heartbeat)) if heartbeat else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, frame: str, kind: str = "message") -> None:
+        """
+        Enqueue a frame without waiting for the client.
+
+        Args:
+            frame (str): The frame to send.
+            kind (str): The kind of frame, as returned by frame_kind.
+        """
+        if self.closed:
+            return
+
+        if kind in COALESCED_KINDS and self._remove_oldest(kind):
+            self.metrics.coalesced += 1
+
+        if len(self._frames) >= self.max_size:
+            if self.overflow == DROP_DELTAS and self._remove_oldest("delta"):
+                self.metrics.dropped += 1
+            else:
+                logger.warning(
+                    f"[{self.session_id}] client trop lent, {len(self._frames)} frame(s) en attente"
+                )
+                self.metrics.slow_disconnects += 1
+                self.close()
+                return
+
+        self._frames.append((kind, frame))
+        self.high_water = max(self.high_water, len(self._frames))
+        self.metrics.high_water = max(self.metrics.high_water, self.high_water)
+        self._idle.clear()
+        self._ready.set()
+
+    async def send(self, frame: str, kind: str = "message") -> None:
+        """
+        Enqueue a frame, waiting for the client while the queue is full instead
+        of applying the overflow policy. For the frames a client cannot catch up
+        without, such as the history.
+        """
+        while len(self._frames) >= self.max_size and not self.closed:
+            await self.drain()
+        self.put(frame, kind)
+
+    def _remove_oldest(self, kind: str) -> bool:
+        for index, (queued_kind, _) in enumerate(self._frames):
+            if queued_kind == kind:
+                del self._frames[index]
+                return True
+        return False
+
+    async def drain(self) -> None:
+        """
+        Wait until every queued frame was written, or the writer is closed.
+        """
+        await self._idle.wait()
+
+    def close(self) -> None:
+        """
+        Stop the writer, pending frames are discarded and the socket closed.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._frames.clear()
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        if self._sending:
+            # Do not wait for a send stuck on a slow client
+            self._task.cancel()
+        else:
+            self._ready.set()
+
+    async def wait_closed(self) -> None:
+        """
+        Wait until the tasks of a closed writer are done.
+        """
+        tasks = [task for task in (self._task, self._heartbeat) if task]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _beat(self, interval: float) -> None:
+        # Through the queue, a socket must not be written by two tasks at once
+        while not self.closed:
+            await asyncio.sleep(interval)
+            if self.websocket.client_state.name == "CONNECTED":
+                self.put("", "heartbeat")
+
+    async def _run(self) -> None:
+        try:
+            while not self.closed:
+                if not self._frames:
+                    self._idle.set()
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                _, frame = self._frames.popleft()
+                self._sending = True
+                await self.websocket.send_text(frame)
+                self._sending = False
+        except asyncio.CancelledError:
+            # Closed while a send was in flight
+            pass
+        except Exception as e:
+            logger.error(f"[{self.session_id}] send_text error: {e}")
+
+        # Failed sends close the socket too, the client reconnects and resumes
+        # from its last frame
+        self.closed = True
+        self._frames.clear()
+        self._idle.set()
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        if self.on_close:
+            self.on_close(self)
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
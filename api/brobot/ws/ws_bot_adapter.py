@@ -65,12 +65,32 @@ class BotAdapter:
             for message in messages
         ]
 
+    async def _forward_delta(self, delta: str):
+        """
+        Forward a chunk of the answer being generated to the client.
+        """
+        await self.connection_manager.send_json(
+            self.session_id, {"type": "delta", "content": delta}
+        )
+
+    async def _notify_queued(self, depth: int):
+        """
+        Tell the client its answer is waiting for a completion slot.
+        """
+        await self.connection_manager.send_json(
+            self.session_id, {"type": "typing", "status": "start", "queue": depth}
+        )
+
     async def answer_user_message(self):
         """
-        Generate an answer to the user's message.
+        Generate an answer to the user's message, streaming it while generated.
         """
 
-        if bot_message := await self.session_service.generate_answer(self.session_id):
+        if bot_message := await self.session_service.generate_answer(
+            self.session_id,
+            on_delta=self._forward_delta,
+            on_queued=self._notify_queued,
+        ):
             # Stop typing signal
             res = self.connection_manager.send_json(
                 self.session_id, {"type": "typing", "status": "stop"}
@@ -0,0 +1,125 @@
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from brobot.api.pagination import NEXT_CURSOR_HEADER
+from brobot.api.routes import scenario
+from brobot.database import get_session
+from brobot.dto import CreateScenarioChapterDTO, CreateScenarioDTO
+from brobot.services.scenarios import ScenarioService
+
+
+def scenario_dto(slug: str, title: str = "Title") -> CreateScenarioDTO:
+    return CreateScenarioDTO(
+        slug=slug,
+        title=title,
+        description="Desc",
+        chapters=[CreateScenarioChapterDTO(title="Select", content="c", order=1)],
+    )
+
+
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.fixture
+def statements(session):
+    recorded = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        recorded.append(statement)
+
+    engine = session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield recorded
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest_asyncio.fixture
+async def client(session):
+    app = FastAPI()
+    app.include_router(scenario.router, prefix="/scenarios")
+    app.dependency_overrides[get_session] = lambda: session
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.asyncio
+async def test_scenario_is_served_from_cache_and_revalidated(
+    client, session, statements
+):
+    created = await ScenarioService(session).create(scenario_dto("sql"))
+
+    response = await client.get(f"/scenarios/{created.id}")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Title"
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, no-cache"
+
+    statements.clear()
+    response = await client.get(
+        f"/scenarios/{created.id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert statements == []
+
+    response = await client.get(
+        f"/scenarios/{created.id}", headers={"If-None-Match": '"other"'}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] == etag
+
+    # A new version gets a new tag
+    await ScenarioService(session).bulk_upsert([scenario_dto("sql", "New")])
+    response = await client.get(
+        f"/scenarios/{created.id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "New"
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_missing_scenario_is_not_cached(client, session):
+    assert (await client.get("/scenarios/1")).status_code == 404
+    created = await ScenarioService(session).create(scenario_dto("sql"))
+    assert (await client.get(f"/scenarios/{created.id}")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_scenario_pages_keep_their_cursor_and_see_new_scenarios(client, session):
+    service = ScenarioService(session)
+    await service.bulk_upsert([scenario_dto("a"), scenario_dto("b")])
+
+    response = await client.get("/scenarios/", params={"limit": 1})
+    assert len(response.json()) == 1
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    etag = response.headers["etag"]
+
+    response = await client.get(
+        "/scenarios/", params={"limit": 1}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers[NEXT_CURSOR_HEADER] == cursor
+
+    response = await client.get("/scenarios/", params={"after": cursor})
+    assert [s["title"] for s in response.json()] == ["Title"]
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+    await service.bulk_upsert([scenario_dto("c")])
+    response = await client.get("/scenarios/", params={"after": cursor})
+    assert len(response.json()) == 2
@@ -0,0 +1,88 @@
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from brobot.api.routes import session as session_routes
+from brobot.database import get_session
+from brobot.models import Scenario, SessionMessage, TrainingSession
+from brobot.ws.manager import ConnectionManager
+
+
+@pytest.fixture
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'brobot.db'}"
+    sync_engine = create_engine(url)
+    SQLModel.metadata.create_all(sync_engine)
+    with Session(sync_engine) as db:
+        scenario = Scenario(title="SQL", description="Desc", slug="sql")
+        db.add(scenario)
+        db.flush()
+        training_session = TrainingSession(user_id=1, scenario_id=scenario.id)
+        db.add(training_session)
+        db.flush()
+        db.add_all(
+            SessionMessage(content=f"M{i}", role="user", session_id=training_session.id)
+            for i in range(3)
+        )
+        db.commit()
+        session_id = training_session.id
+    sync_engine.dispose()
+    return url.replace("sqlite://", "sqlite+aiosqlite://"), session_id
+
+
+def test_open_socket_does_not_hold_a_database_connection(database, monkeypatch):
+    url, session_id = database
+    engine = create_async_engine(url)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(session_routes, "async_session_factory", factory)
+    manager = ConnectionManager()
+    monkeypatch.setattr(session_routes, "connection_manager", manager)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await manager.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(session_routes.router, prefix="/sessions")
+
+    async def get_test_session():
+        async with factory() as db:
+            yield db
+
+    app.dependency_overrides[get_session] = get_test_session
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            f"/sessions/ws/{session_id}?last_message_id=0"
+        ) as ws:
+            history = [json.loads(ws.receive_text()) for _ in range(3)]
+            assert [m["content"] for m in history] == ["M0", "M1", "M2"]
+            # The history was read, and its connection given back to the pool
+            assert engine.pool.checkedout() == 0
+
+
+def test_websocket_stats_are_exposed(monkeypatch):
+    manager = ConnectionManager()
+    manager.writer_metrics.high_water = 12
+    monkeypatch.setattr(session_routes, "connection_manager", manager)
+
+    app = FastAPI()
+    app.include_router(session_routes.router, prefix="/sessions")
+    with TestClient(app) as client:
+        response = client.get("/sessions/ws/stats")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "high_water": 12,
+        "dropped": 0,
+        "coalesced": 0,
+        "slow_disconnects": 0,
+        "queued": {},
+    }
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from brobot.bot.agents import (
+    PROMPT_PREFIX,
+    AgentCache,
+    agent_cache,
+    build_instructions,
+    prepared_agent,
+)
+
+
+def make_chapter(scenario_id=1, chapter_id=1, content="Content"):
+    scenario = SimpleNamespace(id=scenario_id, title="SQL", description="Learn SQL")
+    chapter = SimpleNamespace(
+        id=chapter_id, title="SELECT", content=content, content_hash=None
+    )
+    return scenario, chapter
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    agent_cache.clear()
+    yield
+    agent_cache.clear()
+
+
+def test_prepared_agent_is_reused_for_same_content():
+    scenario, chapter = make_chapter()
+
+    first = prepared_agent(scenario, chapter)
+    second = prepared_agent(scenario, chapter)
+
+    assert first is second
+    assert agent_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_prepared_agent_is_rebuilt_when_content_changes():
+    scenario, chapter = make_chapter()
+    first = prepared_agent(scenario, chapter)
+
+    chapter.content = "Updated content"
+    second = prepared_agent(scenario, chapter)
+
+    assert first is not second
+    assert "Updated content" in second.instructions
+
+
+def test_invalidate_scenario_drops_its_agents():
+    prepared_agent(*make_chapter(scenario_id=1, chapter_id=1))
+    prepared_agent(*make_chapter(scenario_id=1, chapter_id=2))
+    prepared_agent(*make_chapter(scenario_id=2, chapter_id=3))
+
+    agent_cache.invalidate_scenario(1)
+
+    assert agent_cache.stats()["size"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = AgentCache(maxsize=2)
+    cache.put("a", "agent-a")
+    cache.put("b", "agent-b")
+    cache.get("a")
+    cache.put("c", "agent-c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "agent-a"
+    assert cache.get("c") == "agent-c"
+
+
+def test_instructions_start_with_static_prefix():
+    first = build_instructions(*make_chapter(scenario_id=1, content="A"))
+    second = build_instructions(*make_chapter(scenario_id=2, content="B"))
+
+    assert first.startswith(PROMPT_PREFIX)
+    assert second.startswith(PROMPT_PREFIX)
+    assert "{" not in PROMPT_PREFIX
@@ -0,0 +1,48 @@
+from brobot.bot.formatting import (
+    format_cell,
+    format_markdown,
+    format_result,
+    format_tsv,
+)
+from brobot.bot.sandbox import QueryResult
+
+RESULT = QueryResult(
+    columns=["id", "name", "note"],
+    rows=[(1, "Alice", 7), (2, "a|b\nc", None)],
+)
+
+
+def test_format_cell_is_single_line_and_capped():
+    assert format_cell(None) == "NULL"
+    assert format_cell("a\nb\tc") == "a b c"
+    assert format_cell("x" * 50, max_width=10) == "x" * 9 + "…"
+
+
+def test_format_markdown():
+    assert format_markdown(RESULT) == (
+        "| id | name | note |\n"
+        "| --- | --- | --- |\n"
+        "| 1 | Alice | 7 |\n"
+        "| 2 | a\\|b c | NULL |"
+    )
+
+
+def test_format_tsv():
+    assert format_tsv(RESULT) == "id\tname\tnote\n1\tAlice\t7\n2\ta|b c\tNULL"
+
+
+def test_format_result_marks_truncated_and_empty_results():
+    truncated = QueryResult(columns=["n"], rows=[(1,)], truncated=True)
+    assert format_result(truncated).endswith("(truncated to the first 1 rows)")
+
+    empty = QueryResult(columns=["n"], rows=[])
+    assert format_result(empty, "tsv") == "n\n(no rows)"
+
+    assert format_result(QueryResult(columns=[], rows=[])) == (
+        "Query executed, no result set."
+    )
+
+
+def test_format_result_has_no_ansi_codes():
+    assert "\x1b[" not in format_result(RESULT)
+    assert "\x1b[" in format_result(RESULT, "rich")
@@ -0,0 +1,69 @@
+import pytest
+
+from brobot.bot.grader import Grading, Verdict, compare, extract_query, grade
+from brobot.bot.sandbox import QueryResult, SandboxPool, parse_fixtures
+
+from tests.bot.test_sandbox import CHAPTER
+
+
+def test_grading_is_read_from_the_chapter_meta():
+    assert Grading.from_meta(None) is None
+    assert Grading.from_meta({"result_format": "tsv"}) is None
+    assert Grading.from_meta({"reference_query": "SELECT 1", "ordered": True}) == (
+        Grading("SELECT 1", ordered=True)
+    )
+
+
+@pytest.mark.parametrize(
+    "message, query",
+    [
+        ("SELECT name FROM students", "SELECT name FROM students"),
+        ("Is it right?\n```sql\nSELECT 1\n```", "SELECT 1"),
+        ("I think I should select the names", None),
+        ("DROP TABLE students", None),
+    ],
+)
+def test_extract_query(message, query):
+    assert extract_query(message) == query
+
+
+def test_compare_rows_in_any_order_unless_ordered():
+    expected = QueryResult(["n"], [(1,), (2,)])
+    shuffled = QueryResult(["total"], [(2,), (1,)])
+
+    assert compare(expected, shuffled, ordered=False).correct
+    assert not compare(expected, shuffled, ordered=True).correct
+    assert not compare(expected, QueryResult(["n"], [(1,)]), ordered=False).correct
+    assert not compare(
+        expected, QueryResult(["n", "m"], [(1, 1), (2, 2)]), False
+    ).correct
+
+
+def test_compare_floats_with_tolerance():
+    expected = QueryResult(["avg"], [(6.75,)])
+    assert compare(expected, QueryResult(["avg"], [(6.7500000001,)]), False).correct
+
+
+@pytest.mark.asyncio
+async def test_grade_runs_both_queries_on_untouched_fixtures():
+    pool = SandboxPool(max_sandboxes=4, max_memory=1 << 30, threads=1, cache_size=8)
+    fixtures = parse_fixtures(CHAPTER)
+    grading = Grading("SELECT name FROM students WHERE note > 6.6")
+
+    # The learner sandbox is not the one used for grading
+    await pool.execute(1, fixtures, "DELETE FROM students")
+
+    verdict = await grade(
+        pool, 1, fixtures, grading, "select name from students where note >= 7"
+    )
+    assert verdict == Verdict(True, "the result matches the expected one")
+
+    verdict = await grade(pool, 1, fixtures, grading, "SELECT name FROM students")
+    assert not verdict.correct
+
+    verdict = await grade(pool, 1, fixtures, grading, "SELECT nom FROM students")
+    assert not verdict.correct
+    assert verdict.reason.startswith("Query error")
+
+    assert await grade(pool, 1, fixtures, grading, "DELETE FROM students") is None
+    pool.close()
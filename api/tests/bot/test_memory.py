@@ -0,0 +1,115 @@
+import pytest
+from types import SimpleNamespace
+
+from brobot.bot.memory import ConversationMemory, estimate_tokens
+
+
+def make_messages(count: int, content: str = "hello"):
+    return [
+        SimpleNamespace(
+            id=i, role="user" if i % 2 else "assistant", content=f"{content} {i}"
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+class RecordingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, summary, messages, max_tokens):
+        self.calls.append((summary, messages, max_tokens))
+        return f"summary of {len(messages)} messages"
+
+
+def make_memory(summarizer, **kwargs):
+    options = dict(
+        window_turns=2, max_tokens=1000, summary_batch=3, summary_max_tokens=100
+    )
+    options.update(kwargs)
+    return ConversationMemory(summarizer=summarizer, **options)
+
+
+@pytest.mark.asyncio
+async def test_short_conversation_is_sent_verbatim():
+    summarizer = RecordingSummarizer()
+    memory = make_memory(summarizer)
+
+    window = await memory.build(make_messages(3))
+
+    assert [m["content"] for m in window.messages] == ["hello 1", "hello 2", "hello 3"]
+    assert window.summary is None
+    assert window.summary_updated is False
+    assert summarizer.calls == []
+
+
+@pytest.mark.asyncio
+async def test_evicted_messages_wait_for_a_full_batch():
+    summarizer = RecordingSummarizer()
+    memory = make_memory(summarizer)
+
+    # window of 4 messages, 2 evicted: below the batch of 3
+    window = await memory.build(make_messages(6))
+
+    assert len(window.messages) == 6
+    assert summarizer.calls == []
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_folded_into_summary():
+    summarizer = RecordingSummarizer()
+    memory = make_memory(summarizer)
+
+    window = await memory.build(make_messages(8), summary="previous")
+
+    assert len(summarizer.calls) == 1
+    previous, folded, max_tokens = summarizer.calls[0]
+    assert previous == "previous"
+    assert [m["content"] for m in folded] == [f"hello {i}" for i in range(1, 5)]
+    assert max_tokens == 100
+
+    assert window.summary_updated is True
+    assert window.summary_message_id == 4
+    assert window.messages[0]["role"] == "system"
+    assert "summary of 4 messages" in window.messages[0]["content"]
+    assert [m["content"] for m in window.messages[1:]] == [
+        f"hello {i}" for i in range(5, 9)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_already_summarized_messages_are_skipped():
+    summarizer = RecordingSummarizer()
+    memory = make_memory(summarizer)
+
+    window = await memory.build(make_messages(6), summary="known", summary_message_id=4)
+
+    assert summarizer.calls == []
+    assert window.summary_updated is False
+    assert window.messages[0]["content"].endswith("known")
+    assert [m["content"] for m in window.messages[1:]] == ["hello 5", "hello 6"]
+
+
+@pytest.mark.asyncio
+async def test_token_budget_forces_summary():
+    summarizer = RecordingSummarizer()
+    long_content = "x" * 400
+    budget = estimate_tokens(f"{long_content} 1") * 2
+    memory = make_memory(summarizer, window_turns=10, max_tokens=budget)
+
+    window = await memory.build(make_messages(3, content=long_content))
+
+    assert len(summarizer.calls) == 1
+    assert window.summary_message_id == 1
+    assert len(window.messages) == 3  # summary + two most recent messages
+
+
+@pytest.mark.asyncio
+async def test_last_message_is_always_kept():
+    summarizer = RecordingSummarizer()
+    memory = make_memory(summarizer, max_tokens=1)
+
+    window = await memory.build(make_messages(1, content="x" * 400))
+
+    assert len(window.messages) == 1
+    assert summarizer.calls == []
@@ -0,0 +1,70 @@
+import pytest
+
+from brobot.bot.result_cache import ResultCache, query_fingerprint
+from brobot.bot.sandbox import SandboxPool, parse_fixtures
+
+from tests.bot.test_sandbox import CHAPTER
+
+
+def test_fingerprint_ignores_whitespace_case_and_comments():
+    assert query_fingerprint("select name from students") == query_fingerprint(
+        "SELECT   name\n  FROM students -- learners"
+    )
+    assert query_fingerprint("SELECT name FROM students") != query_fingerprint(
+        "SELECT id FROM students"
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "DELETE FROM students",
+        "CREATE TABLE t AS SELECT 1",
+        "SELECT random()",
+        "SELECT current_date",
+        "SELEC name",
+    ],
+)
+def test_only_deterministic_read_only_queries_are_cacheable(query):
+    assert query_fingerprint(query) is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResultCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats() == {"hits": 2, "misses": 1, "size": 2, "hit_rate": 2 / 3}
+
+
+@pytest.mark.asyncio
+async def test_results_are_shared_across_sessions():
+    pool = SandboxPool(max_sandboxes=4, max_memory=1 << 30, threads=1, cache_size=8)
+    fixtures = parse_fixtures(CHAPTER)
+
+    first = await pool.execute(1, fixtures, "SELECT count(*) FROM students")
+    second = await pool.execute(2, fixtures, "select COUNT(*)  from students")
+
+    assert second is first
+    assert pool.stats()["cache"]["hits"] == 1
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_modified_sandboxes_bypass_the_cache():
+    pool = SandboxPool(max_sandboxes=4, max_memory=1 << 30, threads=1, cache_size=8)
+    fixtures = parse_fixtures(CHAPTER)
+
+    await pool.execute(1, fixtures, "SELECT count(*) FROM students")
+    await pool.execute(2, fixtures, "DELETE FROM students")
+    result = await pool.execute(2, fixtures, "SELECT count(*) FROM students")
+    assert result.rows == [(0,)]
+
+    # The result of the modified sandbox is not shared either
+    result = await pool.execute(3, fixtures, "SELECT count(*) FROM students")
+    assert result.rows == [(2,)]
+    pool.close()
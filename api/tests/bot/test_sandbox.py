@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+from textwrap import dedent
+
+import duckdb
+import pytest
+
+from brobot.bot.sandbox import (
+    QueryLimits,
+    QueryRejected,
+    SandboxPool,
+    parse_fixtures,
+)
+
+CHAPTER = dedent(
+    """
+    <examples>
+    ```sql
+    SELECT name FROM students;
+    ```
+    </examples>
+    <data>
+    id | name    | note
+    --------------------
+    1  | Alice   | 7
+    2  | John    | 6.5
+    </data>
+    <data name="events">
+    id | event_date
+    --------------
+    1  | 2025-02-10
+    </data>
+    """
+)
+
+
+def test_parse_fixtures_infers_tables_and_types():
+    students, events = parse_fixtures(CHAPTER)
+
+    assert students.table == "students"
+    assert students.columns == ["id", "name", "note"]
+    assert students.types == ["BIGINT", "VARCHAR", "DOUBLE"]
+    assert students.rows == [[1, "Alice", 7.0], [2, "John", 6.5]]
+
+    assert events.table == "events"
+    assert events.rows == [[1, datetime.date(2025, 2, 10)]]
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_isolated():
+    pool = SandboxPool(max_sandboxes=4, max_memory=1 << 30, threads=2)
+    fixtures = parse_fixtures(CHAPTER)
+
+    await pool.execute(1, fixtures, "DROP TABLE students")
+    result = await pool.execute(2, fixtures, "SELECT count(*) AS n FROM students")
+
+    assert result.columns == ["n"]
+    assert result.rows == [(2,)]
+    with pytest.raises(duckdb.Error):
+        await pool.execute(1, fixtures, "SELECT * FROM students")
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_sandbox_is_reseeded_when_fixtures_change():
+    pool = SandboxPool(max_sandboxes=4, max_memory=1 << 30, threads=1)
+    fixtures = parse_fixtures(CHAPTER)
+
+    await pool.execute(1, fixtures, "DELETE FROM students")
+    result = await pool.execute(1, fixtures, "SELECT count(*) FROM students")
+    assert result.rows == [(0,)]
+
+    # next chapter
+    result = await pool.execute(1, fixtures[:1], "SELECT count(*) FROM students")
+    assert result.rows == [(2,)]
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_reseeding_waits_for_the_running_query():
+    pool = SandboxPool(
+        max_sandboxes=4,
+        max_memory=1 << 30,
+        threads=2,
+        limits=QueryLimits(timeout=10, max_plan_rows=10**12),
+    )
+    fixtures = parse_fixtures(CHAPTER)
+    await pool.execute(1, fixtures, "SELECT 1")
+
+    running = asyncio.create_task(
+        pool.execute(
+            1, fixtures, "SELECT count(*) FROM range(100000000) t(i) WHERE i % 7 = 3"
+        )
+    )
+    await asyncio.sleep(0.05)
+    # next chapter, while the previous query still runs
+    result = await pool.execute(1, fixtures[:1], "SELECT count(*) FROM students")
+
+    assert (await running).rows == [(14285714,)]
+    assert result.rows == [(2,)]
+    assert len(pool) == 1
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_sandboxes_are_evicted():
+    pool = SandboxPool(max_sandboxes=2, max_memory=1 << 30, threads=1)
+    fixtures = parse_fixtures(CHAPTER)
+
+    await pool.execute(1, fixtures, "DELETE FROM students")
+    await pool.execute(2, fixtures, "SELECT 1")
+    await pool.execute(1, fixtures, "SELECT 1")
+    await pool.execute(3, fixtures, "SELECT 1")
+
+    assert len(pool) == 2
+    assert pool.evictions == 1
+    # session 1 was used more recently than session 2, and kept its changes
+    result = await pool.execute(1, fixtures, "SELECT count(*) FROM students")
+    assert result.rows == [(0,)]
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_sandboxes_are_evicted_over_the_memory_cap():
+    pool = SandboxPool(max_sandboxes=10, max_memory=1, threads=1)
+    fixtures = parse_fixtures(CHAPTER)
+
+    await pool.execute(1, fixtures, "SELECT 1")
+    await pool.execute(2, fixtures, "SELECT 1")
+
+    # only the sandbox in use is kept
+    assert len(pool) == 1
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_external_access_is_disabled():
+    pool = SandboxPool(max_sandboxes=1, max_memory=1 << 30, threads=1)
+
+    with pytest.raises(duckdb.Error):
+        await pool.execute(1, [], "SELECT * FROM read_csv('/etc/passwd')")
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_long_queries_are_interrupted():
+    pool = SandboxPool(
+        max_sandboxes=1,
+        max_memory=1 << 30,
+        threads=1,
+        limits=QueryLimits(timeout=0.2, max_plan_rows=10**12),
+    )
+
+    with pytest.raises(QueryRejected, match="interrupted"):
+        await pool.execute(
+            1, [], "SELECT count(*) FROM range(10000000000) t(i) WHERE i % 7 = 3"
+        )
+    # the sandbox is still usable
+    result = await pool.execute(1, [], "SELECT 1")
+    assert result.rows == [(1,)]
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_rows_are_truncated():
+    pool = SandboxPool(
+        max_sandboxes=1, max_memory=1 << 30, threads=1, limits=QueryLimits(max_rows=3)
+    )
+
+    result = await pool.execute(1, [], "SELECT * FROM range(10)")
+    assert result.rows == [(0,), (1,), (2,)]
+    assert result.truncated
+
+    result = await pool.execute(1, [], "SELECT * FROM range(3)")
+    assert not result.truncated
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_explosive_plans_are_refused():
+    pool = SandboxPool(
+        max_sandboxes=1,
+        max_memory=1 << 30,
+        threads=1,
+        limits=QueryLimits(max_plan_rows=1000),
+    )
+
+    # checked after the table is created by the previous statement
+    with pytest.raises(QueryRejected, match="plan"):
+        await pool.execute(
+            1,
+            [],
+            "CREATE TABLE t AS SELECT * FROM range(100); SELECT * FROM t a, t b",
+        )
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_limits_cannot_be_changed_by_queries():
+    pool = SandboxPool(max_sandboxes=1, max_memory=1 << 30, threads=1)
+
+    with pytest.raises(duckdb.Error):
+        await pool.execute(1, [], "SET memory_limit = '100GB'")
+    pool.close()
@@ -0,0 +1,221 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+from brobot.bot.scheduler import CompletionScheduler, TokenBucket
+
+
+def rate_limit_error():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, request=request)
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+@pytest.mark.asyncio
+async def test_in_flight_completions_are_capped():
+    scheduler = CompletionScheduler(max_concurrency=2)
+    running = 0
+    peak = 0
+
+    async def completion():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    results = await asyncio.gather(
+        *(scheduler.run(session_id, completion) for session_id in range(6))
+    )
+
+    assert results == ["ok"] * 6
+    assert peak == 2
+    assert scheduler.in_flight == 0
+    assert scheduler.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_free_slots_are_shared_round_robin_between_sessions():
+    scheduler = CompletionScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    async def blocking():
+        await release.wait()
+
+    def completion(session_id):
+        async def run():
+            order.append(session_id)
+
+        return run
+
+    first = asyncio.create_task(scheduler.run("busy", blocking))
+    await asyncio.sleep(0)
+
+    # A busy session queues three requests before another session queues one
+    tasks = [
+        asyncio.create_task(scheduler.run("busy", completion("busy"))) for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(scheduler.run("other", completion("other"))))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(first, *tasks)
+
+    assert order == ["busy", "other", "busy", "busy"]
+
+
+@pytest.mark.asyncio
+async def test_queued_requests_report_queue_depth():
+    scheduler = CompletionScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    depths = []
+
+    async def blocking():
+        await release.wait()
+
+    async def on_queued(depth):
+        depths.append(depth)
+
+    async def completion():
+        return None
+
+    first = asyncio.create_task(scheduler.run(1, blocking, on_queued=on_queued))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(scheduler.run(2, completion, on_queued=on_queued))
+    third = asyncio.create_task(scheduler.run(3, completion, on_queued=on_queued))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(first, second, third)
+
+    assert depths == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = CompletionScheduler(max_concurrency=1)
+    release = asyncio.Event()
+
+    async def blocking():
+        await release.wait()
+
+    first = asyncio.create_task(scheduler.run(1, blocking))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(scheduler.run(2, blocking))
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth == 1
+
+    waiting.cancel()
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth == 0
+
+    release.set()
+    await first
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_failing_on_queued_callback_does_not_leak_a_slot():
+    scheduler = CompletionScheduler(max_concurrency=1)
+    release = asyncio.Event()
+
+    async def blocking():
+        await release.wait()
+
+    async def closed_client(depth):
+        raise RuntimeError("websocket closed")
+
+    async def completion():
+        return "ok"
+
+    first = asyncio.create_task(scheduler.run(1, blocking))
+    await asyncio.sleep(0)
+    with pytest.raises(RuntimeError):
+        await scheduler.run(2, completion, on_queued=closed_client)
+    assert scheduler.queue_depth == 0
+
+    release.set()
+    await first
+    assert scheduler.in_flight == 0
+    assert await scheduler.run(3, completion) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_errors_are_retried():
+    scheduler = CompletionScheduler(
+        max_concurrency=1, max_retries=3, retry_base_delay=0.001
+    )
+    attempts = 0
+
+    async def completion():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise rate_limit_error()
+        return "ok"
+
+    assert await scheduler.run(1, completion) == "ok"
+    assert attempts == 3
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_errors_are_not_retried_once_streamed():
+    scheduler = CompletionScheduler(
+        max_concurrency=1, max_retries=3, retry_base_delay=0.001
+    )
+    deltas = []
+
+    async def completion():
+        deltas.append("Hello")
+        raise rate_limit_error()
+
+    with pytest.raises(RateLimitError):
+        await scheduler.run(1, completion, retryable=lambda: not deltas)
+    assert deltas == ["Hello"]
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_errors_are_raised_after_max_retries():
+    scheduler = CompletionScheduler(
+        max_concurrency=1, max_retries=1, retry_base_delay=0.001
+    )
+
+    async def completion():
+        raise rate_limit_error()
+
+    with pytest.raises(RateLimitError):
+        await scheduler.run(1, completion)
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill(monkeypatch):
+    now = 0.0
+    sleeps = []
+
+    async def fake_sleep(delay):
+        nonlocal now
+        sleeps.append(delay)
+        now += delay
+
+    monkeypatch.setattr("brobot.bot.scheduler.asyncio.sleep", fake_sleep)
+    bucket = TokenBucket(per_minute=60, clock=lambda: now)
+
+    await bucket.acquire(60)
+    await bucket.acquire(30)
+
+    assert sleeps == [pytest.approx(30)]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_disabled_with_zero_rate():
+    bucket = TokenBucket(per_minute=0)
+    for _ in range(1000):
+        await bucket.acquire(1000)
@@ -0,0 +1,11 @@
+import pytest
+
+from brobot.services.content_cache import content_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_content_cache():
+    # Every test starts from a fresh database, where ids are reused
+    content_cache.clear()
+    yield
+    content_cache.clear()
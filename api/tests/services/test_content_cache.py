@@ -0,0 +1,102 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from brobot.dto import CreateScenarioChapterDTO, CreateScenarioDTO
+from brobot.models import Scenario, ScenarioChapter
+from brobot.services.content_cache import ContentCache, content_cache
+from brobot.services.scenarios import ScenarioService
+
+
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+    await engine.dispose()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    cache = ContentCache(maxsize=10, max_bytes=1000, ttl=60, clock=clock)
+    cache.put("a", "value", scenario_id=1, size=5)
+
+    clock.now = 59
+    assert cache.get("a") == "value"
+    clock.now = 60
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 0, "bytes": 0}
+
+
+def test_least_recently_used_entries_are_evicted_over_the_byte_cap():
+    cache = ContentCache(maxsize=10, max_bytes=100, ttl=60)
+    cache.put("a", "a", scenario_id=1, size=40)
+    cache.put("b", "b", scenario_id=1, size=40)
+    cache.get("a")
+    cache.put("c", "c", scenario_id=2, size=40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+    # Larger than the whole cache, not kept
+    cache.put("d", "d", scenario_id=2, size=200)
+    assert cache.get("d") is None
+
+    cache.invalidate_scenario(2)
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["bytes"] == 40
+
+
+@pytest.mark.asyncio
+async def test_reads_go_through_the_cache_until_invalidated(session):
+    service = ScenarioService(session)
+    created = await service.create(
+        CreateScenarioDTO(
+            slug="sql",
+            title="SQL",
+            description="Desc",
+            chapters=[CreateScenarioChapterDTO(title="Select", content="c", order=1)],
+        )
+    )
+    chapter_id = created.chapters[0].id
+
+    scenario = await content_cache.scenario(session, created.id)
+    chapter = await content_cache.chapter(session, chapter_id)
+    assert (scenario.title, chapter.content) == ("SQL", "c")
+    assert (await service.get(created.id)).title == "SQL"
+
+    # Changed behind the cache
+    (await session.get(Scenario, created.id)).title = "Changed"
+    (await session.get(ScenarioChapter, chapter_id)).content = "changed"
+    await session.commit()
+    assert (await content_cache.scenario(session, created.id)).title == "SQL"
+    assert (await content_cache.chapter(session, chapter_id)).content == "c"
+    assert (await service.get(created.id)).title == "SQL"
+
+    await service.bulk_upsert(
+        [
+            CreateScenarioDTO(
+                slug="sql",
+                title="SQL",
+                description="Desc",
+                chapters=[
+                    CreateScenarioChapterDTO(title="Select", content="new", order=1)
+                ],
+            )
+        ]
+    )
+    assert (await content_cache.scenario(session, created.id)).title == "SQL"
+    assert (await content_cache.chapter(session, chapter_id)).content == "new"
+    assert (await service.get(created.id)).version == 2
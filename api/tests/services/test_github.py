@@ -0,0 +1,76 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from pydantic import HttpUrl
+
+from brobot.services.github import GitHubFetcher
+
+SCENARIO = {"title": "SQL", "description": "Desc", "chapters": []}
+
+
+class RawContentHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for raw.githubusercontent.com serving a single file with an ETag.
+    """
+
+    requests = []
+    etag = '"v1"'
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path != "/amrltqt/brobot/master/scenario.json":
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(SCENARIO).encode()
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def raw_server():
+    RawContentHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RawContentHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_files_are_revalidated_with_their_etag(raw_server):
+    fetcher = GitHubFetcher(raw_server, timeout=5, cache_size=8)
+    url = HttpUrl("https://github.com/amrltqt/brobot/blob/master/scenario.json")
+
+    assert await fetcher.fetch_json(url) == SCENARIO
+    assert await fetcher.fetch_json(url) == SCENARIO
+
+    assert RawContentHandler.requests == [
+        ("/amrltqt/brobot/master/scenario.json", None),
+        ("/amrltqt/brobot/master/scenario.json", '"v1"'),
+    ]
+    assert fetcher.stats() == {"fetched": 1, "revalidated": 1, "size": 1}
+    await fetcher.close()
+
+
+@pytest.mark.asyncio
+async def test_missing_files_raise_value_error(raw_server):
+    fetcher = GitHubFetcher(raw_server, timeout=5, cache_size=8)
+    url = HttpUrl("https://github.com/amrltqt/brobot/blob/master/missing.json")
+
+    with pytest.raises(ValueError, match="404"):
+        await fetcher.fetch_json(url)
+    await fetcher.close()
@@ -0,0 +1,72 @@
+import io
+import json
+import tarfile
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from brobot.models import Scenario
+from brobot.services import importer
+from brobot.services.importer import import_scenarios, read_bundle
+
+SCENARIO = {
+    "title": "SQL",
+    "description": "Desc",
+    "chapters": [{"order": 1, "title": "SELECT", "content": "Content"}],
+}
+
+
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    (tmp_path / "sql.json").write_text(json.dumps(SCENARIO))
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "python.json").write_text(
+        json.dumps({**SCENARIO, "slug": "python-basics", "title": "Python"})
+    )
+    (tmp_path / "broken.json").write_text(json.dumps({"title": "No chapters"}))
+    return tmp_path
+
+
+def test_tarballs_are_read_like_directories(bundle, tmp_path_factory):
+    tarball = tmp_path_factory.mktemp("tar") / "scenarios.tar.gz"
+    with tarfile.open(tarball, "w:gz") as tar:
+        tar.add(bundle, arcname="scenarios")
+        tar.addfile(tarfile.TarInfo("README"), io.BytesIO(b""))
+
+    assert [name for name, _ in read_bundle(bundle)] == [
+        "broken.json",
+        "nested/python.json",
+        "sql.json",
+    ]
+    assert [content for _, content in read_bundle(tarball)] == [
+        content for _, content in read_bundle(bundle)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers", [1, 2])
+async def test_import_is_idempotent(session, bundle, workers, monkeypatch):
+    # Parse in worker processes whatever the size
+    monkeypatch.setattr(importer, "PARALLEL_MIN_BYTES", 0)
+    report = await import_scenarios(session, bundle, workers)
+    assert report.created == ["python-basics", "sql"]
+    assert report.invalid == ["broken.json"]
+
+    report = await import_scenarios(session, bundle, workers)
+    assert report.created == report.updated == []
+    assert report.skipped == ["python-basics", "sql"]
+
+    assert len((await session.exec(select(Scenario))).all()) == 2
@@ -0,0 +1,118 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from brobot.models import Scenario, ScenarioChapter, TrainingSession
+from brobot.services.scenarios import ScenarioService
+from brobot.services.session import SessionService
+
+MESSAGES = 1_000_000
+SESSIONS = 100
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def seeded():
+    """
+    A database holding a million messages spread over a hundred sessions.
+    """
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        for i in range(SESSIONS):
+            scenario = Scenario(title=f"S{i}", description="Desc", slug=f"s-{i}")
+            session.add(scenario)
+            await session.flush()
+            session.add_all(
+                ScenarioChapter(
+                    title=f"C{order}", order=order, content="", scenario_id=scenario.id
+                )
+                for order in (3, 1, 2)
+            )
+            session.add(TrainingSession(user_id=i % 10, scenario_id=scenario.id))
+        await session.flush()
+        await session.exec(
+            text(
+                f"""
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {MESSAGES})
+                INSERT INTO session_message (session_id, role, content, created_at)
+                SELECT i % {SESSIONS} + 1, 'user', 'message', CURRENT_TIMESTAMP FROM n
+                """
+            )
+        )
+        await session.exec(text("ANALYZE"))
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+@pytest.fixture
+def recorder(seeded):
+    """
+    The SELECT statements emitted while the test runs, with their parameters.
+    """
+    recorded = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            recorded.append((statement, parameters))
+
+    engine = seeded.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield recorded
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def explain(session: AsyncSession, recorded) -> list[str]:
+    connection = await session.connection()
+    details = []
+    for statement, parameters in recorded:
+        rows = await connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )
+        details += [row[-1] for row in rows]
+    return details
+
+
+def assert_no_scan(details: list[str], table: str):
+    scans = [detail for detail in details if detail.startswith(f"SCAN {table}")]
+    assert not scans, details
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_message_lookups_use_the_session_index(seeded, recorder):
+    service = SessionService(seeded)
+    messages = await service.messages_after(7, after_id=500_000, limit=50)
+    complete = await service.get_complete_session(7)
+    recorded = list(recorder)
+
+    assert len(messages) == 50
+    assert [m.id for m in complete.messages] == sorted(m.id for m in complete.messages)
+    details = await explain(seeded, recorded)
+    assert_no_scan(details, "session_message")
+    # Rows come in id order from the index, without sorting
+    assert not any("TEMP B-TREE" in detail for detail in details), details
+    assert any("ix_session_message_session_id_id" in detail for detail in details)
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_chapter_and_session_lookups_use_their_index(seeded, recorder):
+    session = await SessionService(seeded).get_complete_session(3)
+    sessions = await SessionService(seeded).users_sessions(3, limit=5, after=0)
+    scenarios = await ScenarioService(seeded).get_all(limit=10)
+    recorded = [
+        (statement, parameters)
+        for statement, parameters in recorder
+        if "session_message" not in statement
+    ]
+
+    assert [c.order for c in session.scenario.chapters] == [1, 2, 3]
+    assert len(sessions) == 5
+    assert all([c.order for c in s.chapters] == [1, 2, 3] for s in scenarios)
+    details = await explain(seeded, recorded)
+    assert_no_scan(details, "scenario_chapter")
+    assert_no_scan(details, "training_session")
+    assert any("ix_scenario_chapter_scenario_id_order" in d for d in details)
@@ -1,39 +1,51 @@
 import pytest
-from sqlmodel import create_engine, SQLModel, Session, select
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from brobot.services.scenarios import ScenarioService
-from brobot.models import Scenario, ScenarioChapter
+from brobot.models import (
+    ChapterCompletion,
+    Scenario,
+    ScenarioChapter,
+    TrainingSession,
+)
 from brobot.dto import CreateScenarioDTO, CreateScenarioChapterDTO
 
 
-@pytest.fixture
-def session():
-    engine = create_engine("sqlite:///:memory:")
-    SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
+    await engine.dispose()
 
 
-def test_get_returns_none_if_not_found(session):
+@pytest.mark.asyncio
+async def test_get_returns_none_if_not_found(session):
     service = ScenarioService(session)
-    assert service.get(1) is None
+    assert await service.get(1) is None
 
 
-def test_get_returns_scenario_with_chapters(session):
+@pytest.mark.asyncio
+async def test_get_returns_scenario_with_chapters(session):
     scenario = Scenario(title="Test", description="Desc", slug="test")
     chapter1 = ScenarioChapter(title="C1", content="Content 1", order=1, scenario_id=1)
     chapter2 = ScenarioChapter(title="C2", content="Content 2", order=2, scenario_id=1)
 
     session.add(scenario)
-    session.flush()
+    await session.flush()
 
     chapter1.scenario_id = scenario.id
     chapter2.scenario_id = scenario.id
     session.add_all([chapter1, chapter2])
-    session.commit()
+    await session.commit()
 
     service = ScenarioService(session)
-    result = service.get(scenario.id)
+    result = await service.get(scenario.id)
 
     assert result is not None
     assert result.title == "Test"
@@ -41,49 +53,52 @@ def test_get_returns_scenario_with_chapters(session):
     assert result.chapters[0].title == "C1"
 
 
-def test_get_all_returns_all_scenarios(session):
+@pytest.mark.asyncio
+async def test_get_all_returns_all_scenarios(session):
     s1 = Scenario(title="S1", description="D1", slug="s1")
     s2 = Scenario(title="S2", description="D2", slug="s2")
     session.add_all([s1, s2])
-    session.commit()
+    await session.commit()
 
     service = ScenarioService(session)
-    result = service.get_all()
+    result = await service.get_all()
 
     assert len(result) == 2
     assert result[0].title == "S1"
     assert result[1].title == "S2"
 
 
-def test_delete_removes_scenario_and_chapters(session):
+@pytest.mark.asyncio
+async def test_delete_removes_scenario_and_chapters(session):
     scenario = Scenario(title="S", description="D", slug="s")
     session.add(scenario)
-    session.flush()
+    await session.flush()
 
     c = ScenarioChapter(
         title="C", order=1, content="Content 1", scenario_id=scenario.id
     )
     session.add(c)
-    session.commit()
+    await session.commit()
 
     service = ScenarioService(session)
-    deleted = service.delete(scenario.id)
+    deleted = await service.delete(scenario.id)
 
     assert deleted is True
-    assert session.get(Scenario, scenario.id) is None
+    assert await session.get(Scenario, scenario.id) is None
 
     assert (
-        session.exec(select(ScenarioChapter).filter_by(scenario_id=scenario.id)).all()
-        == []
-    )
+        await session.exec(select(ScenarioChapter).filter_by(scenario_id=scenario.id))
+    ).all() == []
 
 
-def test_delete_returns_false_if_not_found(session):
+@pytest.mark.asyncio
+async def test_delete_returns_false_if_not_found(session):
     service = ScenarioService(session)
-    assert service.delete(1234) is False
+    assert await service.delete(1234) is False
 
 
-def test_create_scenario(session: Session):
+@pytest.mark.asyncio
+async def test_create_scenario(session: AsyncSession):
     """
     Test the creation of a Scenario.
     """
@@ -103,7 +118,7 @@ def test_create_scenario(session: Session):
     )
 
     service = ScenarioService(session)
-    scenario = service.create(scenario_creation)
+    scenario = await service.create(scenario_creation)
 
     assert scenario is not None
     assert scenario.title == "Test Scenario"
@@ -113,3 +128,133 @@ def test_create_scenario(session: Session):
     assert scenario.chapters[1].title == "Chapter 2"
     assert scenario.chapters[0].order == 1
     assert scenario.chapters[1].order == 2
+
+
+def scenario_dto(slug: str, *chapters: str, title: str = "Title") -> CreateScenarioDTO:
+    return CreateScenarioDTO(
+        slug=slug,
+        title=title,
+        description="Description",
+        chapters=[
+            CreateScenarioChapterDTO(
+                title=f"Chapter {order}", content=content, order=order
+            )
+            for order, content in enumerate(chapters, start=1)
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_creates_updates_and_skips_by_slug(session):
+    service = ScenarioService(session)
+    report = await service.bulk_upsert(
+        [scenario_dto("sql", "select", "join"), scenario_dto("python", "loops")]
+    )
+    assert report.created == ["sql", "python"]
+
+    sql = (await session.exec(select(Scenario).where(Scenario.slug == "sql"))).one()
+    chapters = (
+        await session.exec(
+            select(ScenarioChapter)
+            .where(ScenarioChapter.scenario_id == sql.id)
+            .order_by(ScenarioChapter.order)
+        )
+    ).all()
+    select_id, join_id = [chapter.id for chapter in chapters]
+    training_session = TrainingSession(
+        user_id=1,
+        scenario_id=sql.id,
+        current_chapter_id=select_id,
+        completed_chapters=1,
+    )
+    session.add(training_session)
+    await session.flush()
+    session.add(
+        ChapterCompletion(
+            session_id=training_session.id, chapter_id=join_id, message_id=1
+        )
+    )
+    await session.commit()
+    training_session_id = training_session.id
+
+    report = await service.bulk_upsert(
+        [
+            scenario_dto("sql", "select *", title="SQL"),
+            scenario_dto("python", "loops"),
+            scenario_dto("rust", "ownership"),
+        ]
+    )
+    assert report.model_dump() == {
+        "created": ["rust"],
+        "updated": ["sql"],
+        "skipped": ["python"],
+        "invalid": [],
+    }
+
+    session.expire_all()
+    sql = (await session.exec(select(Scenario).where(Scenario.slug == "sql"))).one()
+    chapters = (
+        await session.exec(
+            select(ScenarioChapter).where(ScenarioChapter.scenario_id == sql.id)
+        )
+    ).all()
+    assert sql.title == "SQL"
+    # The first chapter is updated in place, the second one removed
+    assert [(c.id, c.content) for c in chapters] == [(select_id, "select *")]
+    assert (await session.exec(select(ChapterCompletion))).all() == []
+    # The progress of the sessions is resolved again
+    training_session = await session.get(TrainingSession, training_session_id)
+    assert training_session.current_chapter_id is None
+    assert training_session.completed_chapters == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_refuses_duplicate_slugs(session):
+    service = ScenarioService(session)
+    with pytest.raises(ValueError):
+        await service.bulk_upsert([scenario_dto("sql", "a"), scenario_dto("sql", "b")])
+    assert (await session.exec(select(Scenario))).all() == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_keeps_unchanged_chapters_by_content_hash(session):
+    service = ScenarioService(session)
+    await service.bulk_upsert([scenario_dto("sql", "select", "join")])
+
+    async def chapters():
+        session.expire_all()
+        return {
+            chapter.content: (chapter.id, chapter.order, chapter.content_hash)
+            for chapter in (await session.exec(select(ScenarioChapter))).all()
+        }
+
+    before = await chapters()
+
+    # A chapter inserted in front moves the others, without changing them
+    dto = scenario_dto("sql", "intro", "select", "join")
+    for chapter, title in zip(dto.chapters[1:], ["Chapter 1", "Chapter 2"]):
+        chapter.title = title
+    report = await service.bulk_upsert([dto])
+    assert report.updated == ["sql"]
+
+    after = await chapters()
+    assert after["select"] == (before["select"][0], 2, before["select"][2])
+    assert after["join"] == (before["join"][0], 3, before["join"][2])
+    assert after["intro"][0] not in {id_ for id_, _, _ in before.values()}
+
+    scenario = (await session.exec(select(Scenario))).one()
+    assert scenario.version == 2
+
+
+@pytest.mark.asyncio
+async def test_get_all_pages_by_id(session):
+    service = ScenarioService(session)
+    await service.bulk_upsert([scenario_dto(f"s{i}", "content") for i in range(5)])
+
+    first = await service.get_all(limit=2)
+    second = await service.get_all(limit=2, after=first[-1].id)
+    last = await service.get_all(limit=2, after=second[-1].id)
+
+    ids = [scenario.id for scenario in first + second + last]
+    assert ids == sorted(ids) and len(set(ids)) == 5
+    assert len(last) == 1
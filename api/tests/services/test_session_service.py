@@ -1,7 +1,16 @@
+import httpx
 import pytest
+import pytest_asyncio
+from openai import RateLimitError
 
-from sqlmodel import create_engine, SQLModel, Session, select
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from brobot.bot.agents import agent_cache, build_instructions
+from brobot.bot.memory import ConversationMemory
+from brobot.bot.scheduler import CompletionScheduler
 from brobot.services.session import SessionService
 from brobot.models import (
     TrainingSession,
@@ -15,12 +24,14 @@ from brobot.dto import TrainingSessionDTO
 from brobot.dto import SessionMessageDTO
 
 
-@pytest.fixture
-def session():
-    engine = create_engine("sqlite:///:memory:")
-    SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
+    await engine.dispose()
 
 
 @pytest.mark.asyncio
@@ -29,11 +40,11 @@ async def test_get_returns_training_session(session):
         title="Test Scenario", description="Description", slug="test-scenario"
     )
     session.add(scenario)
-    session.flush()
+    await session.flush()
 
     training_session = TrainingSession(user_id=1, scenario_id=scenario.id)
     session.add(training_session)
-    session.commit()
+    await session.commit()
 
     service = SessionService(session)
     result = await service.get(training_session.id)
@@ -59,11 +70,11 @@ async def test_users_sessions_returns_training_session(session):
         title="Test Scenario", description="Description", slug="test-scenario"
     )
     session.add(scenario)
-    session.flush()
+    await session.flush()
 
     training_session = TrainingSession(user_id=1, scenario_id=scenario.id)
     session.add(training_session)
-    session.commit()
+    await session.commit()
 
     service = SessionService(session)
     result = await service.users_sessions(1)
@@ -80,7 +91,7 @@ async def test_get_or_create_creates_new_training_session(session):
         title="Test Scenario", description="Description", slug="test-scenario"
     )
     session.add(scenario)
-    session.commit()
+    await session.commit()
 
     service = SessionService(session)
     result = await service.get_or_create(user_id=1, scenario_id=scenario.id)
@@ -90,8 +101,8 @@ async def test_get_or_create_creates_new_training_session(session):
     assert result.scenario.title == "Test Scenario"
 
     # Verify the session was created in the database
-    db_session = session.exec(
-        select(TrainingSession).where(TrainingSession.user_id == 1)
+    db_session = (
+        await session.exec(select(TrainingSession).where(TrainingSession.user_id == 1))
     ).first()
     assert db_session is not None
     assert db_session.scenario_id == scenario.id
@@ -101,19 +112,19 @@ async def test_get_or_create_creates_new_training_session(session):
 async def test_delete_session_with_messages_and_completion(session):
     user = User(email="test@example.com", hashed_password="hashed_password")
     session.add(user)
-    session.commit()
+    await session.commit()
 
     # Create a scenario
     scenario = Scenario(
         title="Test Scenario", slug="test-scenario", description="Description"
     )
     session.add(scenario)
-    session.flush()
+    await session.flush()
 
     # Create a training session
     training_session = TrainingSession(user_id=user.id, scenario_id=scenario.id)
     session.add(training_session)
-    session.flush()
+    await session.flush()
 
     # Add messages to the training session
     message1 = SessionMessage(
@@ -123,7 +134,7 @@ async def test_delete_session_with_messages_and_completion(session):
         content="Message 2", role="assistant", session_id=training_session.id
     )
     session.add_all([message1, message2])
-    session.commit()
+    await session.commit()
 
     # Add a chapter completion
     chapter_completion = ChapterCompletion(
@@ -132,11 +143,15 @@ async def test_delete_session_with_messages_and_completion(session):
         message_id=message1.id,
     )
     session.add(chapter_completion)
-    session.commit()
+    await session.commit()
 
     # Verify messages exist in the database
-    messages = session.exec(
-        select(SessionMessage).where(SessionMessage.session_id == training_session.id)
+    messages = (
+        await session.exec(
+            select(SessionMessage).where(
+                SessionMessage.session_id == training_session.id
+            )
+        )
     ).all()
     assert len(messages) == 2
 
@@ -146,13 +161,19 @@ async def test_delete_session_with_messages_and_completion(session):
 
     # Verify the session and its messages are deleted
     assert result is True
-    deleted_session = session.exec(
-        select(TrainingSession).where(TrainingSession.id == training_session.id)
+    deleted_session = (
+        await session.exec(
+            select(TrainingSession).where(TrainingSession.id == training_session.id)
+        )
     ).first()
     assert deleted_session is None
 
-    remaining_messages = session.exec(
-        select(SessionMessage).where(SessionMessage.session_id == training_session.id)
+    remaining_messages = (
+        await session.exec(
+            select(SessionMessage).where(
+                SessionMessage.session_id == training_session.id
+            )
+        )
     ).all()
     assert len(remaining_messages) == 0
 
@@ -162,12 +183,12 @@ async def test_get_complete_session_returns_model(session):
     # Prepare a scenario and a training session
     scenario = Scenario(title="Test Scenario", description="Desc", slug="test-scenario")
     session.add(scenario)
-    session.commit()
-    session.refresh(scenario)
+    await session.commit()
+    await session.refresh(scenario)
 
     training_session = TrainingSession(user_id=1, scenario_id=scenario.id)
     session.add(training_session)
-    session.commit()
+    await session.commit()
 
     service = SessionService(session)
     result = await service.get_complete_session(training_session.id)
@@ -189,20 +210,20 @@ async def test_generate_answer_persists_and_returns_message(session, monkeypatch
     # Prepare scenario and chapter
     scenario = Scenario(title="Test Scenario", description="Desc", slug="test-scenario")
     session.add(scenario)
-    session.commit()
-    session.refresh(scenario)
+    await session.commit()
+    await session.refresh(scenario)
 
     chapter = ScenarioChapter(
         title="Chapter 1", order=1, scenario_id=scenario.id, content="Content"
     )
     session.add(chapter)
-    session.commit()
+    await session.commit()
 
     # Create a training session
     training_session = TrainingSession(user_id=1, scenario_id=scenario.id)
     session.add(training_session)
-    session.commit()
-    session.refresh(training_session)
+    await session.commit()
+    await session.refresh(training_session)
 
     # Stub the generate_answer function in the service module
     async def fake_generate_answer(scenario, current_chapter, messages, context):
@@ -217,7 +238,460 @@ async def test_generate_answer_persists_and_returns_message(session, monkeypatch
     assert result.content == "Fake answer"
 
     # Verify the message was persisted in the database
-    db_messages = session.exec(
-        select(SessionMessage).where(SessionMessage.session_id == training_session.id)
+    db_messages = (
+        await session.exec(
+            select(SessionMessage).where(
+                SessionMessage.session_id == training_session.id
+            )
+        )
     ).all()
     assert any(m.content == "Fake answer" for m in db_messages)
+
+
+@pytest.fixture
+def statements(session):
+    """
+    Record the SQL statements emitted through the session engine.
+    """
+    recorded = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        recorded.append(statement)
+
+    engine = session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield recorded
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def _seed_sessions(session, count: int, messages_per_session: int = 3):
+    chapters = []
+    scenario_ids = []
+    for i in range(count):
+        scenario = Scenario(title=f"S{i}", description="Desc", slug=f"s-{i}")
+        session.add(scenario)
+        await session.flush()
+        scenario_ids.append(scenario.id)
+        for order in range(1, 4):
+            chapter = ScenarioChapter(
+                title=f"C{order}",
+                order=order,
+                scenario_id=scenario.id,
+                content="Content",
+            )
+            session.add(chapter)
+            chapters.append(chapter)
+    await session.flush()
+
+    training_sessions = []
+    for scenario_id in scenario_ids:
+        training_session = TrainingSession(user_id=1, scenario_id=scenario_id)
+        session.add(training_session)
+        await session.flush()
+        training_sessions.append(training_session)
+
+        messages = [
+            SessionMessage(
+                content=f"Message {m}", role="user", session_id=training_session.id
+            )
+            for m in range(messages_per_session)
+        ]
+        session.add_all(messages)
+        await session.flush()
+
+        chapter = next(c for c in chapters if c.scenario_id == scenario_id)
+        session.add(
+            ChapterCompletion(
+                chapter_id=chapter.id,
+                session_id=training_session.id,
+                message_id=messages[0].id,
+            )
+        )
+    await session.commit()
+    session.expunge_all()
+    return training_sessions
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("count", [1, 10])
+async def test_users_sessions_query_count_is_constant(session, statements, count):
+    await _seed_sessions(session, count)
+    statements.clear()
+
+    service = SessionService(session)
+    result = await service.users_sessions(1)
+
+    assert len(result) == count
+    assert all(len(dto.scenario.chapters) == 3 for dto in result)
+    assert all(dto.message_count == 3 for dto in result)
+    assert all(len(dto.completions) == 1 for dto in result)
+    # The messages are counted, not loaded: the page does not grow with them
+    assert all("messages" not in dto.model_dump() for dto in result)
+    # sessions joined with scenarios, chapters, completions, message counts
+    assert len(statements) == 4
+    assert not [s for s in statements if "session_message.content" in s]
+
+
+@pytest.mark.asyncio
+async def test_get_and_get_complete_session_query_count(session, statements):
+    [training_session] = await _seed_sessions(session, 1)
+    service = SessionService(session)
+
+    statements.clear()
+    dto = await service.get(training_session.id)
+    assert dto.message_count == 3
+    assert len(statements) == 4
+
+    statements.clear()
+    complete = await service.get_complete_session(training_session.id)
+    assert len(complete.scenario.chapters) == 3
+    assert len(statements) == 4
+
+
+@pytest.mark.asyncio
+async def test_messages_after_returns_only_the_delta(session):
+    [training_session] = await _seed_sessions(session, 1, messages_per_session=4)
+    service = SessionService(session)
+
+    messages = await service.messages_after(training_session.id)
+    assert [m.content for m in messages] == [f"Message {m}" for m in range(4)]
+
+    delta = await service.messages_after(training_session.id, messages[1].id)
+    assert [m.id for m in delta] == [m.id for m in messages[2:]]
+
+
+@pytest.mark.asyncio
+async def test_generate_answer_query_count_does_not_grow(
+    session, statements, monkeypatch
+):
+    async def fake_generate_answer(scenario, current_chapter, messages, context):
+        return "Fake answer"
+
+    monkeypatch.setattr("brobot.services.session.generate_answer", fake_generate_answer)
+
+    short, long = await _seed_sessions(session, 2)
+    session.add_all(
+        [
+            SessionMessage(content="More", role="user", session_id=long.id)
+            for _ in range(20)
+        ]
+    )
+    await session.commit()
+    memory = ConversationMemory(
+        window_turns=50, max_tokens=10000, summary_batch=50, summary_max_tokens=100
+    )
+    service = SessionService(session, memory)
+
+    statements.clear()
+    await service.generate_answer(short.id)
+    short_count = len(statements)
+
+    statements.clear()
+    await service.generate_answer(long.id)
+
+    assert len(statements) == short_count
+
+
+class RecordingConnectionManager:
+    def __init__(self):
+        self.json = []
+        self.text = []
+
+    async def send_json(self, session_id, data):
+        self.json.append((session_id, data))
+
+    async def send_text(self, session_id, message):
+        self.text.append((session_id, message))
+
+
+@pytest.mark.asyncio
+async def test_generate_answer_streams_deltas_and_persists_once(session, monkeypatch):
+    [training_session] = await _seed_sessions(session, 1)
+
+    async def fake_stream_answer(
+        scenario, current_chapter, messages, context, on_delta
+    ):
+        for delta in ("Fake ", "streamed ", "answer"):
+            await on_delta(delta)
+        context.part_completed = True
+        return "Fake streamed answer"
+
+    monkeypatch.setattr("brobot.services.session.stream_answer", fake_stream_answer)
+
+    cm = RecordingConnectionManager()
+    service = SessionService(session)
+    result = await service.generate_answer(training_session.id, cm)
+
+    assert result.content == "Fake streamed answer"
+    deltas = [data["content"] for _, data in cm.json if data["type"] == "delta"]
+    assert deltas == ["Fake ", "streamed ", "answer"]
+    assert any(data["type"] == "chapter_completed" for _, data in cm.json)
+    assert cm.json[-1] == (training_session.id, {"type": "typing", "status": "stop"})
+    assert cm.text == [(training_session.id, result.model_dump_json())]
+
+    db_messages = (
+        await session.exec(
+            select(SessionMessage).where(
+                SessionMessage.session_id == training_session.id,
+                SessionMessage.role == "assistant",
+            )
+        )
+    ).all()
+    assert [m.content for m in db_messages] == ["Fake streamed answer"]
+
+    completions = (
+        await session.exec(
+            select(ChapterCompletion).where(
+                ChapterCompletion.session_id == training_session.id
+            )
+        )
+    ).all()
+    assert len(completions) == 2
+
+
+@pytest.mark.asyncio
+async def test_generate_answer_persists_rolling_summary(session, monkeypatch):
+    [training_session] = await _seed_sessions(session, 1, messages_per_session=12)
+    prompts = []
+
+    async def fake_generate_answer(scenario, current_chapter, messages, context):
+        prompts.append(messages)
+        return "Fake answer"
+
+    async def fake_summarizer(summary, messages, max_tokens):
+        return f"{summary or ''}+{len(messages)}"
+
+    monkeypatch.setattr("brobot.services.session.generate_answer", fake_generate_answer)
+
+    memory = ConversationMemory(
+        window_turns=2,
+        max_tokens=1000,
+        summary_batch=4,
+        summary_max_tokens=100,
+        summarizer=fake_summarizer,
+    )
+    service = SessionService(session, memory)
+    await service.generate_answer(training_session.id)
+
+    stored = await service.get_complete_session(training_session.id)
+    assert stored.summary == "+8"
+    assert prompts[0][0]["role"] == "system"
+    assert len(prompts[0]) == 5
+
+    # The next turn reuses the persisted summary without summarizing again
+    await service.generate_answer(training_session.id)
+    stored = await service.get_complete_session(training_session.id)
+    assert stored.summary == "+8"
+    assert len(prompts[1]) == 6
+
+
+@pytest.mark.asyncio
+async def test_generate_answer_grades_the_submitted_query(session, monkeypatch):
+    scenario = Scenario(title="SQL", description="Desc", slug="sql")
+    session.add(scenario)
+    await session.commit()
+    await session.refresh(scenario)
+    chapter = ScenarioChapter(
+        title="Select",
+        order=1,
+        scenario_id=scenario.id,
+        content="<data>\nid | name\n---------\n1 | Alice\n</data>",
+        meta={"reference_query": "SELECT name FROM data"},
+    )
+    training_session = TrainingSession(user_id=1, scenario_id=scenario.id)
+    session.add_all([chapter, training_session])
+    await session.commit()
+    await session.refresh(training_session)
+    session.add(
+        SessionMessage(
+            session_id=training_session.id,
+            role="user",
+            content="```sql\nselect name from data\n```",
+        )
+    )
+    await session.commit()
+
+    received = []
+
+    async def fake_generate_answer(scenario, current_chapter, messages, context):
+        received.extend(messages)
+        return "Well done"
+
+    monkeypatch.setattr("brobot.services.session.generate_answer", fake_generate_answer)
+
+    await SessionService(session).generate_answer(training_session.id)
+
+    assert received[-1]["role"] == "system"
+    assert "correct: the result matches" in received[-1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_sessions_and_messages_are_paged_by_id(session):
+    scenarios = [
+        Scenario(title=f"S{i}", description="Desc", slug=f"s{i}") for i in range(3)
+    ]
+    session.add_all(scenarios)
+    await session.commit()
+    sessions = [TrainingSession(user_id=1, scenario_id=s.id) for s in scenarios]
+    session.add_all(sessions)
+    await session.commit()
+    session.add_all(
+        SessionMessage(session_id=sessions[0].id, content=f"m{i}", role="user")
+        for i in range(5)
+    )
+    await session.commit()
+    service = SessionService(session)
+
+    first = await service.users_sessions(1, limit=2)
+    rest = await service.users_sessions(1, limit=2, after=first[-1].id)
+    assert [s.id for s in first + rest] == [s.id for s in sessions]
+
+    page = await service.messages_after(sessions[0].id, limit=2)
+    assert [m.content for m in page] == ["m0", "m1"]
+    page = await service.messages_after(sessions[0].id, page[-1].id, limit=2)
+    assert [m.content for m in page] == ["m2", "m3"]
+
+
+@pytest.mark.asyncio
+async def test_completing_a_chapter_moves_the_progress_pointer(
+    session, statements, monkeypatch
+):
+    async def fake_generate_answer(scenario, current_chapter, messages, context):
+        context.part_completed = True
+        return f"Done with {current_chapter.title}"
+
+    monkeypatch.setattr("brobot.services.session.generate_answer", fake_generate_answer)
+
+    # C1 is already completed
+    [training_session] = await _seed_sessions(session, 1)
+    service = SessionService(session)
+
+    answer = await service.generate_answer(training_session.id)
+    assert answer.content == "Done with C2"
+    dto = await service.get(training_session.id)
+    assert dto.completed_chapters == 1
+    c3 = next(c for c in dto.scenario.chapters if c.title == "C3")
+    assert dto.current_chapter_id == c3.id
+
+    # The current chapter is fetched by its id, not looked up in the completions
+    statements.clear()
+    answer = await service.generate_answer(training_session.id)
+    assert answer.content == "Done with C3"
+    lookups = [s for s in statements if "FROM scenario_chapter" in s]
+    assert len(lookups) == 2  # current chapter, then the next one: none left
+    dto = await service.get(training_session.id)
+    assert dto.current_chapter_id is None
+    assert dto.completed_chapters == 2
+
+
+@pytest.mark.asyncio
+async def test_warm_turn_issues_no_scenario_queries(session, statements, monkeypatch):
+    async def fake_generate_answer(scenario, current_chapter, messages, context):
+        return f"About {scenario.title}, {current_chapter.title}"
+
+    monkeypatch.setattr("brobot.services.session.generate_answer", fake_generate_answer)
+
+    [training_session] = await _seed_sessions(session, 1)
+    service = SessionService(session)
+    await service.generate_answer(training_session.id)
+
+    statements.clear()
+    answer = await service.generate_answer(training_session.id)
+
+    assert answer.content == "About S0, C2"
+    assert not [s for s in statements if "FROM scenario" in s]
+
+
+@pytest.mark.asyncio
+async def test_warm_turn_does_not_format_the_instructions(session, monkeypatch):
+    async def fake_generate_answer(scenario, current_chapter, messages, context):
+        return "Fake answer"
+
+    monkeypatch.setattr("brobot.services.session.generate_answer", fake_generate_answer)
+    formatted = []
+
+    def recording_build_instructions(scenario, chapter):
+        formatted.append(chapter.id)
+        return build_instructions(scenario, chapter)
+
+    monkeypatch.setattr(
+        "brobot.bot.agents.build_instructions", recording_build_instructions
+    )
+    agent_cache.clear()
+
+    [training_session] = await _seed_sessions(session, 1)
+    service = SessionService(session)
+    await service.generate_answer(training_session.id)
+    assert len(formatted) == 1
+
+    await service.generate_answer(training_session.id)
+    assert len(formatted) == 1
+
+
+class RecordingScheduler:
+    def __init__(self):
+        self.runs = []
+
+    async def run(self, key, completion, estimated_tokens=0, **kwargs):
+        self.runs.append((key, estimated_tokens))
+        return await completion()
+
+
+@pytest.mark.asyncio
+async def test_summary_completions_go_through_the_scheduler(session, monkeypatch):
+    [training_session] = await _seed_sessions(session, 1, messages_per_session=12)
+
+    async def fake_generate_answer(scenario, current_chapter, messages, context):
+        return "Fake answer"
+
+    async def fake_summarizer(summary, messages, max_tokens):
+        return "summary"
+
+    monkeypatch.setattr("brobot.services.session.generate_answer", fake_generate_answer)
+    memory = ConversationMemory(
+        window_turns=2,
+        max_tokens=1000,
+        summary_batch=4,
+        summary_max_tokens=100,
+        summarizer=fake_summarizer,
+    )
+    scheduler = RecordingScheduler()
+    service = SessionService(session, memory, scheduler)
+    await service.generate_answer(training_session.id)
+
+    # The summary, then the answer, both under the session key
+    assert [key for key, _ in scheduler.runs] == [training_session.id] * 2
+    assert scheduler.runs[0][1] > 100
+
+
+@pytest.mark.asyncio
+async def test_streamed_answer_is_not_retried_on_rate_limit(session, monkeypatch):
+    [training_session] = await _seed_sessions(session, 1)
+    attempts = 0
+
+    async def fake_stream_answer(
+        scenario, current_chapter, messages, context, on_delta
+    ):
+        nonlocal attempts
+        attempts += 1
+        await on_delta("Fake ")
+        request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+        raise RateLimitError(
+            "rate limited", response=httpx.Response(429, request=request), body=None
+        )
+
+    monkeypatch.setattr("brobot.services.session.stream_answer", fake_stream_answer)
+
+    cm = RecordingConnectionManager()
+    scheduler = CompletionScheduler(
+        max_concurrency=1, max_retries=3, retry_base_delay=0.001
+    )
+    service = SessionService(session, scheduler=scheduler)
+    with pytest.raises(RateLimitError):
+        await service.generate_answer(training_session.id, cm)
+
+    # The client draft did not get the same deltas twice
+    assert attempts == 1
+    assert [data for _, data in cm.json if data["type"] == "delta"] == [
+        {"type": "delta", "content": "Fake "}
+    ]
@@ -0,0 +1,28 @@
+import datetime
+import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from brobot.dto import SessionMessageDTO
+from brobot.serialization import (
+    FastJSONResponse,
+    OrjsonSerializer,
+    StdlibSerializer,
+)
+
+
+def test_serializers_agree():
+    message = SessionMessageDTO(
+        id=1,
+        role="assistant",
+        content='Héllo "world"\n',
+        created_at=datetime.datetime(2025, 1, 2, 3, 4, 5),
+    )
+    value = jsonable_encoder({"type": "message", "messages": [message] * 3})
+
+    for serializer in (StdlibSerializer(), OrjsonSerializer()):
+        assert json.loads(serializer.dumps(value)) == value
+        assert json.loads(serializer.dumpb(value)) == value
+    assert StdlibSerializer().dumpb(value) == JSONResponse(value).body
+    assert json.loads(FastJSONResponse(value).body) == value
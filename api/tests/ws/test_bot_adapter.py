@@ -27,7 +27,9 @@ class DummySessionService:
         self.added.append((session_id, content, role))
         return DummyMsg(content, role)
 
-    async def generate_answer(self, session_id, connection_manager=None):
+    async def generate_answer(
+        self, session_id, connection_manager=None, on_delta=None, on_queued=None
+    ):
         if not self._session:
             raise Exception("Session not found")
 
@@ -40,6 +42,10 @@ class DummySessionService:
         ):
             raise Exception("No chapters found")
 
+        if on_delta:
+            for delta in ("bot_", "answer"):
+                await on_delta(delta)
+
         return await self.add_message(
             session_id=session_id, role="assistant", content="bot_answer"
         )
@@ -57,7 +63,11 @@ async def test_answer_user_message_success(monkeypatch):
     cm = ConnectionManager()
     sent_json = []
     sent_text = []
-    cm.send_json = lambda sid, data: sent_json.append((sid, data))
+
+    async def send_json(sid, data):
+        sent_json.append((sid, data))
+
+    cm.send_json = send_json
     cm.send_text = lambda sid, msg: sent_text.append((sid, msg))
 
     adapter = BotAdapter(session_id=123, session_service=service, connection_manager=cm)
@@ -67,7 +77,12 @@ async def test_answer_user_message_success(monkeypatch):
     # add_message doit avoir été appelé avec le résultat de generate_answer
     assert service.added == [(123, "bot_answer", "assistant")]
 
-    assert sent_json == [(123, {"type": "typing", "status": "stop"})]
+    # les deltas sont relayés avant le message final
+    assert sent_json == [
+        (123, {"type": "delta", "content": "bot_"}),
+        (123, {"type": "delta", "content": "answer"}),
+        (123, {"type": "typing", "status": "stop"}),
+    ]
 
     expected = json.dumps({"content": "bot_answer", "role": "assistant"})
     assert sent_text == [(123, expected)]
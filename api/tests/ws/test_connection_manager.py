@@ -1,9 +1,29 @@
+import asyncio
+import json
+
 import pytest
+import pytest_asyncio
 from collections import deque
 from starlette.websockets import WebSocketDisconnect
+from brobot.serialization import StdlibSerializer
 from brobot.ws.manager import ConnectionManager
 
 
+@pytest_asyncio.fixture
+async def make_manager():
+    managers = []
+
+    def make(**kwargs) -> ConnectionManager:
+        manager = ConnectionManager(**kwargs)
+        managers.append(manager)
+        return manager
+
+    yield make
+    # Stops the writer and heartbeat tasks of the sockets left open
+    for manager in managers:
+        await manager.close()
+
+
 class DummyWebSocket:
     def __init__(self):
         self.accepted = False
@@ -14,6 +34,9 @@ class DummyWebSocket:
     async def accept(self):
         self.accepted = True
 
+    async def close(self):
+        self.closed = True
+
     async def send_text(self, message: str):
         if message == "force_error":
             raise Exception("forced send error")
@@ -35,33 +58,87 @@ class DummyWebSocketReceive(DummyWebSocket):
 
 
 @pytest.mark.asyncio
-async def test_send_text_queues_when_disconnected():
-    cm = ConnectionManager()
+async def test_send_text_buffers_when_disconnected(make_manager):
+    cm = make_manager()
     # pas de connexion pour le session_id=1
     await cm.send_text(1, "hello")
-    # le message doit être en queue
-    assert list(cm.message_queues[1]) == ["hello"]
+    # le message est gardé pour une reprise
+    assert [frame for _, frame in cm.replay_buffers[1].frames] == ["hello"]
+
+
+@pytest.mark.asyncio
+async def test_frames_are_numbered(make_manager):
+    cm = make_manager()
+    ws = DummyWebSocket()
+    await cm.connect(3, ws)
+
+    await cm.send_json(3, {"type": "typing", "status": "start"})
+    await cm.send_json(3, {})
+    await cm.drain(3)
+
+    first, second = (json.loads(frame) for frame in ws.sent)
+    assert first["type"] == "typing"
+    assert second["seq"] == first["seq"] + 1
 
 
 @pytest.mark.asyncio
-async def test_connect_flushes_queued_messages():
-    cm = ConnectionManager()
-    # queue deux messages avant connect
+async def test_connect_without_resume_does_not_replay(make_manager):
+    cm = make_manager()
     await cm.send_text(42, "msg1")
-    await cm.send_text(42, "msg2")
 
+    ws = DummyWebSocket()
+    assert await cm.connect(42, ws) is False
+    assert ws.sent == []
+
+
+@pytest.mark.asyncio
+async def test_connect_replays_missed_frames(make_manager):
+    cm = make_manager()
     ws = DummyWebSocket()
     await cm.connect(42, ws)
+    await cm.send_json(42, {"n": 1})
+    await cm.drain(42)
+    last_seq = json.loads(ws.sent[-1])["seq"]
+    cm.disconnect(42, ws)
+
+    # envoyés pendant la déconnexion
+    await cm.send_json(42, {"n": 2})
+    await cm.send_json(42, {"n": 3})
 
-    # doit avoir accepté et vidé la file
-    assert ws.accepted is True
-    assert ws.sent == ["msg1", "msg2"]
-    assert 42 not in cm.message_queues or not cm.message_queues[42]
+    ws = DummyWebSocket()
+    assert await cm.connect(42, ws, resume_from=last_seq) is True
+    assert [json.loads(frame)["n"] for frame in ws.sent] == [2, 3]
 
 
 @pytest.mark.asyncio
-async def test_disconnect_removes_connection():
-    cm = ConnectionManager()
+async def test_connect_cannot_resume_evicted_frames(make_manager):
+    cm = make_manager(replay_size=2)
+    ws = DummyWebSocket()
+    await cm.connect(42, ws)
+    await cm.send_json(42, {"n": 1})
+    await cm.drain(42)
+    last_seq = json.loads(ws.sent[-1])["seq"]
+    cm.disconnect(42, ws)
+
+    for n in range(2, 5):
+        await cm.send_json(42, {"n": n})
+
+    ws = DummyWebSocket()
+    assert await cm.connect(42, ws, resume_from=last_seq) is False
+    assert ws.sent == []
+
+
+@pytest.mark.asyncio
+async def test_connect_cannot_resume_unknown_sequence(make_manager):
+    cm = make_manager()
+    ws = DummyWebSocket()
+    # numéro reçu d'un autre worker
+    assert await cm.connect(42, ws, resume_from=12) is False
+
+
+@pytest.mark.asyncio
+async def test_disconnect_removes_connection(make_manager):
+    cm = make_manager()
     ws = DummyWebSocket()
     await cm.connect(7, ws)
     assert 7 in cm.active_connections
@@ -71,21 +148,23 @@ async def test_disconnect_removes_connection():
 
 
 @pytest.mark.asyncio
-async def test_send_text_errors_are_queued(monkeypatch):
-    cm = ConnectionManager()
+async def test_send_text_errors_drop_connection(make_manager):
+    cm = make_manager()
     # crée et enregistre un faux websocket qui lève sur send_text
     ws = DummyWebSocket()
     cm.active_connections[5] = ws
 
     # on force une erreur interne
     await cm.send_text(5, "force_error")
-    # après exception, le message doit avoir été mis en queue
-    assert list(cm.message_queues[5]) == ["force_error"]
+    await cm.writers[5].drain()
+    # le client devra se reconnecter, le message reste disponible pour la reprise
+    assert 5 not in cm.active_connections
+    assert [frame for _, frame in cm.replay_buffers[5].frames] == ["force_error"]
 
 
 @pytest.mark.asyncio
-async def test_send_json_serializes_and_uses_send_text(monkeypatch):
-    cm = ConnectionManager()
+async def test_send_json_serializes_and_uses_send_text(monkeypatch, make_manager):
+    cm = make_manager()
     called = []
 
     async def fake_send_text(session_id, message):
@@ -93,12 +172,25 @@ async def test_send_json_serializes_and_uses_send_text(monkeypatch):
 
     cm.send_text = fake_send_text  # monkey-patch
     await cm.send_json(9, {"a": 1})
+    assert [(sid, json.loads(message)) for sid, message in called] == [(9, {"a": 1})]
+
+
+@pytest.mark.asyncio
+async def test_send_json_uses_the_given_serializer(make_manager):
+    cm = make_manager(json_serializer=StdlibSerializer())
+    called = []
+
+    async def fake_send_text(session_id, message):
+        called.append((session_id, message))
+
+    cm.send_text = fake_send_text
+    await cm.send_json(9, {"a": 1})
     assert called == [(9, '{"a": 1}')]
 
 
 @pytest.mark.asyncio
-async def test_handle_session_on_connect_and_on_receive(monkeypatch):
-    cm = ConnectionManager()
+async def test_handle_session_on_connect_and_on_receive(monkeypatch, make_manager):
+    cm = make_manager()
     # websocket qui renvoie 3 messages (dont un vide), puis déconnecte
     ws = DummyWebSocketReceive([" first ", "", "second"])
 
@@ -122,3 +214,109 @@ async def test_handle_session_on_connect_and_on_receive(monkeypatch):
     assert called_receive == [(100, "first"), (100, "second")]
     # après déconnexion, la connexion doit être supprimée
     assert 100 not in cm.active_connections
+
+
+class YieldingWebSocket(DummyWebSocket):
+    async def send_text(self, message: str):
+        # Gives the producer a chance to outrun the writer
+        await asyncio.sleep(0)
+        self.sent.append(message)
+
+
+@pytest.mark.asyncio
+async def test_history_longer_than_the_writer_queue_is_sent_whole(make_manager):
+    cm = make_manager(writer_queue_size=256)
+    ws = YieldingWebSocket()
+    await cm.connect(7, ws)
+
+    history = [json.dumps({"id": i}) for i in range(300)]
+    await cm.send_history(7, history)
+    await cm.drain(7)
+
+    assert ws.sent == history
+    assert 7 in cm.active_connections
+    assert cm.writer_metrics.slow_disconnects == 0
+
+
+class BlockedWebSocket(DummyWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def send_text(self, message: str):
+        await self.release.wait()
+        self.sent.append(message)
+
+
+async def _missed_frames(cm: ConnectionManager, session_id: int, count: int) -> int:
+    ws = DummyWebSocket()
+    await cm.connect(session_id, ws)
+    await cm.send_json(session_id, {"n": 0})
+    await cm.drain(session_id)
+    last_seq = json.loads(ws.sent[-1])["seq"]
+    cm.disconnect(session_id, ws)
+    for n in range(1, count + 1):
+        await cm.send_json(session_id, {"n": n})
+    return last_seq
+
+
+@pytest.mark.asyncio
+async def test_slow_replay_does_not_block_other_connections(make_manager):
+    cm = make_manager(writer_queue_size=16)
+    last_seq = await _missed_frames(cm, 1, 100)
+
+    slow = BlockedWebSocket()
+    replay = asyncio.create_task(cm.connect(1, slow, resume_from=last_seq))
+    await asyncio.sleep(0.01)
+    assert not replay.done()
+
+    # Neither the lock nor the replaying session is held by the slow client
+    await asyncio.wait_for(cm.connect(2, DummyWebSocket()), timeout=1)
+    await cm.send_json(1, {"n": 101})
+
+    slow.release.set()
+    assert await asyncio.wait_for(replay, timeout=1) is True
+    await cm.drain(1)
+    assert [json.loads(frame)["n"] for frame in slow.sent] == list(range(1, 102))
+    assert cm.writer_metrics.slow_disconnects == 0
+    assert cm.active_connections[1] is slow
+
+
+@pytest.mark.asyncio
+async def test_writer_stats_report_the_queue_of_a_slow_client(make_manager):
+    cm = make_manager(writer_queue_size=4)
+    ws = BlockedWebSocket()
+    await cm.connect(1, ws)
+
+    # Enqueued at once, the writer task does not get to run in between
+    for n in range(8):
+        await cm.send_json(1, {"type": "delta", "content": str(n)})
+
+    stats = cm.writer_stats()
+    assert stats["high_water"] == 4
+    assert stats["dropped"] == 4
+    assert stats["slow_disconnects"] == 0
+    assert stats["queued"] == {1: 4}
+
+    ws.release.set()
+    await cm.drain(1)
+    assert cm.writer_stats()["queued"] == {1: 0}
+    assert [json.loads(frame)["content"] for frame in ws.sent] == ["4", "5", "6", "7"]
+
+
+@pytest.mark.asyncio
+async def test_close_stops_the_writer_and_heartbeat_tasks():
+    cm = ConnectionManager(heartbeat=0.01)
+    ws = DummyWebSocket()
+    await cm.connect(1, ws)
+    writer = cm.writers[1]
+    await asyncio.sleep(0.05)
+    # Heartbeats go through the writer queue
+    assert "" in ws.sent
+
+    await cm.close()
+    assert writer._task.done()
+    assert writer._heartbeat.done()
+    assert cm.writers == {}
+    assert cm.active_connections == {}
+    assert ws.closed
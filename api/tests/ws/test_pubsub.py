@@ -0,0 +1,188 @@
+import asyncio
+import json
+
+import pytest
+
+from brobot.ws.manager import ConnectionManager
+from brobot.ws.pubsub import NOTIFY_MAX_BYTES, InMemoryPubSub, PostgresPubSub
+
+
+class FakePostgres:
+    """
+    Stand-in for a Postgres server, delivering NOTIFY to every listening connection.
+    """
+
+    def __init__(self):
+        self.connections = []
+        self.notifications = []
+        self.down = False
+
+    async def connect(self, dsn):
+        if self.down:
+            raise OSError("connection refused")
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+
+class FakeConnection:
+    def __init__(self, server: FakePostgres):
+        self.server = server
+        self.listeners = {}
+        self.termination_listeners = []
+        self.closed = False
+
+    async def execute(self, query, channel, payload):
+        assert query == "SELECT pg_notify($1, $2)"
+        assert len(payload.encode()) < 8000
+        self.server.notifications.append((channel, payload))
+        for connection in self.server.connections:
+            for callback in connection.listeners.get(channel, []):
+                callback(connection, 1, channel, payload)
+
+    async def add_listener(self, channel, callback):
+        self.listeners.setdefault(channel, []).append(callback)
+
+    async def remove_listener(self, channel, callback):
+        self.listeners[channel].remove(callback)
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    def terminate(self):
+        # Like asyncpg, on a lost connection as well as on close
+        self.closed = True
+        self.listeners = {}
+        self.server.connections.remove(self)
+        for callback in self.termination_listeners:
+            callback(self)
+
+    async def close(self):
+        self.terminate()
+
+
+class DummyWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.client_state = type("CS", (), {"name": "CONNECTED"})
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+
+async def settle():
+    # Let the listener tasks deliver the notifications
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_backend_delivers_locally():
+    backend = InMemoryPubSub()
+    received = []
+
+    async def handler(session_id, message):
+        received.append((session_id, message))
+
+    backend.bind(handler)
+    await backend.publish(1, "hello")
+
+    assert received == [(1, "hello")]
+
+
+@pytest.mark.asyncio
+async def test_message_reaches_socket_held_by_another_worker():
+    server = FakePostgres()
+    worker_a = ConnectionManager(
+        PostgresPubSub("postgresql://", connect=server.connect)
+    )
+    worker_b = ConnectionManager(
+        PostgresPubSub("postgresql://", connect=server.connect)
+    )
+
+    ws = DummyWebSocket()
+    await worker_b.connect(3, ws)
+
+    await worker_a.send_text(3, "first")
+    await worker_a.send_json(3, {"type": "delta", "content": "second"})
+    await settle()
+    await worker_b.drain(3)
+
+    assert ws.sent[0] == "first"
+    assert json.loads(ws.sent[1])["content"] == "second"
+
+    connections = list(server.connections)
+    await worker_a.close()
+    await worker_b.close()
+    assert all(connection.closed for connection in connections)
+    assert server.connections == []
+
+
+@pytest.mark.asyncio
+async def test_worker_stops_listening_after_disconnect():
+    server = FakePostgres()
+    worker = ConnectionManager(PostgresPubSub("postgresql://", connect=server.connect))
+
+    ws = DummyWebSocket()
+    await worker.connect(4, ws)
+    worker.disconnect(4)
+    await settle()
+
+    await worker.send_text(4, "lost")
+    await settle()
+
+    assert ws.sent == []
+    await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_large_messages_are_chunked():
+    server = FakePostgres()
+    worker = ConnectionManager(PostgresPubSub("postgresql://", connect=server.connect))
+    ws = DummyWebSocket()
+    await worker.connect(5, ws)
+
+    message = "é🙂" * (NOTIFY_MAX_BYTES // 2)
+    await worker.send_text(5, message)
+    await settle()
+    await worker.drain(5)
+
+    assert len(server.notifications) > 1
+    assert ws.sent == [message]
+    await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_lost_listener_connection_is_reopened():
+    server = FakePostgres()
+    publisher = ConnectionManager(
+        PostgresPubSub("postgresql://", connect=server.connect)
+    )
+    backend = PostgresPubSub("postgresql://", connect=server.connect, reconnect_delay=0)
+    worker = ConnectionManager(backend)
+    ws = DummyWebSocket()
+    await worker.connect(6, ws)
+    await worker.connect(7, DummyWebSocket())
+
+    # Postgres restarts, the first attempts are refused
+    server.down = True
+    backend._listener.terminate()
+    await settle()
+    server.down = False
+    await settle()
+
+    listener = backend._listener
+    assert listener is not None and not listener.closed
+    assert set(listener.listeners) == {backend.channel(6), backend.channel(7)}
+
+    await publisher.send_text(6, "after restart")
+    await settle()
+    await worker.drain(6)
+    assert ws.sent == ["after restart"]
+
+    await publisher.close()
+    await worker.close()
+    assert server.connections == []
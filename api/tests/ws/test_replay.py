@@ -0,0 +1,31 @@
+import json
+
+from brobot.ws.replay import ReplayBuffer, with_seq
+
+
+def test_with_seq_prepends_the_sequence():
+    assert json.loads(with_seq(7, '{"type": "delta"}')) == {"seq": 7, "type": "delta"}
+    assert json.loads(with_seq(7, "{}")) == {"seq": 7}
+    assert with_seq(7, "plain") == "plain"
+
+
+def test_since_returns_missed_frames():
+    buffer = ReplayBuffer(size=10, clock=lambda: 1000)
+    for n in range(3):
+        buffer.append(json.dumps({"n": n}))
+
+    frames = buffer.since(2)
+    assert [seq for seq, _ in frames] == [3, 4]
+    assert buffer.since(4) == []
+
+
+def test_since_rejects_evicted_and_unknown_numbers():
+    buffer = ReplayBuffer(size=2, clock=lambda: 1000)
+    for n in range(4):
+        buffer.append(json.dumps({"n": n}))
+
+    # frames 2 and 3 were evicted
+    assert buffer.since(1) is None
+    assert [seq for seq, _ in buffer.since(3)] == [4, 5]
+    # never produced by this buffer
+    assert buffer.since(99) is None
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from brobot.ws.turns import TurnCoordinator
+
+
+class RecordingTurns:
+    def __init__(self, duration: float = 0.0):
+        self.duration = duration
+        self.running = 0
+        self.max_running = 0
+        self.calls = []
+
+    def turn(self, name: str):
+        async def run():
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.calls.append(name)
+            try:
+                await asyncio.sleep(self.duration)
+            finally:
+                self.running -= 1
+
+        return run
+
+
+@pytest.mark.asyncio
+async def test_single_turn_runs():
+    coordinator = TurnCoordinator()
+    turns = RecordingTurns()
+
+    coordinator.request_turn(1, turns.turn("a"))
+    assert coordinator.is_busy(1)
+    await coordinator.wait(1)
+
+    assert turns.calls == ["a"]
+    assert not coordinator.is_busy(1)
+
+
+@pytest.mark.asyncio
+async def test_requests_during_generation_are_coalesced():
+    coordinator = TurnCoordinator()
+    turns = RecordingTurns(duration=0.05)
+
+    coordinator.request_turn(1, turns.turn("a"))
+    await asyncio.sleep(0.01)
+    coordinator.request_turn(1, turns.turn("b"))
+    coordinator.request_turn(1, turns.turn("c"))
+    await coordinator.wait(1)
+
+    # One follow-up turn answers every message sent during the generation
+    assert turns.calls == ["a", "c"]
+    assert turns.max_running == 1
+
+
+@pytest.mark.asyncio
+async def test_burst_is_debounced():
+    coordinator = TurnCoordinator(debounce=0.05)
+    turns = RecordingTurns()
+
+    coordinator.request_turn(1, turns.turn("a"))
+    coordinator.request_turn(1, turns.turn("b"))
+    await asyncio.sleep(0.01)
+    coordinator.request_turn(1, turns.turn("c"))
+    await coordinator.wait(1)
+
+    assert turns.calls == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_sessions_run_concurrently():
+    coordinator = TurnCoordinator()
+    turns = RecordingTurns(duration=0.05)
+
+    coordinator.request_turn(1, turns.turn("a"))
+    coordinator.request_turn(2, turns.turn("b"))
+    await asyncio.gather(coordinator.wait(1), coordinator.wait(2))
+
+    assert sorted(turns.calls) == ["a", "b"]
+    assert turns.max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_failing_turn_does_not_block_session():
+    coordinator = TurnCoordinator()
+    turns = RecordingTurns()
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    coordinator.request_turn(1, failing)
+    await coordinator.wait(1)
+    coordinator.request_turn(1, turns.turn("a"))
+    await coordinator.wait(1)
+
+    assert turns.calls == ["a"]
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+
+from brobot.ws.writer import (
+    DISCONNECT,
+    DROP_DELTAS,
+    ConnectionWriter,
+    WriterMetrics,
+    frame_kind,
+)
+
+
+class SlowWebSocket:
+    """
+    Socket whose sends only complete once released.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.release = asyncio.Event()
+
+    async def send_text(self, message: str):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+def delta(content: str) -> str:
+    return json.dumps({"type": "delta", "content": content})
+
+
+def typing(status: str) -> str:
+    return json.dumps({"type": "typing", "status": status})
+
+
+def test_frame_kind():
+    assert frame_kind(delta("a")) == "delta"
+    assert frame_kind(typing("start")) == "typing"
+    # Compact serializers
+    assert frame_kind('{"type":"delta","content":"a"}') == "delta"
+    assert frame_kind('{"type":"typing","status":"stop"}') == "typing"
+    assert frame_kind("") == "heartbeat"
+    assert frame_kind('{"id": 1, "role": "assistant"}') == "message"
+
+
+@pytest.mark.asyncio
+async def test_put_does_not_wait_for_the_client():
+    ws = SlowWebSocket()
+    writer = ConnectionWriter(1, ws, max_size=10)
+
+    for content in "abc":
+        writer.put(delta(content), "delta")
+    assert ws.sent == []
+
+    ws.release.set()
+    await writer.drain()
+    assert [json.loads(frame)["content"] for frame in ws.sent] == ["a", "b", "c"]
+    assert writer.high_water == 3
+
+    writer.close()
+    await writer.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_typing_frames_are_coalesced():
+    ws = SlowWebSocket()
+    metrics = WriterMetrics()
+    writer = ConnectionWriter(1, ws, max_size=10, metrics=metrics)
+    await asyncio.sleep(0)
+
+    writer.put(typing("start"), "typing")
+    writer.put(delta("a"), "delta")
+    writer.put(typing("stop"), "typing")
+
+    ws.release.set()
+    await writer.drain()
+    assert [json.loads(frame).get("status") for frame in ws.sent] == [None, "stop"]
+    assert metrics.coalesced == 1
+
+    writer.close()
+    await writer.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_overflow_drops_oldest_deltas():
+    ws = SlowWebSocket()
+    metrics = WriterMetrics()
+    writer = ConnectionWriter(1, ws, max_size=2, overflow=DROP_DELTAS, metrics=metrics)
+    await asyncio.sleep(0)
+
+    writer.put(delta("a"), "delta")
+    writer.put(delta("b"), "delta")
+    writer.put('{"id": 1}', "message")
+
+    ws.release.set()
+    await writer.drain()
+    assert ws.sent == [delta("b"), '{"id": 1}']
+    assert metrics.dropped == 1
+    assert not writer.closed
+
+    writer.close()
+    await writer.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_overflow_disconnects_slow_consumer():
+    ws = SlowWebSocket()
+    closed = []
+    metrics = WriterMetrics()
+    writer = ConnectionWriter(
+        1,
+        ws,
+        max_size=2,
+        overflow=DISCONNECT,
+        metrics=metrics,
+        on_close=closed.append,
+    )
+    await asyncio.sleep(0)
+
+    for content in "abc":
+        writer.put(delta(content), "delta")
+    await writer.drain()
+
+    assert writer.closed
+    assert closed == [writer]
+    assert ws.closed
+    assert metrics.slow_disconnects == 1
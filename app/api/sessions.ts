@@ -1,5 +1,5 @@
-import { TrainingSessionDTO } from "../models/session";
-import { API_URL } from "@/utils/api";
+import { SessionMessageDTO, TrainingSessionDTO } from "../models/session";
+import { API_URL, fetchAllPages } from "@/utils/api";
 
 const BASE_HEADERS = {
     "Content-Type": "application/json",
@@ -41,14 +41,24 @@ export async function fetchSession(
     });
 }
 
+interface FetchSessionMessagesOptions {
+    sessionId: number;
+    /** Only fetch the messages following this one */
+    after?: number | null;
+}
+
+export async function fetchSessionMessages(
+    { sessionId, after = null }: FetchSessionMessagesOptions
+): Promise<SessionMessageDTO[]> {
+    return fetchAllPages<SessionMessageDTO>(`${API_URL}/sessions/${sessionId}/messages`, after);
+}
+
 interface FetchMySessionsOptions { }
 
 export async function fetchMySessions(
     { }: FetchMySessionsOptions
 ): Promise<TrainingSessionDTO[]> {
-    return apiRequest<TrainingSessionDTO[]>(`/sessions`, {
-        method: "GET",
-    });
+    return fetchAllPages<TrainingSessionDTO>(`${API_URL}/sessions`);
 }
 
 interface DeleteSessionOptions {
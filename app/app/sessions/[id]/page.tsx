@@ -14,6 +14,7 @@ export default function Page({ params }: ChatPageProps) {
     const { id } = React.use(params)
     const {
         typing,
+        draft,
         messages,
         session,
         isLoading,
@@ -30,7 +31,7 @@ export default function Page({ params }: ChatPageProps) {
         <div className="flex flex-col h-full py-2">
             <ChatForm connectionStatus={connectionStatus}
                 messages={messages} sendMessage={sendMessage}
-                typing={typing} />
+                typing={typing} draft={draft} />
         </div>
     );
 }
@@ -4,6 +4,7 @@ import { ChatMessages } from "./chat-messages"
 import { ChatInput } from "./chat-input"
 import { SessionMessageDTO } from "@/models/session"
 import { BouncingDots } from "./bouncing-dots"
+import { AssistantMessage } from "./assistant-message"
 
 
 export interface ChatFormProps {
@@ -11,9 +12,10 @@ export interface ChatFormProps {
     messages: SessionMessageDTO[] | null,
     sendMessage: (message: string) => void,
     typing?: boolean,
+    draft?: string,
 }
 
-export function ChatForm({ messages, sendMessage, typing }: ChatFormProps) {
+export function ChatForm({ messages, sendMessage, typing, draft }: ChatFormProps) {
 
     if (!messages) {
         return (
@@ -29,9 +31,11 @@ export function ChatForm({ messages, sendMessage, typing }: ChatFormProps) {
         <main className="ring-none mx-auto flex w-full h-full flex-col items-stretch border-none">
             <ChatMessages messages={messages} />
             {typing && <div className="flex-grow my-4 flex flex-col gap-4 content-center px-6">
-                <div className="self-start max-w-[80%] rounded-xl px-3 py-2 text-sm bg-gray-100 text-black prose prose-stone">
-                    <BouncingDots />
-                </div>
+                {draft ? <AssistantMessage content={draft} /> : (
+                    <div className="self-start max-w-[80%] rounded-xl px-3 py-2 text-sm bg-gray-100 text-black prose prose-stone">
+                        <BouncingDots />
+                    </div>
+                )}
             </div>}
 
             <ChatInput sendMessage={sendMessage} />
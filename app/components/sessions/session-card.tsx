@@ -28,7 +28,7 @@ export default function SessionCard({ session, onDelete }: SessionCardProps) {
             <CardTitle className="text-lg">{session.scenario.title}</CardTitle>
             <Badge variant="secondary" className="flex items-center space-x-1">
                 <MessageSquare className="h-4 w-4" />
-                <span>{session.messages.length}</span>
+                <span>{session.message_count}</span>
             </Badge>
         </CardHeader>
 
@@ -1,12 +1,12 @@
-import { useState, useCallback, useEffect } from "react";
-import useSWR, { mutate } from "swr";
-import { fetchSession } from "@/api/sessions";
+import { useState, useCallback, useEffect, useRef } from "react";
+import useSWR from "swr";
+import { fetchSession, fetchSessionMessages } from "@/api/sessions";
 import { useWebsocket } from "./use-websocket";
 import type {
     SessionMessageDTO,
     TrainingSessionDTO,
 } from "@/models/session";
-import { upsertAndSortMessages } from "@/utils/messages";
+import { mergeAndSortMessages, upsertAndSortMessages } from "@/utils/messages";
 import { useHeader } from "@/context/header-context";
 
 export function useChatService(
@@ -18,21 +18,20 @@ export function useChatService(
     // Local state for chat messages
     const [messages, setMessages] = useState<SessionMessageDTO[]>([]);
     const [typing, setTyping] = useState(false);
+    // Assistant answer being streamed, replaced by the message once persisted
+    const [draft, setDraft] = useState("");
+    // Resume cursor: last frame and last message received on the websocket
+    const lastSeqRef = useRef<number | null>(null);
+    const lastMessageIdRef = useRef<number | null>(null);
 
-    // Fetch session metadata & history
+    // Fetch session metadata, the history is loaded once the websocket is open
     const { data: session, error: restError } = useSWR<TrainingSessionDTO>(
         sessionId.toString(),
         () => fetchSession({ sessionId })
     );
 
-    // Initialize local messages state from fetched session history
     useEffect(() => {
-        if (session?.messages) {
-            setMessages(session.messages);
-        }
-
         setHeader(session ? session.scenario.title : "Chat session");
-
     }, [session]);
 
     // Connection status: connecting | connected | reconnecting
@@ -45,14 +44,22 @@ export function useChatService(
         if (!data?.trim()) return;
         try {
             const parsed = JSON.parse(data);
+            if (typeof parsed.seq === "number") lastSeqRef.current = parsed.seq;
 
             if (parsed.type === "typing") {
                 setTyping(parsed.status === "start");
                 return;
             }
 
+            if (parsed.type === "delta") {
+                setDraft((prev) => prev + parsed.content);
+                return;
+            }
+
             const msg: SessionMessageDTO = parsed;
             if (!msg.id) return;
+            lastMessageIdRef.current = Math.max(lastMessageIdRef.current ?? 0, msg.id);
+            if (msg.role === "assistant") setDraft("");
             setMessages((prev) => upsertAndSortMessages(prev, msg));
         } catch (err) {
             console.error("Invalid WS message format:", err, data);
@@ -61,20 +68,34 @@ export function useChatService(
 
     // Called on initial open and every reconnect
     const handleWsOpen = useCallback(() => {
-        console.info("WebSocket open/reconnected, refreshing session");
-        setMessages([]);
         setConnectionStatus("connected");
-        // Revalidate REST cache without re-fetching data for React
-        mutate(
-            sessionId.toString(),
-            fetchSession({ sessionId }),
-            false
-        );
+        // On reconnect the server only sends what was missed
+        if (lastSeqRef.current !== null || lastMessageIdRef.current !== null) return;
+        // Loaded once the socket is open, so no message falls in between
+        console.info("WebSocket open, loading history");
+        setDraft("");
+        fetchSessionMessages({ sessionId })
+            .then((history) => {
+                lastMessageIdRef.current = history.reduce(
+                    (last, msg) => Math.max(last, msg.id),
+                    lastMessageIdRef.current ?? 0
+                );
+                setMessages((prev) => mergeAndSortMessages(prev, history));
+            })
+            .catch((err) => console.error("Failed to load history:", err));
     }, [sessionId, userId]);
 
     // Initialize resilient WebSocket
+    const buildWsUrl = useCallback(() => {
+        const params = new URLSearchParams();
+        if (lastSeqRef.current !== null) params.set("resume_from", String(lastSeqRef.current));
+        if (lastMessageIdRef.current !== null) params.set("last_message_id", String(lastMessageIdRef.current));
+        const query = params.toString();
+        return `ws://localhost:8000/sessions/ws/${sessionId}${query ? `?${query}` : ""}`;
+    }, [sessionId]);
+
     const { send, readyState } = useWebsocket(
-        `ws://localhost:8000/sessions/ws/${sessionId}`,
+        buildWsUrl,
         { onMessage: handleWsMessage }
     );
 
@@ -114,6 +135,7 @@ export function useChatService(
 
     return {
         typing,
+        draft,
         messages,
         session,
         isLoading,
@@ -4,7 +4,7 @@ import { useRouter } from "next/navigation";
 import useSWR from "swr";
 import { useCallback, useEffect } from "react";
 import { ScenarioRead } from "@/models/scenario";
-import { API_URL, fetcher } from "@/utils/api";
+import { API_URL, fetchAllPages } from "@/utils/api";
 import { TrainingSessionDTO } from "@/models/session";
 import { useHeader } from "@/context/header-context";
 
@@ -14,7 +14,7 @@ export function useScenarios() {
     const { setHeader } = useHeader();
     const { data, error, mutate } = useSWR<ScenarioRead[]>(
         `${API_URL}/scenarios`,
-        fetcher
+        (url: string) => fetchAllPages<ScenarioRead>(url)
     );
 
     useEffect(() => {
@@ -17,12 +17,12 @@ export interface UseResilientWebSocketOptions {
  * - Outgoing message queue when disconnected
  * - Heartbeat ping to keep connection alive
  * 
- * @param url WebSocket URL
+ * @param url WebSocket URL, or a function called on every (re)connection
  * @param options Configuration callbacks and protocols
  * @returns { send, readyState }
  */
 export function useWebsocket(
-    url: string,
+    url: string | (() => string),
     { onMessage, protocols }: UseResilientWebSocketOptions = {}
 ) {
     const socketRef = useRef<WebSocket | null>(null);
@@ -47,7 +47,7 @@ export function useWebsocket(
 
     // Establish connection and handlers
     const connect = useCallback(() => {
-        const ws = new WebSocket(url, protocols);
+        const ws = new WebSocket(typeof url === 'function' ? url() : url, protocols);
         socketRef.current = ws;
         setReadyState('CONNECTING');
 
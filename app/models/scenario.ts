@@ -75,6 +75,7 @@ export interface ScenarioWithChapterDTO {
     title: string;
     description: string;
     created_at: string; // ISO 8601 string
+    version: number; // incremented by each import changing the content
     chapters: ScenarioChapterWithoutContentDTO[];
 }
 
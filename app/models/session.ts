@@ -14,12 +14,13 @@ export interface SessionMessageDTO {
 
 export interface TrainingSessionDTO {
     /**
-     * DTO for a training session with its associated scenario and messages.
+     * DTO for a training session with its associated scenario.
+     * Messages are fetched page by page from the messages endpoint.
      */
     id: number;
     created_at: string; // ISO 8601 string
     scenario: ScenarioWithChapterDTO;
-    messages: SessionMessageDTO[];
+    message_count: number;
     completions: {
         chapter_id: number;
         message_id: number;
@@ -4,4 +4,28 @@ export async function fetcher<T>(url: string): Promise<T> {
     const res = await fetch(url);
     if (!res.ok) throw new Error(`fetch error ${res.status}`);
     return res.json();
-}
\ No newline at end of file
+}
+
+// Header giving the cursor of the next page of a listing, absent on the last one
+const NEXT_CURSOR_HEADER = "X-Next-Cursor";
+
+/**
+ * Fetch every page of a listing, following the cursor given by the API.
+ *
+ * @param url URL of the listing
+ * @param after Only fetch the items following this id
+ */
+export async function fetchAllPages<T>(url: string, after: number | null = null): Promise<T[]> {
+    const items: T[] = [];
+    let cursor = after;
+    while (true) {
+        const pageUrl = new URL(url);
+        if (cursor !== null) pageUrl.searchParams.set("after", String(cursor));
+        const res = await fetch(pageUrl);
+        if (!res.ok) throw new Error(`fetch error ${res.status}`);
+        items.push(...(await res.json()));
+        const next = res.headers.get(NEXT_CURSOR_HEADER);
+        if (next === null) return items;
+        cursor = Number(next);
+    }
+}
@@ -24,4 +24,15 @@ export function upsertAndSortMessages(
             : // ajoute en fin
             [...messages, newMsg];
     return sortMessagesByDate(updated);
-}
\ No newline at end of file
+}
+
+/**
+ * Fusionne une page de messages dans la liste, puis trie par date.
+ */
+export function mergeAndSortMessages(
+    messages: SessionMessageDTO[],
+    page: SessionMessageDTO[]
+): SessionMessageDTO[] {
+    const ids = new Set(page.map((m) => m.id));
+    return sortMessagesByDate([...messages.filter((m) => !ids.has(m.id)), ...page]);
+}